@@ -0,0 +1,96 @@
+"""
+Генератор синтетических данных: профили, расписания, аудитории и
+преподаватели с реалистичной плотностью занятий.
+
+Данные пишутся через функции db, поэтому генератор работает с той базой,
+на которую настроен db. Результат полностью определяется seed.
+"""
+import random
+
+import db
+
+LESSON_TYPES = ["Лекция", "Практика", "Лабораторная", "Семинар"]
+DISCIPLINES = [
+    "Математический анализ", "Линейная алгебра", "Программирование", "Базы данных",
+    "Физика", "Иностранный язык", "История", "Экономика", "Дискретная математика",
+    "Операционные системы", "Компьютерные сети", "Физическая культура",
+]
+
+# Какие типы недели занимает запись: занятие «каждую неделю» (0)
+# пересекается и с нечётной, и с чётной неделей
+_COVERED_WEEKS = {0: (0, 1, 2), 1: (0, 1), 2: (0, 2)}
+
+
+def pair_times(pairs):
+    """Пары по 90 минут с переменами по 10 минут, начиная с 8:00."""
+    result = []
+    for n in range(1, pairs + 1):
+        start = 8 * 60 + (n - 1) * 100
+        end = start + 90
+        result.append((n, f"{start // 60:02d}:{start % 60:02d}", f"{end // 60:02d}:{end % 60:02d}"))
+    return result
+
+
+def _pick_free(rng, names, busy, day, pair_number, week_type, attempts=20):
+    """Случайное имя, свободное в слоте, или "" если за attempts попыток не нашлось."""
+    weeks = _COVERED_WEEKS[week_type]
+    for _ in range(attempts):
+        name = rng.choice(names)
+        if not any((name, day, pair_number, w) in busy for w in weeks):
+            for w in weeks:
+                busy.add((name, day, pair_number, w))
+            return name
+    return ""
+
+
+def schedule_entries(rng, schedule_type, pairs, rooms, teachers, room_busy, teacher_busy, density):
+    """Записи одного расписания в формате save_schedule_entries без пересечений с уже созданными."""
+    weeks = (0,) if schedule_type == "Обычное" else (1, 2)
+    entries = []
+    for day in db.DAYS:
+        for pair_number in range(1, pairs + 1):
+            for week_type in weeks:
+                if rng.random() >= density:
+                    continue
+                entries.append((
+                    day, pair_number,
+                    _pick_free(rng, rooms, room_busy, day, pair_number, week_type),
+                    _pick_free(rng, teachers, teacher_busy, day, pair_number, week_type),
+                    rng.choice(LESSON_TYPES), rng.choice(DISCIPLINES), week_type
+                ))
+    return entries
+
+
+def generate(profiles=2, schedules=20, rooms=120, teachers=200, pairs=6,
+             density=0.6, two_week=0.5, seed=1) -> dict:
+    """
+    Создаёт profiles профилей по schedules расписаний в каждом. Доля
+    двухнедельных расписаний — two_week, доля занятых слотов — density.
+    Аудитории и преподаватели подбираются без пересечений, как в
+    настоящем расписании.
+
+    Возвращает {"profiles": [id], "schedules": [(id, тип, id профиля)], "rooms": [имя],
+    "teachers": [имя], "entries": число записей}.
+    """
+    rng = random.Random(seed)
+    room_names = [f"Ауд. {100 + i}" for i in range(rooms)]
+    teacher_names = [f"Преподаватель {i + 1}" for i in range(teachers)]
+    db.add_rooms(room_names)
+    db.add_teachers(teacher_names)
+
+    room_busy, teacher_busy = set(), set()
+    result = {"profiles": [], "schedules": [], "rooms": room_names, "teachers": teacher_names, "entries": 0}
+    for p in range(profiles):
+        profile_id = db.create_profile(f"Профиль {p + 1}", pairs)
+        db.set_profile_times(profile_id, pair_times(pairs))
+        result["profiles"].append(profile_id)
+
+        for s in range(schedules):
+            schedule_type = "Двухнедельное" if rng.random() < two_week else "Обычное"
+            schedule_id = db.create_schedule(profile_id, f"Группа {p + 1}-{s + 1:03d}", schedule_type)
+            entries = schedule_entries(rng, schedule_type, pairs, room_names, teacher_names,
+                                       room_busy, teacher_busy, density)
+            db.save_schedule_entries(schedule_id, entries)
+            result["schedules"].append((schedule_id, schedule_type, profile_id))
+            result["entries"] += len(entries)
+    return result
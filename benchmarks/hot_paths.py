@@ -0,0 +1,321 @@
+"""
+Время горячих путей приложения на синтетических данных.
+
+    python -m benchmarks.hot_paths [--schedules 20] [--repeat 20] [--json out.json]
+    python -m benchmarks.hot_paths --pgserver               (одноразовый локальный сервер)
+    python -m benchmarks.hot_paths --sqlite                 (встроенная база в процессе)
+    python -m benchmarks.hot_paths --compare base.json --json new.json
+
+База:
+  по умолчанию — временная схема в базе db.DB_PARAMS, удаляется в конце;
+  --pgserver — одноразовый кластер PostgreSQL во временном каталоге
+  (нужен пакет pgserver);
+  --sqlite — встроенная база SQLite во временном файле, без сервера.
+
+Замеряются save_schedule_entries (полная и инкрементальная запись),
+save_schedule_changes (правка одного слота), load_schedule_entries,
+load_editor_data (с пустым кэшем справочников),
+is_room_busy/is_teacher_busy и find_free (запросом и по индексу в памяти),
+find_schedule_conflicts, find_double_bookings, search_names,
+clone_profile (копии удаляются после замера), export_schedule_to_excel и построение ScheduleEditDialog на платформе
+Qt offscreen. Результаты — JSON с min/median/mean/p95/max в миллисекундах
+по каждому замеру.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+
+import db
+import migrations
+import refcache
+from benchmarks.generator import generate
+
+SCRATCH_SCHEMA = "bench_hot_paths"
+
+
+# Одноразовая база
+
+@contextmanager
+def scratch_schema():
+    """Временная схема в текущей базе: db работает в ней до выхода из блока."""
+    import psycopg2
+
+    admin = psycopg2.connect(**db.DB_PARAMS)
+    admin.autocommit = True
+    with admin.cursor() as cur:
+        cur.execute(f"DROP SCHEMA IF EXISTS {SCRATCH_SCHEMA} CASCADE;")
+        cur.execute(f"CREATE SCHEMA {SCRATCH_SCHEMA};")
+    saved = dict(db.DB_PARAMS)
+    db.close_pool()
+    db.DB_PARAMS["options"] = f"-c search_path={SCRATCH_SCHEMA}"
+    try:
+        yield
+    finally:
+        db.close_pool()
+        db.DB_PARAMS.clear()
+        db.DB_PARAMS.update(saved)
+        with admin.cursor() as cur:
+            cur.execute(f"DROP SCHEMA IF EXISTS {SCRATCH_SCHEMA} CASCADE;")
+        admin.close()
+
+
+@contextmanager
+def disposable_server():
+    """Одноразовый кластер PostgreSQL (пакет pgserver) во временном каталоге."""
+    try:
+        import pgserver
+    except ImportError:
+        raise SystemExit("Для --pgserver нужен пакет pgserver: pip install pgserver")
+
+    with tempfile.TemporaryDirectory(prefix="bench_pg_") as data_dir:
+        server = pgserver.get_server(data_dir, cleanup_mode="stop")
+        saved = dict(db.DB_PARAMS)
+        db.close_pool()
+        db.DB_PARAMS.clear()
+        db.DB_PARAMS.update(dbname="postgres", user="postgres", host=data_dir)
+        try:
+            yield
+        finally:
+            db.close_pool()
+            db.DB_PARAMS.clear()
+            db.DB_PARAMS.update(saved)
+            server.cleanup()
+
+
+@contextmanager
+def sqlite_file():
+    """Встроенная база SQLite во временном каталоге."""
+    saved = (db.DB_BACKEND, db.SQLITE_PATH)
+    with tempfile.TemporaryDirectory(prefix="bench_sqlite_") as data_dir:
+        db.configure("sqlite", path=os.path.join(data_dir, "bench.db"))
+        try:
+            yield
+        finally:
+            db.configure(saved[0], path=saved[1])
+
+
+# Замеры
+
+def summarize(samples: list) -> dict:
+    ms = sorted(s * 1000 for s in samples)
+    return {
+        "n": len(ms),
+        "min_ms": round(ms[0], 3),
+        "median_ms": round(statistics.median(ms), 3),
+        "mean_ms": round(statistics.fmean(ms), 3),
+        "p95_ms": round(ms[min(len(ms) - 1, int(len(ms) * 0.95))], 3),
+        "max_ms": round(ms[-1], 3),
+    }
+
+
+def timed(fn, repeat: int, warmup: int = 1) -> dict:
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return summarize(samples)
+
+
+def _target_schedule(data):
+    """Самое заполненное двухнедельное расписание (или любое, если таких нет): (id, тип, id профиля)."""
+    candidates = [s for s in data["schedules"] if s[1] != "Обычное"] or data["schedules"][:1]
+    return max(candidates, key=lambda s: len(db.load_schedule_entries(s[0])))
+
+
+def _probes(entries, limit=200):
+    """Слоты с аудиторией и преподавателем для проверок занятости."""
+    return [(day, pair, room, teacher, week) for day, pair, room, teacher, _, _, week in entries
+            if room and teacher][:limit]
+
+
+def bench_db(data, repeat: int) -> dict:
+    sid = _target_schedule(data)[0]
+    entries = db.load_schedule_entries(sid)
+    changed = list(entries)
+    day, pair, room, teacher, lesson_type, discipline, week = changed[0]
+    changed[0] = (day, pair, room, teacher, lesson_type, discipline + " (изм.)", week)
+    probes = _probes(entries)
+    results = {}
+
+    results["save_schedule_entries"] = timed(lambda: db.save_schedule_entries(sid, entries), repeat)
+
+    flip = [False]
+
+    def save_incremental():
+        flip[0] = not flip[0]
+        db.save_schedule_entries(sid, changed if flip[0] else entries, incremental=True)
+    results["save_schedule_entries[incremental]"] = timed(save_incremental, repeat)
+
+    def save_changes():
+        flip[0] = not flip[0]
+        db.save_schedule_changes(sid, [changed[0] if flip[0] else entries[0]])
+    results["save_schedule_changes[1 слот]"] = timed(save_changes, repeat)
+
+    results["load_schedule_entries"] = timed(lambda: db.load_schedule_entries(sid), repeat)
+
+    profile_id = _target_schedule(data)[2]
+
+    def load_editor_cold():
+        refcache.cache.clear()
+        db.load_editor_data(profile_id, sid)
+    results["load_editor_data[без кэша]"] = timed(load_editor_cold, repeat)
+    results["find_schedule_conflicts"] = timed(lambda: db.find_schedule_conflicts(sid, entries), repeat)
+    results["find_double_bookings"] = timed(lambda: db.find_double_bookings(), repeat)
+
+    queries = ["п", "преп", "преподаватель 1", "ауд. 1"]
+    stats = timed(lambda: [db.search_names(kind, q) for kind in ("room", "teacher") for q in queries], repeat)
+    results["search_names"] = {k: (round(v / 8, 4) if k.endswith("_ms") else v) for k, v in stats.items()}
+    results["search_names"]["calls_per_sample"] = 8
+
+    def busy_all(check, column):
+        def run():
+            for probe in probes:
+                check(probe[column], probe[0], probe[1], probe[4], sid)
+        return run
+
+    per_probe = max(len(probes), 1)
+    for suffix, enable in (("", db.disable_occupancy_index), ("[index]", db.enable_occupancy_index)):
+        enable()
+        for name, check, column in (("is_room_busy", db.is_room_busy, 2),
+                                    ("is_teacher_busy", db.is_teacher_busy, 3)):
+            stats = timed(busy_all(check, column), max(1, repeat // 4))
+            # Время одного вызова: замер идёт по всему набору проб
+            results[name + suffix] = {k: (round(v / per_probe, 4) if k.endswith("_ms") else v)
+                                      for k, v in stats.items()}
+            results[name + suffix]["calls_per_sample"] = per_probe
+        stats = timed(lambda: [db.find_free(p[0], p[1], p[4], sid) for p in probes[:20]], max(1, repeat // 4))
+        results["find_free" + suffix] = {k: (round(v / 20, 4) if k.endswith("_ms") else v) for k, v in stats.items()}
+        results["find_free" + suffix]["calls_per_sample"] = 20
+    db.disable_occupancy_index()
+
+    clones = []
+    results["clone_profile"] = timed(
+        lambda: clones.append(db.clone_profile(profile_id, f"bench clone {len(clones)}")["profile_id"]),
+        max(1, repeat // 4)
+    )
+    for clone_id in clones:
+        db.delete_profile(clone_id)
+
+    with tempfile.TemporaryDirectory(prefix="bench_export_") as out:
+        path = os.path.join(out, "schedule.xlsx")
+        results["export_schedule_to_excel"] = timed(lambda: db.export_schedule_to_excel(sid, path), repeat)
+    return results
+
+
+def bench_ui(data, repeat: int) -> dict:
+    """Построение ScheduleEditDialog до показа загруженной сетки."""
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    try:
+        from PyQt5.QtCore import QEvent
+        from PyQt5.QtWidgets import QApplication
+    except ImportError:
+        return {}
+    import ui
+    import workers
+
+    app = QApplication.instance() or QApplication([])
+    sid, schedule_type, profile_id = _target_schedule(data)
+
+    def construct():
+        dialog = ui.ScheduleEditDialog(profile_id, sid, schedule_type)
+        while dialog.model is None:
+            workers.executor().wait(10)
+            app.processEvents()
+        dialog.deleteLater()
+        app.sendPostedEvents(None, QEvent.DeferredDelete)
+
+    return {"ScheduleEditDialog": timed(construct, repeat)}
+
+
+def run(profiles=2, schedules=20, rooms=120, teachers=200, pairs=6, density=0.6,
+        seed=1, repeat=20, with_ui=True) -> dict:
+    """Заполняет текущую базу db и возвращает замеры (база должна быть пустой)."""
+    refcache.cache.clear()
+    migrations.migrate()
+    started = time.perf_counter()
+    data = generate(profiles, schedules, rooms, teachers, pairs, density, seed=seed)
+    generate_s = time.perf_counter() - started
+
+    results = bench_db(data, repeat)
+    if with_ui:
+        results.update(bench_ui(data, repeat))
+    return {
+        "meta": {
+            "backend": db.backend().name,
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "params": {"profiles": profiles, "schedules": schedules, "rooms": rooms, "teachers": teachers,
+                       "pairs": pairs, "density": density, "seed": seed, "repeat": repeat},
+            "entries": data["entries"],
+            "generate_s": round(generate_s, 3),
+        },
+        "results": results,
+    }
+
+
+def print_table(result: dict, baseline: dict = None, out=sys.stdout):
+    base = (baseline or {}).get("results", {})
+    header = f"{'замер':<38}{'медиана, мс':>13}{'p95, мс':>11}"
+    print(header + (f"{'было, мс':>11}{'изм.':>9}" if base else ""), file=out)
+    for name, stats in result["results"].items():
+        line = f"{name:<38}{stats['median_ms']:>13.3f}{stats['p95_ms']:>11.3f}"
+        if name in base:
+            before = base[name]["median_ms"]
+            change = (stats["median_ms"] / before - 1) * 100 if before else 0.0
+            line += f"{before:>11.3f}{change:>+8.1f}%"
+        print(line, file=out)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Время горячих путей на синтетических данных")
+    parser.add_argument("--profiles", type=int, default=2)
+    parser.add_argument("--schedules", type=int, default=20, help="расписаний в профиле")
+    parser.add_argument("--rooms", type=int, default=120)
+    parser.add_argument("--teachers", type=int, default=200)
+    parser.add_argument("--pairs", type=int, default=6)
+    parser.add_argument("--density", type=float, default=0.6, help="доля занятых слотов")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--no-ui", action="store_true", help="не замерять ScheduleEditDialog")
+    database = parser.add_mutually_exclusive_group()
+    database.add_argument("--pgserver", action="store_true", help="одноразовый локальный PostgreSQL")
+    database.add_argument("--sqlite", action="store_true", help="встроенная база SQLite во временном файле")
+    parser.add_argument("--json", metavar="PATH", help="сохранить результаты в JSON")
+    parser.add_argument("--compare", metavar="PATH", help="JSON предыдущего запуска для сравнения")
+    args = parser.parse_args(argv)
+
+    if args.sqlite:
+        database = sqlite_file()
+    elif args.pgserver:
+        database = disposable_server()
+    else:
+        database = scratch_schema()
+    with database:
+        result = run(args.profiles, args.schedules, args.rooms, args.teachers, args.pairs,
+                     args.density, args.seed, args.repeat, not args.no_ui)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+    meta = result["meta"]
+    print(f"Записей: {meta['entries']}, генерация: {meta['generate_s']} с, повторов: {args.repeat}")
+    print_table(result, baseline)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
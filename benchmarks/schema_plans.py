@@ -0,0 +1,224 @@
+"""
+Планы и время горячих запросов до и после миграций схемы.
+
+    python -m benchmarks.schema_plans [--schedules-per-profile 50] [--repeat 30]
+
+Бенчмарк создаёт временную схему, доводит её до версии 1 (исходная DDL),
+заполняет синтетическими данными, снимает планы EXPLAIN ANALYZE и среднее
+время запросов, затем применяет остальные миграции и повторяет замеры.
+Временная схема удаляется в конце.
+"""
+import argparse
+import json
+import sys
+import time
+
+import psycopg2
+
+import db
+import migrations
+import storage
+
+SCRATCH_SCHEMA = "bench_schema_plans"
+
+FILL_SQL = """
+INSERT INTO profiles (name, max_pairs)
+SELECT 'Профиль ' || g, %(pairs)s FROM generate_series(1, %(profiles)s) g;
+
+INSERT INTO profile_times (profile_id, pair_number, start_time, end_time)
+SELECT p.id, n,
+       time '08:00' + (n - 1) * interval '100 minutes',
+       time '09:30' + (n - 1) * interval '100 minutes'
+FROM profiles p, generate_series(1, %(pairs)s) n;
+
+INSERT INTO rooms (name) SELECT 'Ауд. ' || g FROM generate_series(1, %(rooms)s) g;
+INSERT INTO teachers (name) SELECT 'Преподаватель ' || g FROM generate_series(1, %(teachers)s) g;
+
+INSERT INTO schedules_list (profile_id, name, schedule_type)
+SELECT p.id, 'Группа ' || p.id || '-' || g, 'Двухнедельное'
+FROM profiles p, generate_series(1, %(per_profile)s) g;
+
+INSERT INTO schedules (schedule_id, week_day, pair_number, room_id, teacher_id,
+                       lesson_type, discipline, week_type, time_interval)
+SELECT sl.id, d.day, n,
+       1 + floor(random() * %(rooms)s)::int,
+       1 + floor(random() * %(teachers)s)::int,
+       'Лекция', 'Дисциплина', w, ''
+FROM schedules_list sl
+CROSS JOIN unnest(%(days)s::text[]) AS d(day)
+CROSS JOIN generate_series(1, %(pairs)s) n
+CROSS JOIN generate_series(1, 2) w
+WHERE random() < %(density)s;
+"""
+
+# Запросы повторяют SQL из db.py; {day_array} — тип массива дней для текущей версии схемы
+HOT_QUERIES = {
+    "is_room_busy": ("""
+        SELECT 1 FROM schedules s
+        JOIN rooms r ON s.room_id = r.id
+        JOIN schedules_list sl ON sl.id = s.schedule_id
+        WHERE r.name = %(room)s AND s.week_day = %(day)s AND s.pair_number = %(pair)s
+        AND (s.week_type = %(week)s OR s.week_type = 0 OR %(week)s = 0) AND s.schedule_id != %(schedule_id)s
+        AND sl.profile_id = (SELECT profile_id FROM schedules_list WHERE id = %(schedule_id)s)
+        LIMIT 1
+    """),
+    "is_teacher_busy": ("""
+        SELECT 1 FROM schedules s
+        JOIN teachers t ON s.teacher_id = t.id
+        JOIN schedules_list sl ON sl.id = s.schedule_id
+        WHERE t.name = %(teacher)s AND s.week_day = %(day)s AND s.pair_number = %(pair)s
+        AND (s.week_type = %(week)s OR s.week_type = 0 OR %(week)s = 0) AND s.schedule_id != %(schedule_id)s
+        AND sl.profile_id = (SELECT profile_id FROM schedules_list WHERE id = %(schedule_id)s)
+        LIMIT 1
+    """),
+    "load_schedule_entries": ("""
+        SELECT s.week_day, s.pair_number, r.name, t.name, s.lesson_type, s.discipline, s.week_type
+        FROM schedules s
+        LEFT JOIN rooms r ON s.room_id = r.id
+        LEFT JOIN teachers t ON s.teacher_id = t.id
+        WHERE s.schedule_id = %(schedule_id)s
+    """),
+    "list_schedules": ("""
+        SELECT id, name, schedule_type FROM schedules_list WHERE profile_id = %(profile_id)s ORDER BY id
+    """),
+    "find_schedule_conflicts": ("""
+        WITH proposed AS (
+            SELECT * FROM unnest(%(days)s::{day_array}, %(pairs)s::int[], %(weeks)s::int[],
+                                 %(rooms)s::text[], %(teachers)s::text[])
+                 AS p(week_day, pair_number, week_type, room, teacher)
+        )
+        SELECT p.room, sl.name
+        FROM proposed p
+        JOIN rooms r ON r.name = p.room
+        JOIN schedules s ON s.room_id = r.id AND s.week_day = p.week_day
+                        AND s.pair_number = p.pair_number AND s.week_type = p.week_type
+                        AND s.schedule_id <> %(schedule_id)s
+        JOIN schedules_list sl ON sl.id = s.schedule_id
+        UNION ALL
+        SELECT p.teacher, sl.name
+        FROM proposed p
+        JOIN teachers t ON t.name = p.teacher
+        JOIN schedules s ON s.teacher_id = t.id AND s.week_day = p.week_day
+                        AND s.pair_number = p.pair_number AND s.week_type = p.week_type
+                        AND s.schedule_id <> %(schedule_id)s
+        JOIN schedules_list sl ON sl.id = s.schedule_id
+    """),
+}
+
+
+def _params() -> dict:
+    params = dict(db.DB_PARAMS)
+    params["options"] = f"-c search_path={SCRATCH_SCHEMA}"
+    return params
+
+
+def _connect():
+    return psycopg2.connect(**_params())
+
+
+def _sample_params(cur) -> dict:
+    cur.execute("SELECT schedule_id FROM schedules GROUP BY schedule_id ORDER BY count(*) DESC LIMIT 1;")
+    schedule_id = cur.fetchone()[0]
+    cur.execute("SELECT profile_id FROM schedules_list WHERE id = %s;", (schedule_id,))
+    profile_id = cur.fetchone()[0]
+    cur.execute("""
+        SELECT s.week_day::text, s.pair_number, s.week_type, r.name, t.name
+        FROM schedules s JOIN rooms r ON r.id = s.room_id JOIN teachers t ON t.id = s.teacher_id
+        WHERE s.schedule_id = %s ORDER BY s.id;
+    """, (schedule_id,))
+    rows = cur.fetchall()
+    day, pair, week, room, teacher = rows[0]
+    return {
+        "schedule_id": schedule_id, "profile_id": profile_id,
+        "room": room, "teacher": teacher, "day": day, "pair": pair, "week": week,
+        "days": [r[0] for r in rows], "pairs": [r[1] for r in rows], "weeks": [r[2] for r in rows],
+        "rooms": [r[3] for r in rows], "teachers": [r[4] for r in rows],
+    }
+
+
+def _measure(conn, params: dict, repeat: int) -> dict:
+    engine = storage.PostgresBackend(_params())
+    day_array = "week_day_t[]" if migrations.current_version(conn, engine) >= 3 else "text[]"
+    results = {}
+    with conn.cursor() as cur:
+        for name, template in HOT_QUERIES.items():
+            sql = template.format(day_array=day_array)
+            cur.execute("EXPLAIN (ANALYZE, BUFFERS, FORMAT TEXT) " + sql, params)
+            plan = [r[0] for r in cur.fetchall()]
+            started = time.perf_counter()
+            for _ in range(repeat):
+                cur.execute(sql, params)
+                cur.fetchall()
+            elapsed_ms = (time.perf_counter() - started) * 1000 / repeat
+            results[name] = {"avg_ms": round(elapsed_ms, 3), "plan": plan}
+        conn.rollback()
+    return results
+
+
+def run(profiles=20, per_profile=50, pairs=6, rooms=300, teachers=2000, density=0.7, repeat=30) -> dict:
+    conn = _connect()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(f"DROP SCHEMA IF EXISTS {SCRATCH_SCHEMA} CASCADE;")
+            cur.execute(f"CREATE SCHEMA {SCRATCH_SCHEMA};")
+        conn.commit()
+
+        engine = storage.PostgresBackend(_params())
+        migrations.migrate(conn, target=1, engine=engine)
+        with conn.cursor() as cur:
+            cur.execute(FILL_SQL, {
+                "profiles": profiles, "per_profile": per_profile, "pairs": pairs,
+                "rooms": rooms, "teachers": teachers, "density": density, "days": db.DAYS,
+            })
+            cur.execute("ANALYZE;")
+            params = _sample_params(cur)
+            cur.execute("SELECT count(*) FROM schedules;")
+            row_count = cur.fetchone()[0]
+        conn.commit()
+
+        before = _measure(conn, params, repeat)
+        migrations.migrate(conn, engine=engine)
+        with conn.cursor() as cur:
+            cur.execute("ANALYZE;")
+        conn.commit()
+        after = _measure(conn, params, repeat)
+        return {"schedules_rows": row_count, "repeat": repeat, "before": before, "after": after}
+    finally:
+        conn.rollback()
+        with conn.cursor() as cur:
+            cur.execute(f"DROP SCHEMA IF EXISTS {SCRATCH_SCHEMA} CASCADE;")
+        conn.commit()
+        conn.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Планы и время горячих запросов до и после миграций")
+    parser.add_argument("--profiles", type=int, default=20)
+    parser.add_argument("--schedules-per-profile", type=int, default=50)
+    parser.add_argument("--rooms", type=int, default=300)
+    parser.add_argument("--teachers", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=30)
+    parser.add_argument("--plans", action="store_true", help="печатать планы целиком")
+    parser.add_argument("--json", metavar="PATH", help="сохранить результаты в JSON")
+    args = parser.parse_args(argv)
+
+    result = run(profiles=args.profiles, per_profile=args.schedules_per_profile,
+                 rooms=args.rooms, teachers=args.teachers, repeat=args.repeat)
+
+    print(f"Строк в schedules: {result['schedules_rows']}, повторов: {result['repeat']}")
+    print(f"{'запрос':<26}{'до, мс':>10}{'после, мс':>12}")
+    for name in HOT_QUERIES:
+        print(f"{name:<26}{result['before'][name]['avg_ms']:>10.3f}{result['after'][name]['avg_ms']:>12.3f}")
+    if args.plans:
+        for stage in ("before", "after"):
+            for name in HOT_QUERIES:
+                print(f"\n== {name} ({'до' if stage == 'before' else 'после'}) ==")
+                print("\n".join(result[stage][name]["plan"]))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
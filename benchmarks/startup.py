@@ -0,0 +1,122 @@
+"""
+Время холодного запуска приложения: main.py запускается отдельным
+процессом на платформе Qt offscreen, отчёт startup (SCHEDULE_STARTUP_REPORT)
+читается после готовности базы (или после неудачного подключения к ней),
+процесс завершается.
+
+    python -m benchmarks.startup [--repeat 10] [--sqlite] [--json out.json]
+    python -m benchmarks.startup --max-first-window-ms 500
+
+Замеряется время от запуска процесса (вместе с запуском интерпретатора)
+до каждого этапа startup. Проверка (код возврата 1) не проходит, если
+медиана времени до первой отрисовки окна больше --max-first-window-ms или
+до неё загружен какой-либо из startup.HEAVY_MODULES.
+
+База — как у приложения (переменные окружения PGHOST, PGPORT, ...);
+--sqlite — встроенная база SQLite во временном файле.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import startup
+from benchmarks.hot_paths import summarize
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIRST_WINDOW = "первая отрисовка окна"
+DEFAULT_MAX_FIRST_WINDOW_MS = 1000.0
+REPORT_TIMEOUT_S = 30.0
+
+
+def launch(env: dict, report_path: str) -> dict:
+    """Один запуск main.py: {этап: мс от запуска процесса}, {этап: {модуль: загружен}}."""
+    env = dict(env, SCHEDULE_STARTUP_REPORT=report_path, QT_QPA_PLATFORM="offscreen")
+    spawned = time.time()
+    process = subprocess.Popen([sys.executable, os.path.join(ROOT, "main.py")], cwd=ROOT, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    try:
+        deadline = time.monotonic() + REPORT_TIMEOUT_S
+        while not os.path.exists(report_path):
+            if process.poll() is not None:
+                raise RuntimeError(f"main.py завершился с кодом {process.returncode}: "
+                                   + process.stderr.read().decode(errors="replace"))
+            if time.monotonic() > deadline:
+                raise RuntimeError("Нет отчёта о запуске")
+            time.sleep(0.005)
+    finally:
+        process.terminate()
+        process.wait()
+        process.stderr.close()
+
+    with open(report_path, encoding="utf-8") as f:
+        report = json.load(f)
+    os.remove(report_path)
+    offset_s = report["started"] - spawned
+    stages = {stage["name"]: stage["ms"] / 1000 + offset_s for stage in report["stages"]}
+    return stages, report["modules"]
+
+
+def run(repeat: int, env: dict) -> dict:
+    samples, loaded = {}, set()
+    with tempfile.TemporaryDirectory(prefix="bench_startup_") as out:
+        report_path = os.path.join(out, "startup.json")
+        for _ in range(repeat):
+            stages, modules = launch(env, report_path)
+            for name, seconds in stages.items():
+                samples.setdefault(name, []).append(seconds)
+            loaded.update(m for m, present in modules.get(FIRST_WINDOW, {}).items() if present)
+    return {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": sys.version.split()[0],
+            "repeat": repeat,
+            "heavy_modules_before_first_window": sorted(loaded),
+            "database_failed": startup.DATABASE_FAILED in samples,
+        },
+        "results": {name: summarize(values) for name, values in samples.items()},
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Время холодного запуска приложения")
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--sqlite", action="store_true", help="встроенная база SQLite во временном файле")
+    parser.add_argument("--max-first-window-ms", type=float, default=DEFAULT_MAX_FIRST_WINDOW_MS,
+                        help="допустимая медиана времени до первого окна, мс")
+    parser.add_argument("--json", metavar="PATH", help="сохранить результаты в JSON")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory(prefix="bench_startup_db_") as data_dir:
+        env = dict(os.environ)
+        if args.sqlite:
+            env.update(SCHEDULE_DB_BACKEND="sqlite", SCHEDULE_DB_PATH=os.path.join(data_dir, "bench.db"))
+        result = run(args.repeat, env)
+
+    print(f"{'этап':<32}{'медиана, мс':>13}{'p95, мс':>11}")
+    for name, stats in result["results"].items():
+        print(f"{name:<32}{stats['median_ms']:>13.1f}{stats['p95_ms']:>11.1f}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+
+    if result["meta"]["database_failed"]:
+        print("База недоступна: замерено только время до первого окна", file=sys.stderr)
+
+    failed = False
+    first_window = result["results"][FIRST_WINDOW]["median_ms"]
+    if first_window > args.max_first_window_ms:
+        print(f"Первое окно: {first_window:.1f} мс, допустимо {args.max_first_window_ms:.1f} мс", file=sys.stderr)
+        failed = True
+    heavy = result["meta"]["heavy_modules_before_first_window"]
+    if heavy:
+        print(f"До первого окна загружены: {', '.join(heavy)}", file=sys.stderr)
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,287 @@
+"""
+Командная строка для пакетной работы с базой расписаний без графического
+интерфейса (PyQt5 не импортируется).
+
+    python cli.py stats
+    python cli.py export --profile Осень -o расписания.xlsx
+    python cli.py export --profile 1 --schedule "Группа 101" -o 101.xlsx
+    python cli.py export --profile Осень --mode directory -o out/ --processes 4
+    python cli.py validate --profile Осень
+    python cli.py validate --all
+    python cli.py timetable teacher "Иванов И. И." --profile Осень
+    python cli.py timetable room 101 --profile Осень -o 101.xlsx
+    python cli.py import rooms аудитории.csv
+    python cli.py import teachers -        (имена из стандартного ввода)
+    python cli.py import schedule --profile Осень --schedule "Группа 101" 101.xlsx
+    python cli.py clone --profile Осень --name Весна --teacher "Иванов И. И.=Петров П. П."
+    python cli.py clone --profile Осень --schedule "Группа 101" --name "Группа 102" --room 101=
+
+Параметры подключения: --host, --port, --dbname, --user и переменные
+окружения PGHOST, PGPORT, PGDATABASE, PGUSER, PGPASSWORD; --sqlite PATH —
+встроенная база SQLite (см. db.DB_BACKEND).
+
+--stats PATH записывает в JSON счётчики запросов по функциям db (см. dbstats),
+--slow-ms — порог, после которого запрос с параметрами выводится в stderr.
+
+Результаты выводятся построчно, поля разделены табуляцией; прогресс
+и ошибки — в stderr. Коды возврата: 0 — успех, 1 — найдены конфликты или строки
+с ошибками, 2 — ошибка.
+"""
+import argparse
+import os
+import sys
+
+import db
+import storage
+
+EXIT_OK = 0
+EXIT_PROBLEMS = 1
+EXIT_ERROR = 2
+
+WEEK_NAMES = {0: "", 1: "нечет", 2: "чет"}
+
+
+class CliError(Exception):
+    pass
+
+
+def emit(*fields):
+    print("\t".join("" if f is None else str(f) for f in fields))
+
+
+def _progress(label):
+    """Прогресс в stderr, только если он выводится в терминал."""
+    if not sys.stderr.isatty():
+        return None
+
+    def report(done, total):
+        sys.stderr.write(f"\r{label}: {done}/{total}")
+        if done >= total:
+            sys.stderr.write("\n")
+        sys.stderr.flush()
+    return report
+
+
+def find_profile(value: str):
+    """Профиль по id или имени: (id, name, max_pairs)."""
+    for profile in db.list_profiles():
+        if str(profile[0]) == value or profile[1] == value:
+            return profile
+    raise CliError(f"Профиль «{value}» не найден")
+
+
+def find_schedule(profile_id: int, value: str):
+    """Расписание профиля по id или имени: (id, name, schedule_type)."""
+    for schedule in db.list_schedules(profile_id):
+        if str(schedule[0]) == value or schedule[1] == value:
+            return schedule
+    raise CliError(f"Расписание «{value}» не найдено")
+
+
+# Команды
+
+def cmd_stats(args):
+    stats = db.database_stats()
+    emit("rooms", stats["rooms"])
+    emit("teachers", stats["teachers"])
+    for profile_id, name, max_pairs, schedules, entries in stats["profiles"]:
+        emit("profile", profile_id, name, max_pairs, schedules, entries)
+    return EXIT_OK
+
+
+def cmd_export(args):
+    profile_id, profile_name, _ = find_profile(args.profile)
+    if args.schedule is not None:
+        schedule_id, name, _ = find_schedule(profile_id, args.schedule)
+        if not db.export_schedule_to_excel(schedule_id, args.output, _progress(name)):
+            raise CliError(f"Не удалось выгрузить расписание «{name}»")
+        emit(name, args.output)
+        return EXIT_OK
+
+    exported = db.export_profile_to_excel(
+        profile_id, args.output, args.mode, args.processes, _progress(profile_name)
+    )
+    for name, target in exported:
+        emit(name, target)
+    return EXIT_OK
+
+
+def cmd_validate(args):
+    profile_id = find_profile(args.profile)[0] if args.profile else None
+    found = db.find_double_bookings(profile_id)
+    for kind, who, day, pair, week, _, schedule, other_week, _, other in found:
+        emit(kind, who, day, pair, WEEK_NAMES.get(week, week), schedule,
+             WEEK_NAMES.get(other_week, other_week), other)
+    print(f"Конфликтов: {len(found)}", file=sys.stderr)
+    return EXIT_PROBLEMS if found else EXIT_OK
+
+
+def cmd_timetable(args):
+    from timetable import is_two_week, timetable_columns, timetable_grid
+
+    entities = db.list_teacher_ids() if args.kind == "teacher" else db.list_room_ids()
+    entity_id = next((i for i, name in entities if name == args.name), None)
+    if entity_id is None:
+        raise CliError(f"«{args.name}» не найден")
+    profile_id = find_profile(args.profile)[0] if args.profile else None
+    if args.output:
+        db.export_timetable_to_excel(args.kind, entity_id, args.output, profile_id)
+        emit(args.name, args.output)
+        return EXIT_OK
+
+    rows = db.get_timetable(args.kind, entity_id, profile_id)
+    two_week = is_two_week(rows)
+    emit(*timetable_columns(args.kind, two_week))
+    for row in timetable_grid(rows, two_week):
+        emit(*row)
+    return EXIT_OK
+
+
+def cmd_import(args):
+    from importer import import_file
+
+    schedule_id = None
+    if args.kind == "schedule":
+        if not args.profile or not args.schedule:
+            raise CliError("Для загрузки расписания нужны --profile и --schedule")
+        profile_id, _, _ = find_profile(args.profile)
+        try:
+            schedule_id = find_schedule(profile_id, args.schedule)[0]
+        except CliError:
+            if not args.create:
+                raise
+            schedule_id = db.create_schedule(profile_id, args.schedule, args.create)
+
+    result = import_file(args.kind, args.file, schedule_id, not args.merge)
+    for line, message in result.get("errors", []):
+        emit("error", line, message)
+    for key in ("read", "added", "imported"):
+        if key in result:
+            emit(key, result[key])
+    return EXIT_PROBLEMS if result.get("errors") else EXIT_OK
+
+
+def _name_map(values, option):
+    """["старое=новое", ...] -> {старое: новое или None}; пустое новое имя убирает его из копии."""
+    mapping = {}
+    for value in values or []:
+        old, sep, new = value.partition("=")
+        if not sep or not old.strip():
+            raise CliError(f"{option}: ожидается «старое=новое», получено «{value}»")
+        mapping[old.strip()] = new.strip() or None
+    return mapping
+
+
+def cmd_clone(args):
+    profile_id, _, _ = find_profile(args.profile)
+    room_map = _name_map(args.room, "--room")
+    teacher_map = _name_map(args.teacher, "--teacher")
+    if args.schedule is None:
+        result = db.clone_profile(profile_id, args.name, room_map=room_map, teacher_map=teacher_map)
+        emit("profile", result["profile_id"], args.name)
+        emit("schedules", result["schedules"])
+    else:
+        schedule_id = find_schedule(profile_id, args.schedule)[0]
+        target = find_profile(args.to_profile)[0] if args.to_profile else None
+        result = db.clone_schedule(schedule_id, args.name, target, room_map, teacher_map,
+                                   recompute_times=not args.keep_times)
+        emit("schedule", result["schedule_id"], args.name)
+    emit("copied", result["copied"])
+    emit("skipped", result["skipped"])
+    return EXIT_OK
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="cli.py", description="Пакетная работа с базой расписаний")
+    parser.add_argument("--host", help="сервер PostgreSQL (по умолчанию из db.DB_PARAMS)")
+    parser.add_argument("--port", type=int)
+    parser.add_argument("--dbname")
+    parser.add_argument("--user", help="пароль берётся из переменной PGPASSWORD")
+    parser.add_argument("--sqlite", metavar="PATH", help="работать со встроенной базой SQLite в файле PATH")
+    parser.add_argument("--stats", metavar="PATH", help="сохранить счётчики запросов в JSON-файл")
+    parser.add_argument("--slow-ms", type=float, help="порог медленного запроса, мс")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("stats", help="сводка по справочникам и профилям")
+    p.set_defaults(func=cmd_stats)
+
+    p = sub.add_parser("export", help="выгрузка расписаний в xlsx")
+    p.add_argument("--profile", required=True, help="id или имя профиля")
+    p.add_argument("--schedule", help="id или имя расписания (по умолчанию — все расписания профиля)")
+    p.add_argument("-o", "--output", required=True, help="файл xlsx или каталог для --mode directory")
+    p.add_argument("--mode", choices=["workbook", "directory"], default="workbook",
+                   help="одна книга с листом на расписание или файл на расписание")
+    p.add_argument("--processes", type=int, default=None, help="число процессов для --mode directory")
+    p.set_defaults(func=cmd_export)
+
+    p = sub.add_parser("validate", help="двойные бронирования аудиторий и преподавателей")
+    scope = p.add_mutually_exclusive_group(required=True)
+    scope.add_argument("--profile", help="id или имя профиля")
+    scope.add_argument("--all", action="store_true", help="все расписания базы")
+    p.set_defaults(func=cmd_validate)
+
+    p = sub.add_parser("timetable", help="сводное расписание преподавателя или аудитории")
+    p.add_argument("kind", choices=["teacher", "room"])
+    p.add_argument("name", help="имя преподавателя или аудитории")
+    p.add_argument("--profile", help="id или имя профиля (по умолчанию — все профили)")
+    p.add_argument("-o", "--output", help="выгрузить в xlsx вместо вывода в stdout")
+    p.set_defaults(func=cmd_timetable)
+
+    p = sub.add_parser("import", help="загрузка справочников и расписаний из CSV или xlsx")
+    p.add_argument("kind", choices=["rooms", "teachers", "schedule"])
+    p.add_argument("file", help="CSV, xlsx или «-» (CSV из стандартного ввода)")
+    p.add_argument("--profile", help="id или имя профиля (для schedule)")
+    p.add_argument("--schedule", help="id или имя расписания (для schedule)")
+    p.add_argument("--create", choices=["Обычное", "Двухнедельное"],
+                   help="создать расписание этого типа, если его нет")
+    p.add_argument("--merge", action="store_true",
+                   help="не очищать расписание перед загрузкой")
+    p.set_defaults(func=cmd_import)
+
+    p = sub.add_parser("clone", help="копия расписания или профиля со всеми расписаниями на сервере")
+    p.add_argument("--profile", required=True, help="id или имя исходного профиля")
+    p.add_argument("--schedule", help="id или имя расписания (по умолчанию копируется весь профиль)")
+    p.add_argument("--name", required=True, help="имя нового профиля или копии расписания")
+    p.add_argument("--to-profile", help="профиль для копии расписания (по умолчанию — тот же)")
+    p.add_argument("--room", action="append", metavar="СТАРАЯ=НОВАЯ",
+                   help="заменить аудиторию в копии; пустое новое имя убирает её")
+    p.add_argument("--teacher", action="append", metavar="СТАРЫЙ=НОВЫЙ",
+                   help="заменить преподавателя в копии; пустое новое имя убирает его")
+    p.add_argument("--keep-times", action="store_true",
+                   help="не пересчитывать время занятий по профилю копии расписания")
+    p.set_defaults(func=cmd_clone)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.sqlite:
+        db.configure("sqlite", path=args.sqlite)
+    for key in ("host", "port", "dbname", "user"):
+        if getattr(args, key) is not None:
+            db.DB_PARAMS[key] = getattr(args, key)
+    if args.stats or args.slow_ms is not None:
+        db.enable_instrumentation(args.slow_ms)
+    try:
+        if args.sqlite:
+            # Встроенная база принадлежит приложению: схема доводится до актуальной сразу
+            import migrations
+            migrations.migrate()
+        return args.func(args)
+    except BrokenPipeError:
+        # Вывод обрезан (например, через head) — это не ошибка
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        return EXIT_OK
+    except (CliError, ValueError, OSError) + storage.database_errors() as e:
+        print(f"Ошибка: {e}", file=sys.stderr)
+        return EXIT_ERROR
+    except KeyboardInterrupt:
+        return EXIT_ERROR
+    finally:
+        if args.stats:
+            db.dump_instrumentation(args.stats)
+        db.close_pool()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,16 +1,210 @@
-import psycopg2
-import pandas as pd
+import atexit
+import datetime
+import hashlib
+import os
+import select
+import threading
+from contextlib import contextmanager
+
+import dbstats
+import refcache
+import storage
+from pool import ConnectionPool
+from refcache import cached
+from storage import DAYS
+from timetable import KINDS, kind_info
+
+# Движок хранения: "postgresql" или "sqlite" (встроенная база в файле SQLITE_PATH).
+# Параметры берутся из переменных окружения, иначе — значения по умолчанию
+DB_BACKEND = os.environ.get("SCHEDULE_DB_BACKEND", "postgresql")
+SQLITE_PATH = os.environ.get("SCHEDULE_DB_PATH", "schedule.db")
 
 DB_PARAMS = {
-    "dbname": "postgres",
-    "user": "postgres",
-    "password": "0000",
-    "host": "localhost",
-    "port": 5433,
+    "dbname": os.environ.get("PGDATABASE", "postgres"),
+    "user": os.environ.get("PGUSER", "postgres"),
+    "password": os.environ.get("PGPASSWORD", "0000"),
+    "host": os.environ.get("PGHOST", "localhost"),
+    "port": int(os.environ.get("PGPORT", 5433)),
 }
 
+class OperationCancelled(Exception):
+    """Длительная операция прервана по запросу пользователя."""
+
+
+class ScheduleVersionConflict(Exception):
+    """Расписание успели сохранить из другого окна или клиента: версия устарела."""
+
+
+def check_cancel(cancel):
+    if cancel is not None and cancel.is_set():
+        raise OperationCancelled("Операция отменена")
+
+# Границы пула соединений
+POOL_MIN = 1
+POOL_MAX = 10
+POOL_TIMEOUT = 30.0
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _create_pool(minconn, maxconn, timeout) -> ConnectionPool:
+    return ConnectionPool(
+        storage.create_backend(DB_BACKEND, DB_PARAMS, SQLITE_PATH),
+        minconn=POOL_MIN if minconn is None else minconn,
+        maxconn=POOL_MAX if maxconn is None else maxconn,
+        timeout=POOL_TIMEOUT if timeout is None else timeout,
+    )
+
+
+def init_pool(minconn: int = None, maxconn: int = None, timeout: float = None) -> ConnectionPool:
+    """Создаёт (или пересоздаёт) пул соединений с заданными границами."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.closeall()
+        _pool = _create_pool(minconn, maxconn, timeout)
+        return _pool
+
+
+def _get_pool() -> ConnectionPool:
+    global _pool
+    pool = _pool
+    if pool is not None and not pool.closed:
+        return pool
+    with _pool_lock:
+        if _pool is None or _pool.closed:
+            _pool = _create_pool(None, None, None)
+        return _pool
+
+
+def close_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.closeall()
+            _pool = None
+
+
+def backend():
+    """Текущий движок хранения (storage.PostgresBackend или storage.SqliteBackend)."""
+    return _get_pool().backend
+
+
+def configure(backend_name: str = None, **options):
+    """
+    Переключает db на другую базу: configure("sqlite", path="schedule.db")
+    или configure("postgresql", host=..., port=..., ...). Пул, кэш
+    справочников и индекс занятости сбрасываются.
+    """
+    global DB_BACKEND, SQLITE_PATH
+    stop_change_listener()
+    close_pool()
+    disable_occupancy_index()
+    refcache.cache.clear()
+    if backend_name is not None:
+        DB_BACKEND = backend_name
+    if "path" in options:
+        SQLITE_PATH = options.pop("path")
+    DB_PARAMS.update(options)
+
+
+def pool_stats() -> dict:
+    """Счётчики пула: hits, misses, waits, timeouts, discarded и текущий размер."""
+    pool = _pool
+    return pool.stats() if pool is not None else {}
+
+
+atexit.register(close_pool)
+
+
+# Сброс кэша справочников по уведомлениям других клиентов
+REFERENCE_CHANNEL = "reference_data"
+
+_listener = None
+
+
+class _ChangeListener(threading.Thread):
+    """
+    Держит отдельное соединение с LISTEN reference_data и сбрасывает
+    темы кэша, о которых сообщают триггеры. После переподключения кэш
+    очищается целиком: уведомления за время разрыва потеряны.
+    """
+
+    def __init__(self):
+        super().__init__(name="reference-listener", daemon=True)
+        self.stop_event = threading.Event()
+
+    def run(self):
+        engine = backend()
+        while not self.stop_event.is_set():
+            conn = None
+            try:
+                conn = engine.connect_listener()
+                with conn.cursor() as cur:
+                    cur.execute(f"LISTEN {REFERENCE_CHANNEL};")
+                refcache.cache.clear()
+                while not self.stop_event.is_set():
+                    if select.select([conn], [], [], 1.0) == ([], [], []):
+                        continue
+                    conn.poll()
+                    topics = {n.payload for n in conn.notifies}
+                    conn.notifies.clear()
+                    if topics:
+                        refcache.invalidate(*topics)
+            except engine.Error as e:
+                print(f"[Уведомления об изменениях]: {e}")
+                self.stop_event.wait(5)
+            finally:
+                if conn is not None:
+                    conn.close()
+
+
+def start_change_listener():
+    """
+    Запускает слушатель уведомлений. Встроенной базой SQLite пользуется
+    один процесс, кэш и так сбрасывается при каждой записи.
+    """
+    global _listener
+    if not backend().supports_notify:
+        return
+    if _listener is None or not _listener.is_alive():
+        _listener = _ChangeListener()
+        _listener.start()
+
+
+def stop_change_listener():
+    global _listener
+    if _listener is not None:
+        _listener.stop_event.set()
+        _listener.join(timeout=2)
+        _listener = None
+
+
+atexit.register(stop_change_listener)
+
+
+@contextmanager
 def get_connection():
-    return psycopg2.connect(**DB_PARAMS)
+    """
+    Выдаёт соединение из пула. Как и у обычного соединения psycopg2,
+    транзакция фиксируется при успешном выходе из блока with
+    и откатывается при исключении; затем соединение возвращается в пул.
+    """
+    pool = _get_pool()
+    tracker = dbstats.ConnectionTracker() if dbstats.enabled else None
+    conn = pool.getconn()
+    broken = False
+    try:
+        with conn:
+            yield conn if tracker is None else tracker.wrap(conn)
+    except pool.backend.connection_errors:
+        broken = True
+        raise
+    finally:
+        pool.putconn(conn, close=broken)
+        if tracker is not None:
+            tracker.close()
 
 # Профили
 def create_profile(name: str, max_pairs: int) -> int:
@@ -22,8 +216,10 @@ def create_profile(name: str, max_pairs: int) -> int:
             )
             profile_id = cur.fetchone()[0]
             conn.commit()
-            return profile_id
+    refcache.invalidate("profiles")
+    return profile_id
 
+@cached("profiles")
 def list_profiles() -> list:
     with get_connection() as conn:
         with conn.cursor() as cur:
@@ -43,7 +239,9 @@ def set_profile_times(profile_id: int, intervals: list):
                 [(profile_id, num, st, et) for num, st, et in intervals]
             )
         conn.commit()
+    refcache.invalidate("profile_times")
 
+@cached("profile_times")
 def get_profile_times(profile_id: int) -> list:
     with get_connection() as conn:
         with conn.cursor() as cur:
@@ -59,18 +257,36 @@ def get_profile_times(profile_id: int) -> list:
             return cur.fetchall()
 
 # Справочники
+@cached("rooms")
 def list_rooms() -> list:
     with get_connection() as conn:
         with conn.cursor() as cur:
             cur.execute("SELECT name FROM rooms ORDER BY name;")
             return [r[0] for r in cur.fetchall()]
 
+@cached("teachers")
 def list_teachers() -> list:
     with get_connection() as conn:
         with conn.cursor() as cur:
             cur.execute("SELECT name FROM teachers ORDER BY name;")
             return [t[0] for t in cur.fetchall()]
 
+@cached("rooms")
+def list_room_ids() -> list:
+    """[(id, name)] всех аудиторий по имени."""
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT id, name FROM rooms ORDER BY name;")
+            return cur.fetchall()
+
+@cached("teachers")
+def list_teacher_ids() -> list:
+    """[(id, name)] всех преподавателей по имени."""
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT id, name FROM teachers ORDER BY name;")
+            return cur.fetchall()
+
 def get_room_id(name: str) -> int:
     with get_connection() as conn:
         with conn.cursor() as cur:
@@ -85,7 +301,98 @@ def get_teacher_id(name: str) -> int:
             t = cur.fetchone()
             return t[0] if t else None
 
+# Поиск по справочникам
+SEARCH_LIMIT = 20
+
+
+def _like_escape(text: str) -> str:
+    return text.replace("!", "!!").replace("%", "!%").replace("_", "!_")
+
+
+def search_rank(name: str, query: str) -> tuple:
+    """
+    Ключ сортировки результатов search_names (query — в нижнем регистре):
+    точное совпадение, начало имени, начало слова, подстрока; затем короче и по алфавиту.
+    """
+    folded = name.lower()
+    if folded == query:
+        group = 0
+    elif folded.startswith(query):
+        group = 1
+    elif (" " + folded).find(" " + query) >= 0:
+        group = 2
+    else:
+        group = 3
+    return group, len(name), name
+
+
+def search_names(kind: str, text: str, limit: int = SEARCH_LIMIT) -> list:
+    """
+    До limit имён аудиторий (kind="room") или преподавателей ("teacher"),
+    содержащих text без учёта регистра, в порядке search_rank.
+
+    Сначала ищутся имена, начинающиеся с text (индекс по lower(name)),
+    и только если их меньше limit — остальные вхождения (триграммный
+    индекс, если он есть, см. migrations.NAME_SEARCH_INDEXES). Поэтому
+    меньше limit результатов значит, что других совпадений нет.
+    """
+    table = kind_info(kind)["table"]
+    engine = backend()
+    folded = engine.lower("name")
+    query = text.strip().lower()
+    params = {"query": query, "prefix": _like_escape(query) + "%",
+              "word": "% " + _like_escape(query) + "%",
+              "contains": "%" + _like_escape(query) + "%", "limit": limit}
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            if not query:
+                cur.execute(f"SELECT name FROM {table} ORDER BY name LIMIT %(limit)s;", params)
+                return [r[0] for r in cur.fetchall()]
+            cur.execute(f"""
+                SELECT name FROM {table}
+                WHERE {folded} LIKE %(prefix)s ESCAPE '!'
+                ORDER BY {folded} = %(query)s DESC, length(name), name
+                LIMIT %(limit)s;
+            """, params)
+            names = [r[0] for r in cur.fetchall()]
+            if len(names) < limit:
+                params["limit"] = limit - len(names)
+                cur.execute(f"""
+                    SELECT name FROM {table}
+                    WHERE {folded} LIKE %(contains)s ESCAPE '!'
+                      AND {folded} NOT LIKE %(prefix)s ESCAPE '!'
+                    ORDER BY {folded} LIKE %(word)s ESCAPE '!' DESC, length(name), name
+                    LIMIT %(limit)s;
+                """, params)
+                names += [r[0] for r in cur.fetchall()]
+            return names
+
+def _add_names(table: str, names) -> int:
+    """Добавляет недостающие имена в справочник. Возвращает число добавленных."""
+    names = list(dict.fromkeys(n.strip() for n in names if n and n.strip()))
+    if not names:
+        return 0
+    with get_connection() as conn:
+        engine = backend()
+        with conn.cursor() as cur:
+            cur.execute(f"""
+                INSERT INTO {table} (name)
+                SELECT name FROM {engine.rows([("name", "text")])}
+                WHERE true
+                ON CONFLICT (name) DO NOTHING;
+            """, engine.rows_params([("name", "text")], [(n,) for n in names]))
+            added = cur.rowcount
+    refcache.invalidate(table)
+    return added
+
+def add_rooms(names) -> int:
+    return _add_names("rooms", names)
+
+def add_teachers(names) -> int:
+    return _add_names("teachers", names)
+
 # Расписания
+@cached("schedules_list")
 def list_schedules(profile_id: int) -> list:
     with get_connection() as conn:
         with conn.cursor() as cur:
@@ -107,54 +414,335 @@ def create_schedule(profile_id: int, name: str, schedule_type: str) -> int:
             )
             sid = cur.fetchone()[0]
             conn.commit()
-            return sid
+    refcache.invalidate("schedules_list")
+    return sid
+
+def database_stats() -> dict:
+    """
+    Сводка по базе: размеры справочников и по каждому профилю
+    число расписаний и записей.
+    """
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT (SELECT count(*) FROM rooms), (SELECT count(*) FROM teachers);")
+            rooms, teachers = cur.fetchone()
+            cur.execute("""
+                SELECT p.id, p.name, p.max_pairs,
+                       count(DISTINCT sl.id) AS schedules,
+                       count(s.id) AS entries
+                FROM profiles p
+                LEFT JOIN schedules_list sl ON sl.profile_id = p.id
+                LEFT JOIN schedules s ON s.schedule_id = sl.id
+                GROUP BY p.id
+                ORDER BY p.id;
+            """)
+            profiles = cur.fetchall()
+    return {"rooms": rooms, "teachers": teachers, "profiles": profiles}
+
+def _resolve_names(cur, table: str, names) -> dict:
+    """Возвращает {имя: id} для всех найденных имён за один запрос."""
+    names = list(names)
+    if not names:
+        return {}
+    engine = backend()
+    cur.execute(f"SELECT name, id FROM {table} WHERE {engine.any('name')};", (engine.array(names),))
+    return dict(cur.fetchall())
+
+
+def _format_time_interval(start_time, end_time) -> str:
+    return f"{start_time.strftime('%H:%M')} - {end_time.strftime('%H:%M')}"
+
+
+def _schedule_time_intervals(cur, schedule_id: int) -> dict:
+    """Возвращает {pair_number: "ЧЧ:ММ - ЧЧ:ММ"} для профиля расписания."""
+    cur.execute(
+        """
+        SELECT pt.pair_number, pt.start_time, pt.end_time
+        FROM profile_times pt
+        JOIN schedules_list sl ON sl.profile_id = pt.profile_id
+        WHERE sl.id = %s;
+        """,
+        (schedule_id,)
+    )
+    return {num: _format_time_interval(st, et) for num, st, et in cur.fetchall()}
+
+
+def _prepare_schedule_rows(cur, schedule_id: int, entries: list) -> list:
+    """
+    Превращает записи редактора в строки таблицы schedules.
+    Имена аудиторий и преподавателей и время пар разрешаются
+    одним запросом на справочник; записи с несуществующим
+    номером пары пропускаются.
+    """
+    intervals = _schedule_time_intervals(cur, schedule_id)
+    room_ids = _resolve_names(cur, "rooms", {e[2].strip() for e in entries if e[2]})
+    teacher_ids = _resolve_names(cur, "teachers", {e[3].strip() for e in entries if e[3]})
+
+    rows = []
+    for day, pair_number, room, teacher, lesson_type, discipline, week_type in entries:
+        time_interval = intervals.get(pair_number)
+        if time_interval is None:
+            continue
+        rows.append((
+            schedule_id, day, pair_number,
+            room_ids.get(room.strip()) if room else None,
+            teacher_ids.get(teacher.strip()) if teacher else None,
+            lesson_type or "", discipline or "", week_type, time_interval
+        ))
+    return rows
+
+
+def _stored_schedule_rows(cur, schedule_id: int, keys: list = None) -> dict:
+    """
+    Возвращает сохранённые строки расписания (только ключи keys, если заданы):
+    {(week_day, pair_number, week_type): (id, room_id, teacher_id, lesson_type, discipline, time_interval)}
+    Строки блокируются до конца транзакции.
+    """
+    engine = backend()
+    params = [schedule_id]
+    only_keys = ""
+    if keys is not None:
+        columns = [("week_day", "day"), ("pair_number", "int"), ("week_type", "int")]
+        only_keys = f"""
+          AND (week_day, pair_number, week_type) IN (
+              SELECT k.week_day, k.pair_number, k.week_type FROM {engine.rows(columns, "k")}
+          )"""
+        params += engine.rows_params(columns, keys)
+    cur.execute(
+        f"""
+        SELECT week_day, pair_number, week_type,
+               id, room_id, teacher_id, lesson_type, discipline, time_interval
+        FROM schedules
+        WHERE schedule_id = %s{only_keys}{engine.for_update};
+        """,
+        params
+    )
+    return {(r[0], r[1], r[2]): r[3:] for r in cur.fetchall()}
+
+
+def _upsert_schedule_rows(cur, rows: list):
+    backend().execute_values(cur, """
+        INSERT INTO schedules (
+          schedule_id, week_day, pair_number,
+          room_id, teacher_id, lesson_type,
+          discipline, week_type, time_interval
+        ) VALUES %s
+        ON CONFLICT (schedule_id, week_day, pair_number, week_type) DO UPDATE SET
+          room_id = EXCLUDED.room_id,
+          teacher_id = EXCLUDED.teacher_id,
+          lesson_type = EXCLUDED.lesson_type,
+          discipline = EXCLUDED.discipline,
+          time_interval = EXCLUDED.time_interval;
+    """, rows, page_size=1000)
+
+
+def _diff_schedule_rows(stored: dict, rows: list):
+    """
+    Сравнивает подготовленные строки с сохранёнными.
+    Возвращает (новые строки, изменённые строки, id удаляемых строк).
+    """
+    inserts, updates = [], []
+    submitted = set()
+    for row in rows:
+        key = (row[1], row[2], row[7])
+        submitted.add(key)
+        old = stored.get(key)
+        if old is None:
+            inserts.append(row)
+        elif old[1:] != (row[3], row[4], row[5], row[6], row[8]):
+            updates.append(row)
+    deletes = [old[0] for key, old in stored.items() if key not in submitted]
+    return inserts, updates, deletes
+
+
+def _is_cleared(entry) -> bool:
+    """Запись редактора без аудитории, вида, преподавателя и дисциплины."""
+    return not any(field and field.strip() for field in entry[2:6])
+
+
+def _write_in_chunks(cursor, write, rows: list, progress=None, cancel=None, chunk_size: int = 500):
+    """Пишет rows порциями, сообщая прогресс и проверяя отмену между порциями."""
+    total = len(rows)
+    for start in range(0, total, chunk_size):
+        check_cancel(cancel)
+        write(cursor, rows[start:start + chunk_size])
+        if progress is not None:
+            progress(min(start + chunk_size, total), total)
+
+
+def _begin_schedule_write(cur, schedule_id: int, expected_version: int = None) -> tuple:
+    """
+    Начинает запись расписания: увеличивает его версию, если она равна
+    expected_version (None — любая), и возвращает (новая версия, profile_id).
+    Строка расписания остаётся заблокированной до конца транзакции, так что
+    сохранения одного расписания идут по очереди, а разных — не ждут друг друга.
+    """
+    backend().begin_write(cur)
+    if expected_version is None:
+        cur.execute("UPDATE schedules_list SET version = version + 1 WHERE id = %s RETURNING version, profile_id;",
+                    (schedule_id,))
+    else:
+        cur.execute("UPDATE schedules_list SET version = version + 1 WHERE id = %s AND version = %s "
+                    "RETURNING version, profile_id;", (schedule_id, expected_version))
+    found = cur.fetchone()
+    if found is not None:
+        return tuple(found)
+    if expected_version is None:
+        raise ValueError(f"Расписание {schedule_id} не найдено")
+    raise ScheduleVersionConflict(
+        "Расписание уже изменено в другом окне или другим пользователем. "
+        "Загрузите актуальную версию и повторите правки."
+    )
+
+
+def _lock_key(text: str) -> int:
+    digest = hashlib.blake2b(text.encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big", signed=True)
+
+
+def _slot_lock_keys(rows: list) -> set:
+    """Ключи блокировок (аудитория или преподаватель, день, пара) для подготовленных строк."""
+    keys = set()
+    for row in rows:
+        for kind, entity_id in (("room", row[3]), ("teacher", row[4])):
+            if entity_id is not None:
+                keys.add(_lock_key(f"{kind}:{entity_id}:{row[1]}:{row[2]}"))
+    return keys
+
+
+def lock_slots(cur, rows: list):
+    """
+    Блокирует до конца транзакции слоты аудиторий и преподавателей, которые
+    займут строки rows = [(schedule_id, день, пара, room_id, teacher_id, ...)].
+    Неделя не учитывается: общая неделя пересекается с обеими. Другая запись
+    в те же слоты ждёт конца транзакции, поэтому проверка занятости после
+    блокировки (find_conflicts) и сама запись атомарны.
+    """
+    backend().lock_keys(cur, _slot_lock_keys(rows))
+
+
+def _lock_and_check(cur, schedule_id: int, rows: list, entries: list, check_conflicts: bool) -> list:
+    """lock_slots и, при check_conflicts, find_conflicts уже под блокировками."""
+    lock_slots(cur, rows)
+    return find_conflicts(cur, schedule_id, entries) if check_conflicts else []
+
+
+def _insert_schedule_rows(cur, rows: list):
+    backend().execute_values(cur, """
+        INSERT INTO schedules (
+          schedule_id, week_day, pair_number,
+          room_id, teacher_id, lesson_type,
+          discipline, week_type, time_interval
+        ) VALUES %s;
+    """, rows, page_size=1000)
 
-def save_schedule_entries(schedule_id: int, entries: list):
+
+def save_schedule_entries(schedule_id: int, entries: list, incremental: bool = False,
+                          expected_version: int = None, check_conflicts: bool = False,
+                          progress=None, cancel=None) -> dict:
     """
     entries = [
       (day_of_week:str, pair_number:int, room:str, teacher:str,
        lesson_type:str, discipline:str, week_type:int)
     ]
+
+    При incremental=False расписание перезаписывается целиком.
+    При incremental=True записи сравниваются с сохранёнными: изменённые
+    ключи (week_day, pair_number, week_type) обновляются через
+    ON CONFLICT, а ключи, которых больше нет среди записей, удаляются.
+    Результат в обоих режимах одинаков.
+
+    expected_version — версия расписания, с которой начиналось
+    редактирование: если её уже сменила другая запись, выбрасывается
+    ScheduleVersionConflict. При check_conflicts=True занятость проверяется
+    в той же транзакции под блокировками слотов (см. _lock_and_check),
+    и при конфликтах ничего не записывается.
+
+    progress(done, total) вызывается по мере записи строк; если событие
+    cancel установлено, транзакция откатывается и выбрасывается
+    OperationCancelled.
+
+    Возвращает {"inserted": int, "updated": int, "deleted": int,
+    "version": новая версия, "conflicts": [как у find_schedule_conflicts]}.
     """
     try:
         with get_connection() as conn:
             with conn.cursor() as cursor:
-                cursor.execute("DELETE FROM schedules WHERE schedule_id = %s;", (schedule_id,))
-
-                for row in entries:
-                    day, pair_number, room, teacher, lesson_type, discipline, week_type = row
-
-                    room_id = get_room_id(room.strip()) if room else None
-                    teacher_id = get_teacher_id(teacher.strip()) if teacher else None
-
-                    cursor.execute(
-                        """
-                        SELECT start_time, end_time
-                        FROM profile_times
-                        WHERE profile_id = (
-                            SELECT profile_id FROM schedules_list WHERE id = %s
-                        ) AND pair_number = %s;
-                        """,
-                        (schedule_id, pair_number)
-                    )
-                    result = cursor.fetchone()
-                    if not result:
-                        continue
-                    start_time, end_time = result
-                    time_interval = f"{start_time.strftime('%H:%M')} - {end_time.strftime('%H:%M')}"
-                    cursor.execute("""
-                        INSERT INTO schedules (
-                          schedule_id, week_day, pair_number,
-                          room_id, teacher_id, lesson_type,
-                          discipline, week_type, time_interval
-                        ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s);
-                    """, (
-                        schedule_id, day, pair_number,
-                        room_id, teacher_id, lesson_type or "",
-                        discipline or "", week_type, time_interval
-                    ))
+                version, profile_id = _begin_schedule_write(cursor, schedule_id, expected_version)
+                rows = _prepare_schedule_rows(cursor, schedule_id, entries)
+                conflicts = _lock_and_check(cursor, schedule_id, rows, entries, check_conflicts)
+                if conflicts:
+                    conn.rollback()
+                    return {"inserted": 0, "updated": 0, "deleted": 0,
+                            "version": expected_version, "conflicts": conflicts}
+                check_cancel(cancel)
 
-        conn.commit()
+                if not incremental:
+                    cursor.execute("DELETE FROM schedules WHERE schedule_id = %s;", (schedule_id,))
+                    summary = {"inserted": len(rows), "updated": 0, "deleted": cursor.rowcount}
+                    _write_in_chunks(cursor, _insert_schedule_rows, rows, progress, cancel)
+                else:
+                    stored = _stored_schedule_rows(cursor, schedule_id)
+                    inserts, updates, deletes = _diff_schedule_rows(stored, rows)
+                    if deletes:
+                        engine = backend()
+                        cursor.execute(f"DELETE FROM schedules WHERE {engine.any('id')};", (engine.array(deletes),))
+                    _write_in_chunks(cursor, _upsert_schedule_rows, inserts + updates, progress, cancel)
+                    summary = {"inserted": len(inserts), "updated": len(updates), "deleted": len(deletes)}
+                check_cancel(cancel)
+            conn.commit()
+        refcache.invalidate("schedules")
+        if _occupancy is not None:
+            _occupancy.replace_schedule(schedule_id, profile_id, [(r[1], r[2], r[7], r[3], r[4]) for r in rows])
+        summary.update(version=version, conflicts=[])
+        return summary
+    except (OperationCancelled, ScheduleVersionConflict):
+        raise
+    except Exception as e:
+        print(f"[Ошибка сохранения]: {e}")
+        raise
+
+def save_schedule_changes(schedule_id: int, entries: list, expected_version: int = None,
+                          check_conflicts: bool = False, progress=None, cancel=None) -> dict:
+    """
+    Записывает только изменённые слоты (ScheduleTableModel.changed_entries)
+    в формате save_schedule_entries. Читаются и блокируются лишь строки
+    этих слотов, остальные строки расписания не трогаются, поэтому время
+    записи зависит от числа правок, а не от размера сетки. Строки очищенных
+    слотов (все четыре поля пустые) удаляются.
+    expected_version и check_conflicts — как у save_schedule_entries.
+
+    Возвращает {"inserted": int, "updated": int, "deleted": int,
+    "version": новая версия, "conflicts": [...]}.
+    """
+    filled = [e for e in entries if not _is_cleared(e)]
+    cleared = [(e[0], e[1], e[6]) for e in entries if _is_cleared(e)]
+    try:
+        with get_connection() as conn:
+            with conn.cursor() as cursor:
+                version, profile_id = _begin_schedule_write(cursor, schedule_id, expected_version)
+                rows = _prepare_schedule_rows(cursor, schedule_id, filled)
+                conflicts = _lock_and_check(cursor, schedule_id, rows, filled, check_conflicts)
+                if conflicts:
+                    conn.rollback()
+                    return {"inserted": 0, "updated": 0, "deleted": 0,
+                            "version": expected_version, "conflicts": conflicts}
+                stored = _stored_schedule_rows(cursor, schedule_id, [(r[1], r[2], r[7]) for r in rows] + cleared)
+                # Среди прочитанных строк без пары в rows — только очищенные слоты
+                inserts, updates, deletes = _diff_schedule_rows(stored, rows)
+                if deletes:
+                    engine = backend()
+                    cursor.execute(f"DELETE FROM schedules WHERE {engine.any('id')};", (engine.array(deletes),))
+                _write_in_chunks(cursor, _upsert_schedule_rows, inserts + updates, progress, cancel)
+                check_cancel(cancel)
+            conn.commit()
+        if inserts or updates or deletes:
+            refcache.invalidate("schedules")
+            refresh_occupancy(schedule_id, profile_id)
+        return {"inserted": len(inserts), "updated": len(updates), "deleted": len(deletes),
+                "version": version, "conflicts": []}
+    except (OperationCancelled, ScheduleVersionConflict):
+        raise
     except Exception as e:
         print(f"[Ошибка сохранения]: {e}")
         raise
@@ -163,10 +751,15 @@ def delete_profile(profile_id):
     with get_connection() as conn:
         with conn.cursor() as cur:
             cur.execute("DELETE FROM schedules WHERE schedule_id IN (SELECT id FROM schedules_list WHERE profile_id = %s);", (profile_id,))
-            cur.execute("DELETE FROM schedules_list WHERE profile_id = %s;", (profile_id,))
+            cur.execute("DELETE FROM schedules_list WHERE profile_id = %s RETURNING id;", (profile_id,))
+            schedule_ids = [r[0] for r in cur.fetchall()]
             cur.execute("DELETE FROM profile_times WHERE profile_id = %s;", (profile_id,))
             cur.execute("DELETE FROM profiles WHERE id = %s;", (profile_id,))
         conn.commit()
+    refcache.invalidate("profiles", "profile_times", "schedules_list", "schedules")
+    if _occupancy is not None:
+        for sid in schedule_ids:
+            _occupancy.remove_schedule(sid)
 
 def delete_schedule(schedule_id):
     with get_connection() as conn:
@@ -174,6 +767,169 @@ def delete_schedule(schedule_id):
             cur.execute("DELETE FROM schedules WHERE schedule_id = %s;", (schedule_id,))
             cur.execute("DELETE FROM schedules_list WHERE id = %s;", (schedule_id,))
         conn.commit()
+    refcache.invalidate("schedules_list", "schedules")
+    if _occupancy is not None:
+        _occupancy.remove_schedule(schedule_id)
+
+# Копирование расписаний на сервере
+_CLONE_QUERY = """
+    INSERT INTO schedules (schedule_id, week_day, pair_number, room_id, teacher_id,
+                           lesson_type, discipline, week_type, time_interval)
+    SELECT m.target_id, s.week_day, s.pair_number,
+           CASE WHEN rm.old_id IS NULL THEN s.room_id ELSE rm.new_id END,
+           CASE WHEN tm.old_id IS NULL THEN s.teacher_id ELSE tm.new_id END,
+           s.lesson_type, s.discipline, s.week_type, {time_interval}
+    FROM {schedule_map}
+    JOIN schedules s ON s.schedule_id = m.source_id
+    {times_join}
+    LEFT JOIN {room_map} ON rm.old_id = s.room_id
+    LEFT JOIN {teacher_map} ON tm.old_id = s.teacher_id;
+"""
+
+_CLONE_MAP = [("source_id", "int"), ("target_id", "int")]
+_REMAP = [("old_id", "int"), ("new_id", "int")]
+
+
+def _remap_ids(cur, table: str, names: dict) -> list:
+    """
+    {старое имя: новое имя или None} -> [(старый id, новый id или None)].
+    None или пустое имя убирает аудиторию (преподавателя) из копии.
+    """
+    if not names:
+        return []
+    ids = _resolve_names(cur, table, set(names) | {n for n in names.values() if n})
+    missing = sorted(n for n in set(names) | set(names.values()) if n and n not in ids)
+    if missing:
+        raise ValueError(f"Не найдены в справочнике {table}: {', '.join(missing)}")
+    return [(ids[old], ids[new] if new else None) for old, new in names.items()]
+
+
+def _clone_entries(cur, pairs: list, profile_id: int, room_map: dict, teacher_map: dict,
+                   recompute_times: bool) -> dict:
+    """
+    Копирует записи расписаний pairs = [(исходное, новое)] одним INSERT ... SELECT.
+    При recompute_times время занятий берётся из profile_times профиля
+    profile_id, а записи с номерами занятий, которых там нет, пропускаются.
+    """
+    engine = backend()
+    if recompute_times:
+        time_interval = f"{engine.hhmm('pt.start_time')} || ' - ' || {engine.hhmm('pt.end_time')}"
+        times_join = "JOIN profile_times pt ON pt.profile_id = %s AND pt.pair_number = s.pair_number"
+        times_params = [profile_id]
+    else:
+        time_interval, times_join, times_params = "s.time_interval", "", []
+    query = _CLONE_QUERY.format(
+        time_interval=time_interval, times_join=times_join,
+        schedule_map=engine.rows(_CLONE_MAP, "m"),
+        room_map=engine.rows(_REMAP, "rm"), teacher_map=engine.rows(_REMAP, "tm")
+    )
+    params = (engine.rows_params(_CLONE_MAP, pairs) + times_params
+              + engine.rows_params(_REMAP, _remap_ids(cur, "rooms", room_map))
+              + engine.rows_params(_REMAP, _remap_ids(cur, "teachers", teacher_map)))
+    cur.execute(query, params)
+    copied = cur.rowcount
+    cur.execute(f"SELECT count(*) FROM schedules WHERE {engine.any('schedule_id')};",
+                (engine.array([source for source, _ in pairs]),))
+    return {"copied": copied, "skipped": cur.fetchone()[0] - copied}
+
+
+def _clone_schedule_list(cur, schedule_id: int, profile_id: int, name: str) -> int:
+    cur.execute("""
+        INSERT INTO schedules_list (profile_id, name, schedule_type)
+        SELECT %s, %s, schedule_type FROM schedules_list WHERE id = %s
+        RETURNING id;
+    """, (profile_id, name, schedule_id))
+    return cur.fetchone()[0]
+
+
+def clone_schedule(schedule_id: int, name: str, profile_id: int = None, room_map: dict = None,
+                   teacher_map: dict = None, recompute_times: bool = True) -> dict:
+    """
+    Копирует расписание под именем name в профиль profile_id (по умолчанию
+    в тот же) одной транзакцией: записи копируются на сервере, не проходя
+    через клиента. room_map и teacher_map — {старое имя: новое имя или None}.
+    При recompute_times время занятий пересчитывается по profile_times
+    целевого профиля (записи с занятиями, которых там нет, пропускаются),
+    иначе копируется как есть. Если в целевом профиле уже есть расписание
+    с названием name, выбрасывается ValueError.
+
+    Возвращает {"schedule_id": id копии, "copied": int, "skipped": int}.
+    """
+    engine = backend()
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            engine.begin_write(cur)
+            cur.execute("SELECT profile_id FROM schedules_list WHERE id = %s;", (schedule_id,))
+            found = cur.fetchone()
+            if found is None:
+                raise ValueError(f"Расписание {schedule_id} не найдено")
+            if profile_id is None:
+                profile_id = found[0]
+            # Две копии с одним названием не пройдут проверку одновременно
+            engine.lock_keys(cur, {_lock_key(f"schedule:{profile_id}:{name}")})
+            cur.execute("SELECT 1 FROM schedules_list WHERE profile_id = %s AND name = %s;", (profile_id, name))
+            if cur.fetchone() is not None:
+                raise ValueError(f"Расписание с названием «{name}» уже существует.")
+            target_id = _clone_schedule_list(cur, schedule_id, profile_id, name)
+            summary = _clone_entries(cur, [(schedule_id, target_id)], profile_id,
+                                     room_map, teacher_map, recompute_times)
+        conn.commit()
+    refcache.invalidate("schedules_list", "schedules")
+    refresh_occupancy(target_id)
+    summary["schedule_id"] = target_id
+    return summary
+
+
+def clone_profile(profile_id: int, name: str, intervals: list = None, room_map: dict = None,
+                  teacher_map: dict = None) -> dict:
+    """
+    Создаёт профиль name со всеми расписаниями профиля profile_id (например,
+    для нового семестра) одной транзакцией. intervals — время занятий нового
+    профиля в формате set_profile_times, по умолчанию копируется; время
+    в записях пересчитывается по нему. room_map и teacher_map — как у
+    clone_schedule.
+
+    Возвращает {"profile_id": id, "schedules": int, "copied": int, "skipped": int}.
+    """
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("""
+                INSERT INTO profiles (name, max_pairs)
+                SELECT %s, max_pairs FROM profiles WHERE id = %s
+                RETURNING id;
+            """, (name, profile_id))
+            found = cur.fetchone()
+            if found is None:
+                raise ValueError(f"Профиль {profile_id} не найден")
+            target_profile = found[0]
+
+            if intervals is None:
+                cur.execute("""
+                    INSERT INTO profile_times (profile_id, pair_number, start_time, end_time)
+                    SELECT %s, pair_number, start_time, end_time
+                    FROM profile_times WHERE profile_id = %s;
+                """, (target_profile, profile_id))
+            else:
+                cur.executemany(
+                    """
+                    INSERT INTO profile_times (profile_id, pair_number, start_time, end_time)
+                    VALUES (%s, %s, %s, %s);
+                    """,
+                    [(target_profile, num, st, et) for num, st, et in intervals]
+                )
+
+            # Строк в schedules_list немного, записи же копируются одним запросом
+            cur.execute("SELECT id, name FROM schedules_list WHERE profile_id = %s ORDER BY id;", (profile_id,))
+            pairs = [(sid, _clone_schedule_list(cur, sid, target_profile, schedule_name))
+                     for sid, schedule_name in cur.fetchall()]
+            summary = (_clone_entries(cur, pairs, target_profile, room_map, teacher_map, True)
+                       if pairs else {"copied": 0, "skipped": 0})
+        conn.commit()
+    refcache.invalidate("profiles", "profile_times", "schedules_list", "schedules")
+    for _, target_id in pairs:
+        refresh_occupancy(target_id)
+    summary.update(profile_id=target_profile, schedules=len(pairs))
+    return summary
 
 # Загрузка
 def load_schedule_entries(schedule_id: int) -> list:
@@ -192,98 +948,479 @@ def load_schedule_entries(schedule_id: int) -> list:
             """, (schedule_id,))
             return cur.fetchall()
 
+# Всё для редактора расписания одним запросом: части различаются первым
+# столбцом, состав столбцов: (часть, номер пары, день, 4 текстовых поля, неделя).
+# Справочники аудиторий и преподавателей не загружаются: подсказки ищутся
+# через search_names, имена проверяются через unknown_names.
+_EDITOR_TIMES = """
+    SELECT 0, pair_number, CAST(NULL AS TEXT), CAST(start_time AS TEXT), CAST(end_time AS TEXT),
+           CAST(NULL AS TEXT), CAST(NULL AS TEXT), CAST(NULL AS INTEGER)
+    FROM profile_times WHERE profile_id = %(profile_id)s"""
+
+_EDITOR_ENTRIES = """
+    SELECT 1, s.pair_number, CAST(s.week_day AS TEXT), r.name, t.name, s.lesson_type, s.discipline, s.week_type
+    FROM schedules s
+    LEFT JOIN rooms r ON s.room_id = r.id
+    LEFT JOIN teachers t ON s.teacher_id = t.id
+    WHERE s.schedule_id = %(schedule_id)s
+    UNION ALL
+    SELECT 2, version, CAST(NULL AS TEXT), CAST(NULL AS TEXT), CAST(NULL AS TEXT),
+           CAST(NULL AS TEXT), CAST(NULL AS TEXT), CAST(NULL AS INTEGER)
+    FROM schedules_list WHERE id = %(schedule_id)s"""
+
+
+def load_editor_data(profile_id: int, schedule_id: int) -> tuple:
+    """
+    Всё, что нужно редактору расписания, за одно обращение к серверу:
+    (get_profile_times(profile_id), load_schedule_entries(schedule_id),
+    версия расписания). Время занятий из кэша не запрашивается, а
+    загруженное кладётся в кэш. Версию передают в
+    save_schedule_changes(expected_version=...).
+    """
+    key = get_profile_times.cache_key(profile_id)
+    cached_times, value = refcache.cache.lookup(get_profile_times.topic, key)
+    times = list(value) if cached_times else []
+    queries = ([] if cached_times else [_EDITOR_TIMES]) + [_EDITOR_ENTRIES]
+
+    entries, version = [], 0
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(" UNION ALL ".join(queries) + "\nORDER BY 1, 2, 4;",
+                        {"profile_id": profile_id, "schedule_id": schedule_id})
+            for part, pair_number, day, a, b, c, d, week_type in cur.fetchall():
+                if part == 1:
+                    entries.append((day, pair_number, a, b, c, d, week_type))
+                elif part == 2:
+                    version = pair_number
+                else:
+                    times.append((pair_number, datetime.time.fromisoformat(a), datetime.time.fromisoformat(b)))
+
+    if not cached_times:
+        refcache.cache.store(get_profile_times.topic, key, list(times), value)
+    return times, entries, version
+
+
+def unknown_names(rooms, teachers) -> tuple:
+    """
+    Имена из rooms и teachers, которых нет в справочниках, одним запросом:
+    (set аудиторий, set преподавателей). Проверяются только переданные имена.
+    """
+    rooms, teachers = set(rooms), set(teachers)
+    if not rooms and not teachers:
+        return set(), set()
+    engine = backend()
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(f"""
+                SELECT 'room', name FROM rooms WHERE {engine.any('name')}
+                UNION ALL
+                SELECT 'teacher', name FROM teachers WHERE {engine.any('name')};
+            """, (engine.array(rooms), engine.array(teachers)))
+            found = cur.fetchall()
+    return (rooms - {name for kind, name in found if kind == "room"},
+            teachers - {name for kind, name in found if kind == "teacher"})
+
+# Сводные расписания преподавателей и аудиторий
+@cached("schedules")
+def get_timetable(kind: str, entity_id: int, profile_id: int = None) -> list:
+    """
+    Все занятия преподавателя (kind="teacher") или аудитории ("room")
+    по всем расписаниям профиля (или базы при profile_id=None). Запрос идёт
+    по индексу занятости на (teacher_id|room_id, день, занятие, неделя),
+    результат кэшируется по сущности до изменения записей расписаний.
+
+    Возвращает [(week_day, pair_number, week_type, time_interval, schedule,
+    room или teacher, lesson_type, discipline)] по дню, занятию и неделе.
+    """
+    info = kind_info(kind)
+    other = KINDS[info["other"]]
+    where = "AND sl.profile_id = %s" if profile_id is not None else ""
+    params = (entity_id, profile_id) if profile_id is not None else (entity_id,)
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(f"""
+                SELECT s.week_day, s.pair_number, s.week_type, COALESCE(s.time_interval, ''),
+                       sl.name, COALESCE(o.name, ''),
+                       COALESCE(s.lesson_type, ''), COALESCE(s.discipline, '')
+                FROM schedules s
+                JOIN schedules_list sl ON sl.id = s.schedule_id
+                LEFT JOIN {other["table"]} o ON o.id = s.{other["column"]}
+                WHERE s.{info["column"]} = %s {where}
+                ORDER BY s.week_day, s.pair_number, s.week_type, sl.name;
+            """, params)
+            return cur.fetchall()
+
+
+def export_timetable_to_excel(kind: str, entity_id: int, path: str, profile_id: int = None) -> bool:
+    """
+    Выгружает сводное расписание преподавателя или аудитории в xlsx (см. export.py).
+    Ошибки записи файла не перехватываются: их показывает вызывающий.
+    """
+    from export import export_timetable
+    return export_timetable(kind, entity_id, path, profile_id)
+
+
 # Экспорт
 
-def export_schedule_to_excel(schedule_id: int, path: str) -> bool:
+def export_schedule_to_excel(schedule_id: int, path: str, progress=None, cancel=None) -> bool:
+    """
+    Выгружает расписание в xlsx потоково (см. export.py).
+    progress(done, total) сообщает число прочитанных строк; при
+    установленном событии cancel выбрасывается OperationCancelled.
+    """
     try:
-        with get_connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute("SELECT schedule_type FROM schedules_list WHERE id = %s;", (schedule_id,))
-                schedule_type = cur.fetchone()[0]
-
-                cur.execute("""
-                    SELECT s.week_day, s.pair_number, s.week_type,
-                           COALESCE(r.name, '') AS room,
-                           COALESCE(s.lesson_type, '') AS lesson_type,
-                           COALESCE(t.name, '') AS teacher,
-                           COALESCE(s.discipline, '') AS discipline,
-                           pt.start_time, pt.end_time
-                    FROM schedules s
-                    LEFT JOIN rooms r ON r.id = s.room_id
-                    LEFT JOIN teachers t ON t.id = s.teacher_id
-                    JOIN profile_times pt ON pt.profile_id = (SELECT profile_id FROM schedules_list WHERE id = %s)
-                                           AND pt.pair_number = s.pair_number
-                    WHERE s.schedule_id = %s
-                    ORDER BY s.week_day, s.pair_number, s.week_type;
-                """, (schedule_id, schedule_id))
-                rows = cur.fetchall()
-
-        if schedule_type == "Обычное":
-            columns = ["День недели", "№ занятия", "Время", "Аудитория", "Вид занятия", "Преподаватель", "Дисциплина"]
-            data = []
-            for row in rows:
-                if row[2] != 0:
-                    continue
-                day, pair, _, room, ltype, teacher, disc, start, end = row
-                time_range = f"{start} - {end}"
-                data.append([day, pair, time_range, room, ltype, teacher, disc])
-
-        else:
-            columns = [
-                "День недели", "№ занятия", "Время",
-                "Аудитория (Нечет)", "Вид занятия (Нечет)", "Преподаватель (Нечет)", "Дисциплина (Нечет)",
-                "Аудитория (Чет)", "Вид занятия (Чет)", "Преподаватель (Чет)", "Дисциплина (Чет)"
-            ]
-            grouped = {}
-            for row in rows:
-                day, pair, week, room, ltype, teacher, disc, start, end = row
-                key = (day, pair, f"{start} - {end}")
-                if key not in grouped:
-                    grouped[key] = [None, None]
-                if week == 1:
-                    grouped[key][0] = [room, ltype, teacher, disc]
-                elif week == 2:
-                    grouped[key][1] = [room, ltype, teacher, disc]
-
-            data = []
-            for (day, pair, time_range), (week1, week2) in grouped.items():
-                row = [day, pair, time_range]
-                row += week1 if week1 else [""] * 4
-                row += week2 if week2 else [""] * 4
-                data.append(row)
-
-        df = pd.DataFrame(data, columns=columns)
-        df.to_excel(path, index=False)
-        return True
+        from export import export_schedule
+        return export_schedule(schedule_id, path, progress, cancel)
+    except OperationCancelled:
+        raise
     except Exception as e:
         print(f"Ошибка экспорта: {e}")
         return False
 
 
-# Проверка занятости аудитории
+def export_profile_to_excel(profile_id: int, target: str, mode: str = "workbook",
+                           processes: int = None, progress=None, cancel=None) -> list:
+    """
+    Выгружает все расписания профиля в одну книгу (mode="workbook")
+    или в каталог с файлом на расписание (mode="directory"), см. export.py.
+    """
+    from export import export_profile
+    return export_profile(profile_id, target, mode, processes, progress, cancel)
+
+
+# Индекс занятости в памяти
+_occupancy = None
+
+
+def build_occupancy_index():
+    """Строит индекс занятости за один проход по таблице schedules."""
+    from occupancy import OccupancyIndex
+
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT id, name FROM rooms ORDER BY name;")
+            rooms = cur.fetchall()
+            cur.execute("SELECT id, name FROM teachers ORDER BY name;")
+            teachers = cur.fetchall()
+            cur.execute("SELECT id, profile_id FROM schedules_list;")
+            schedules = cur.fetchall()
+            cur.execute("""
+                SELECT schedule_id, week_day, pair_number, week_type, room_id, teacher_id
+                FROM schedules
+                WHERE room_id IS NOT NULL OR teacher_id IS NOT NULL;
+            """)
+            return OccupancyIndex.from_rows(DAYS, rooms, teachers, schedules, cur.fetchall())
+
+
+def enable_occupancy_index():
+    """
+    Включает ответы is_room_busy/is_teacher_busy из индекса в памяти.
+    Повторный вызов перестраивает индекс.
+    """
+    global _occupancy
+    _occupancy = build_occupancy_index()
+    return _occupancy
+
+
+def disable_occupancy_index():
+    global _occupancy
+    _occupancy = None
+
+
+def get_occupancy_index():
+    return _occupancy
+
+
+def refresh_occupancy(schedule_id: int, profile_id: int = None):
+    """
+    Перечитывает занятость одного расписания после записи в обход
+    save_schedule_entries. profile_id, если известен, избавляет от запроса профиля.
+    """
+    if _occupancy is None:
+        return
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            if profile_id is None:
+                cur.execute("SELECT profile_id FROM schedules_list WHERE id = %s;", (schedule_id,))
+                found = cur.fetchone()
+                if found is None:
+                    _occupancy.remove_schedule(schedule_id)
+                    return
+                profile_id = found[0]
+            cur.execute("""
+                SELECT week_day, pair_number, week_type, room_id, teacher_id
+                FROM schedules
+                WHERE schedule_id = %s AND (room_id IS NOT NULL OR teacher_id IS NOT NULL);
+            """, (schedule_id,))
+            _occupancy.replace_schedule(schedule_id, profile_id, cur.fetchall())
+
+
+# Проверка занятости аудитории среди расписаний того же профиля
 def is_room_busy(room_name, day, pair_number, week_type, schedule_id):
+    index = _occupancy
+    if index is not None:
+        busy = index.is_room_busy(room_name, day, pair_number, week_type, schedule_id)
+        if busy is not None:
+            return busy
     with get_connection() as conn:
         with conn.cursor() as cur:
             cur.execute("""
                 SELECT 1 FROM schedules s
                 JOIN rooms r ON s.room_id = r.id
+                JOIN schedules_list sl ON sl.id = s.schedule_id
                 WHERE r.name = %s AND s.week_day = %s AND s.pair_number = %s
-                AND s.week_type = %s AND s.schedule_id != %s
+                AND (s.week_type = %s OR s.week_type = 0 OR %s = 0) AND s.schedule_id != %s
+                AND sl.profile_id = (SELECT profile_id FROM schedules_list WHERE id = %s)
                 LIMIT 1;
-            """, (room_name, day, pair_number, week_type, schedule_id))
+            """, (room_name, day, pair_number, week_type, week_type, schedule_id, schedule_id))
             return cur.fetchone() is not None
 
-# Проверка занятости преподавателя
+# Проверка занятости преподавателя среди расписаний того же профиля
 def is_teacher_busy(teacher_name, day, pair_number, week_type, schedule_id):
+    index = _occupancy
+    if index is not None:
+        busy = index.is_teacher_busy(teacher_name, day, pair_number, week_type, schedule_id)
+        if busy is not None:
+            return busy
     with get_connection() as conn:
         with conn.cursor() as cur:
             cur.execute("""
                 SELECT 1 FROM schedules s
                 JOIN teachers t ON s.teacher_id = t.id
+                JOIN schedules_list sl ON sl.id = s.schedule_id
                 WHERE t.name = %s AND s.week_day = %s AND s.pair_number = %s
-                AND s.week_type = %s AND s.schedule_id != %s
+                AND (s.week_type = %s OR s.week_type = 0 OR %s = 0) AND s.schedule_id != %s
+                AND sl.profile_id = (SELECT profile_id FROM schedules_list WHERE id = %s)
                 LIMIT 1;
-            """, (teacher_name, day, pair_number, week_type, schedule_id))
+            """, (teacher_name, day, pair_number, week_type, week_type, schedule_id, schedule_id))
             return cur.fetchone() is not None
 
 
+# Свободные аудитории и преподаватели в слоте
+_FREE_PART = """
+    SELECT '{kind}', x.name FROM {table} x
+    WHERE NOT EXISTS (
+        SELECT 1 FROM schedules s
+        WHERE s.{column} = x.id AND s.week_day = %(day)s AND s.pair_number = %(pair)s
+          AND (s.week_type = %(week)s OR s.week_type = 0 OR %(week)s = 0)
+          {exclude}
+    )
+"""
+
+
+_FREE_SCOPE = """
+          AND s.schedule_id <> %(schedule_id)s
+          AND s.schedule_id IN (
+              SELECT id FROM schedules_list
+              WHERE profile_id = (SELECT profile_id FROM schedules_list WHERE id = %(schedule_id)s)
+          )
+"""
+
+
+def find_free(day, pair_number: int, week_type: int, schedule_id: int = None) -> dict:
+    """
+    Аудитории и преподаватели, свободные в слоте (day, pair_number, week_type)
+    в других расписаниях профиля schedule_id (None — во всех расписаниях базы).
+    Занятие «каждую неделю» занимает слот обеих недель. При включённом
+    индексе занятости ответ берётся из памяти, иначе — одним запросом
+    (разность справочника и занятых слотов).
+
+    Возвращает {"room": [имя], "teacher": [имя]} в порядке справочников.
+    """
+    index = _occupancy
+    if index is not None:
+        rooms = index.free_rooms(day, pair_number, week_type, schedule_id)
+        if rooms is not None:
+            return {"room": rooms, "teacher": index.free_teachers(day, pair_number, week_type, schedule_id)}
+
+    exclude = "" if schedule_id is None else _FREE_SCOPE
+    parts = [_FREE_PART.format(kind=kind, table=info["table"], column=info["column"], exclude=exclude)
+             for kind, info in KINDS.items()]
+    result = {kind: [] for kind in KINDS}
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(" UNION ALL ".join(parts) + " ORDER BY 1, 2;", {
+                "day": day, "pair": pair_number, "week": week_type, "schedule_id": schedule_id
+            })
+            for kind, name in cur.fetchall():
+                result[kind].append(name)
+    return result
+
+
+# Пакетная проверка занятости для всего расписания
+def find_schedule_conflicts(schedule_id: int, entries: list) -> list:
+    """
+    Проверяет все записи расписания одним запросом.
+    entries — в том же формате, что и для save_schedule_entries.
+
+    Возвращает список конфликтов с другими расписаниями того же профиля:
+    [(kind:str, name:str, week_day:str, pair_number:int, week_type:int, other_schedule:str)],
+    где kind — "room" или "teacher".
+    Запись «каждую неделю» (week_type 0) пересекается с записями обеих недель.
+    """
+    if not _proposed_slots(entries):
+        return []
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            return find_conflicts(cur, schedule_id, entries)
+
+
+def _proposed_slots(entries: list) -> list:
+    proposed = []
+    for day, pair_number, room, teacher, _, _, week_type in entries:
+        room = room.strip() if room else ""
+        teacher = teacher.strip() if teacher else ""
+        if room or teacher:
+            proposed.append((day, pair_number, week_type, room or None, teacher or None))
+    return proposed
+
+
+def find_conflicts(cur, schedule_id: int, entries: list) -> list:
+    """find_schedule_conflicts на курсоре уже открытой транзакции."""
+    proposed = _proposed_slots(entries)
+    if not proposed:
+        return []
+
+    columns = [("week_day", "day"), ("pair_number", "int"), ("week_type", "int"),
+               ("room", "text"), ("teacher", "text")]
+    engine = backend()
+    cur.execute(f"""
+        WITH proposed AS (
+            SELECT * FROM {engine.rows(columns, ordinality=True)}
+        ), target AS (
+            SELECT profile_id FROM schedules_list WHERE id = %s
+        )
+        SELECT kind, name, week_day, pair_number, week_type, other_schedule
+        FROM (
+            SELECT 'room' AS kind, p.room AS name, p.week_day, p.pair_number,
+                   p.week_type, sl.name AS other_schedule, p.ord
+            FROM proposed p
+            JOIN rooms r ON r.name = p.room
+            JOIN schedules s ON s.room_id = r.id
+                            AND s.week_day = p.week_day
+                            AND s.pair_number = p.pair_number
+                            AND (s.week_type = p.week_type OR s.week_type = 0 OR p.week_type = 0)
+                            AND s.schedule_id <> %s
+            JOIN schedules_list sl ON sl.id = s.schedule_id
+            JOIN target ON target.profile_id = sl.profile_id
+            UNION ALL
+            SELECT 'teacher', p.teacher, p.week_day, p.pair_number,
+                   p.week_type, sl.name, p.ord
+            FROM proposed p
+            JOIN teachers t ON t.name = p.teacher
+            JOIN schedules s ON s.teacher_id = t.id
+                            AND s.week_day = p.week_day
+                            AND s.pair_number = p.pair_number
+                            AND (s.week_type = p.week_type OR s.week_type = 0 OR p.week_type = 0)
+                            AND s.schedule_id <> %s
+            JOIN schedules_list sl ON sl.id = s.schedule_id
+            JOIN target ON target.profile_id = sl.profile_id
+        ) c
+        ORDER BY ord, kind, other_schedule;
+    """, engine.rows_params(columns, proposed) + [schedule_id, schedule_id, schedule_id])
+    return cur.fetchall()
+
+
+# Двойные бронирования по всему профилю или по всей базе
+_DOUBLE_BOOKING_PART = """
+    SELECT '{kind}' AS kind, x.name, a.week_day, a.pair_number,
+           a.week_type, a.schedule_id, a.schedule,
+           b.week_type AS other_week_type, b.schedule_id AS other_schedule_id, b.schedule AS other_schedule
+    FROM (
+        -- Слоты, где пересечение точно есть: запись «каждую неделю» рядом с любой
+        -- другой или две записи одной недели (из трёх записей по неделям 1 и 2
+        -- две обязательно совпадут)
+        SELECT {column} AS who, week_day, pair_number
+        FROM booked
+        WHERE {column} IS NOT NULL
+        GROUP BY {column}, week_day, pair_number
+        HAVING count(*) > 1 AND (min(week_type) = 0 OR min(week_type) = max(week_type) OR count(*) > 2)
+    ) g
+    JOIN booked a ON a.{column} = g.who AND a.week_day = g.week_day AND a.pair_number = g.pair_number
+    JOIN booked b ON b.{column} = g.who AND b.week_day = g.week_day AND b.pair_number = g.pair_number
+                 AND b.id > a.id
+                 AND (b.week_type = a.week_type OR a.week_type = 0 OR b.week_type = 0)
+    JOIN {table} x ON x.id = g.who
+"""
+
+
+def find_double_bookings(profile_id: int = None) -> list:
+    """
+    Все аудитории и преподаватели, занятые дважды в одном слоте, среди
+    сохранённых расписаний профиля (или всей базы при profile_id=None).
+    Запись «каждую неделю» (week_type 0) пересекается и с нечётной,
+    и с чётной неделей. Один запрос: группировка по слотам находит
+    пересечения, к строкам таблицы возвращаются только для них.
+
+    Возвращает [(kind, name, week_day, pair_number, week_type, schedule_id, schedule,
+    other_week_type, other_schedule_id, other_schedule)], kind — "room" или "teacher";
+    каждая пара пересекающихся записей — одной строкой.
+    """
+    where = "WHERE sl.profile_id = %(profile_id)s" if profile_id is not None else ""
+    parts = [_DOUBLE_BOOKING_PART.format(kind="room", column="room_id", table="rooms"),
+             _DOUBLE_BOOKING_PART.format(kind="teacher", column="teacher_id", table="teachers")]
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(f"""
+                WITH booked AS (
+                    SELECT s.id, s.schedule_id, sl.name AS schedule, s.week_day, s.pair_number,
+                           s.week_type, s.room_id, s.teacher_id
+                    FROM schedules s
+                    JOIN schedules_list sl ON sl.id = s.schedule_id
+                    {where}
+                )
+                SELECT * FROM ({" UNION ALL ".join(parts)}) c
+                ORDER BY kind, name, week_day, pair_number, week_type, schedule, other_schedule;
+            """, {"profile_id": profile_id})
+            return cur.fetchall()
+
+
+# Инструментирование запросов (см. dbstats)
+STATS_PATH = os.environ.get("SCHEDULE_DB_STATS")
+SLOW_QUERY_MS = float(os.environ.get("SCHEDULE_DB_SLOW_MS", dbstats.DEFAULT_SLOW_MS))
+
+# Служебные функции, которые не оборачиваются
+_NOT_INSTRUMENTED = {
+    "get_connection", "init_pool", "close_pool", "backend", "configure", "pool_stats",
+    "start_change_listener", "stop_change_listener",
+    "enable_instrumentation", "disable_instrumentation", "instrumentation_stats", "dump_instrumentation",
+}
+
+
+def enable_instrumentation(slow_ms: float = None, slow_log: str = None):
+    """
+    Начинает считать вызовы функций db и запросы. slow_ms — порог
+    медленного запроса в мс (по умолчанию SLOW_QUERY_MS), slow_log — файл
+    журнала медленных запросов (по умолчанию stderr).
+    """
+    namespace = globals()
+    names = [name for name, value in namespace.items()
+             if not name.startswith("_") and name not in _NOT_INSTRUMENTED
+             and callable(value) and not isinstance(value, type)
+             and getattr(value, "__module__", None) == __name__]
+    dbstats.enable(namespace, names, SLOW_QUERY_MS if slow_ms is None else slow_ms, slow_log)
+
+
+def disable_instrumentation():
+    dbstats.disable()
+
+
+def instrumentation_stats() -> dict:
+    """Счётчики по функциям db, медленные запросы, а также счётчики пула и кэша."""
+    stats = dbstats.snapshot()
+    stats["pool"] = pool_stats()
+    stats["cache"] = refcache.cache.stats()
+    return stats
+
+
+def dump_instrumentation(path: str = None):
+    """Записывает instrumentation_stats() в JSON-файл (по умолчанию STATS_PATH)."""
+    path = path or STATS_PATH
+    extra = {"pool": pool_stats(), "cache": refcache.cache.stats()}
+    dbstats.dump(path, extra)
+
+
+if STATS_PATH:
+    # Счётчики собираются с запуска и записываются в файл при выходе
+    enable_instrumentation()
+    atexit.register(dump_instrumentation)
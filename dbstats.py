@@ -0,0 +1,312 @@
+"""
+Инструментирование обращений к базе: число вызовов функций db, запросы
+(обращения к серверу), прочитанные и изменённые строки, время удержания
+соединения и гистограммы времени вызовов и запросов по каждой функции.
+Медленные запросы записываются вместе с SQL и параметрами.
+
+Пока инструментирование выключено, функции db не обёрнуты, а
+get_connection проверяет один флаг enabled. Включение — db.enable_instrumentation()
+или переменная окружения SCHEDULE_DB_STATS (см. db).
+"""
+import collections
+import functools
+import json
+import sys
+import threading
+import time
+
+# Верхние границы корзин гистограмм, мс; последняя корзина — всё, что дольше
+BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+DEFAULT_SLOW_MS = 200.0
+SLOW_LOG_SIZE = 200
+PARAMS_PREVIEW = 1000
+
+OUTSIDE = "(вне функций db)"
+
+enabled = False
+
+_lock = threading.Lock()
+_local = threading.local()
+_functions = {}
+_slow = collections.deque(maxlen=SLOW_LOG_SIZE)
+_originals = {}
+_namespace = None
+_settings = {"slow_ms": DEFAULT_SLOW_MS, "slow_log": None}
+_started = None
+
+
+def _histogram() -> list:
+    return [0] * (len(BUCKETS_MS) + 1)
+
+
+def _bucket(ms: float) -> int:
+    for i, bound in enumerate(BUCKETS_MS):
+        if ms <= bound:
+            return i
+    return len(BUCKETS_MS)
+
+
+def _record(name: str) -> dict:
+    """Счётчики функции; вызывается под _lock."""
+    record = _functions.get(name)
+    if record is None:
+        record = _functions[name] = {
+            "calls": 0, "errors": 0, "call_ms": 0.0, "call_max_ms": 0.0, "call_histogram": _histogram(),
+            "queries": 0, "query_ms": 0.0, "query_max_ms": 0.0, "query_histogram": _histogram(),
+            "rows": 0, "affected": 0,
+            "connections": 0, "connection_wait_ms": 0.0, "connection_ms": 0.0,
+        }
+    return record
+
+
+def _current() -> str:
+    stack = getattr(_local, "stack", None)
+    return stack[-1] if stack else OUTSIDE
+
+
+# Функции
+
+def _wrap(name: str, fn):
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        stack = getattr(_local, "stack", None)
+        if stack is None:
+            stack = _local.stack = []
+        stack.append(name)
+        failed = False
+        started = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        except Exception:
+            failed = True
+            raise
+        finally:
+            ms = (time.perf_counter() - started) * 1000
+            stack.pop()
+            with _lock:
+                record = _record(name)
+                record["calls"] += 1
+                record["errors"] += failed
+                record["call_ms"] += ms
+                record["call_max_ms"] = max(record["call_max_ms"], ms)
+                record["call_histogram"][_bucket(ms)] += 1
+    return wrapper
+
+
+# Запросы
+
+def _preview(params) -> str:
+    text = repr(params)
+    if len(text) > PARAMS_PREVIEW:
+        text = text[:PARAMS_PREVIEW] + f"... ({len(text)} символов)"
+    return text
+
+
+def _slow_query(name: str, ms: float, sql, params):
+    if isinstance(sql, bytes):
+        sql = sql.decode("utf-8", "replace")
+    entry = {
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "function": name,
+        "ms": round(ms, 3),
+        "sql": " ".join(str(sql).split()),
+        "params": _preview(params),
+    }
+    _slow.append(entry)
+    message = f"[Медленный запрос] {name}: {ms:.1f} мс\n{entry['sql']}\nПараметры: {entry['params']}\n"
+    path = _settings["slow_log"]
+    if path is None:
+        print(message, file=sys.stderr)
+        return
+    try:
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(message + "\n")
+    except OSError as e:
+        print(f"[Журнал медленных запросов]: {e}", file=sys.stderr)
+
+
+class _TrackedCursor:
+    """Курсор, который замеряет запросы и считает строки; остальное — как у исходного."""
+
+    def __init__(self, cur):
+        self._cur = cur
+
+    def __getattr__(self, name):
+        return getattr(self._cur, name)
+
+    def __enter__(self):
+        self._cur.__enter__()
+        return self
+
+    def __exit__(self, *exc):
+        return self._cur.__exit__(*exc)
+
+    def _timed(self, sql, params, call):
+        name = _current()
+        started = time.perf_counter()
+        try:
+            return call()
+        finally:
+            ms = (time.perf_counter() - started) * 1000
+            affected = self._cur.rowcount if self._cur.description is None else 0
+            with _lock:
+                record = _record(name)
+                record["queries"] += 1
+                record["query_ms"] += ms
+                record["query_max_ms"] = max(record["query_max_ms"], ms)
+                record["query_histogram"][_bucket(ms)] += 1
+                record["affected"] += max(affected, 0)
+            slow_ms = _settings["slow_ms"]
+            if slow_ms is not None and ms >= slow_ms:
+                _slow_query(name, ms, sql, params)
+
+    def _rows(self, count: int):
+        with _lock:
+            _record(_current())["rows"] += count
+
+    def execute(self, sql, params=None):
+        return self._timed(sql, params, lambda: self._cur.execute(sql, params))
+
+    def executemany(self, sql, seq):
+        seq = list(seq)
+        return self._timed(sql, seq, lambda: self._cur.executemany(sql, seq))
+
+    def copy_expert(self, sql, file, *args):
+        return self._timed(sql, None, lambda: self._cur.copy_expert(sql, file, *args))
+
+    def fetchone(self):
+        row = self._cur.fetchone()
+        if row is not None:
+            self._rows(1)
+        return row
+
+    def fetchmany(self, *args):
+        rows = self._cur.fetchmany(*args)
+        self._rows(len(rows))
+        return rows
+
+    def fetchall(self):
+        rows = self._cur.fetchall()
+        self._rows(len(rows))
+        return rows
+
+    def __iter__(self):
+        count = 0
+        try:
+            for row in self._cur:
+                count += 1
+                yield row
+        finally:
+            self._rows(count)
+
+
+class _TrackedConnection:
+    def __init__(self, conn):
+        self._conn = conn
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def __enter__(self):
+        self._conn.__enter__()
+        return self
+
+    def __exit__(self, *exc):
+        return self._conn.__exit__(*exc)
+
+    def cursor(self, *args, **kwargs):
+        return _TrackedCursor(self._conn.cursor(*args, **kwargs))
+
+
+class ConnectionTracker:
+    """Время ожидания и удержания соединения для db.get_connection."""
+
+    def __init__(self):
+        self.name = _current()
+        self.requested = time.perf_counter()
+        self.acquired = None
+
+    def wrap(self, conn):
+        self.acquired = time.perf_counter()
+        return _TrackedConnection(conn)
+
+    def close(self):
+        now = time.perf_counter()
+        acquired = self.acquired or now
+        with _lock:
+            record = _record(self.name)
+            record["connections"] += 1
+            record["connection_wait_ms"] += (acquired - self.requested) * 1000
+            record["connection_ms"] += (now - acquired) * 1000
+
+
+# Управление
+
+def enable(namespace: dict, names, slow_ms: float = DEFAULT_SLOW_MS, slow_log: str = None):
+    """
+    Оборачивает функции names в словаре namespace (globals() модуля db).
+    slow_ms — порог медленного запроса в мс (None — не записывать),
+    slow_log — файл журнала медленных запросов (по умолчанию stderr).
+    """
+    global enabled, _namespace, _started
+    with _lock:
+        _settings.update(slow_ms=slow_ms, slow_log=slow_log)
+        if enabled:
+            return
+        _namespace = namespace
+        for name in names:
+            _originals[name] = namespace[name]
+            namespace[name] = _wrap(name, namespace[name])
+        _started = time.strftime("%Y-%m-%dT%H:%M:%S")
+        enabled = True
+
+
+def disable():
+    """Возвращает исходные функции; накопленные счётчики сохраняются до reset()."""
+    global enabled, _namespace
+    with _lock:
+        if not enabled:
+            return
+        _namespace.update(_originals)
+        _originals.clear()
+        _namespace = None
+        enabled = False
+
+
+def reset():
+    global _started
+    with _lock:
+        _functions.clear()
+        _slow.clear()
+        _started = time.strftime("%Y-%m-%dT%H:%M:%S") if enabled else None
+
+
+def snapshot() -> dict:
+    """
+    {"since": момент включения или сброса, "buckets_ms": границы корзин,
+    "functions": {имя: счётчики}, "slow_queries": [...]}.
+    """
+    with _lock:
+        functions = {}
+        for name, record in _functions.items():
+            record = dict(record, call_histogram=list(record["call_histogram"]),
+                          query_histogram=list(record["query_histogram"]))
+            for key, value in record.items():
+                if isinstance(value, float):
+                    record[key] = round(value, 3)
+            functions[name] = record
+        return {
+            "since": _started,
+            "slow_ms": _settings["slow_ms"],
+            "buckets_ms": list(BUCKETS_MS),
+            "functions": functions,
+            "slow_queries": list(_slow),
+        }
+
+
+def dump(path: str, extra: dict = None):
+    """Записывает snapshot() (и extra) в JSON-файл."""
+    data = snapshot()
+    data.update(extra or {})
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
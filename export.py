@@ -0,0 +1,328 @@
+"""
+Потоковая выгрузка расписаний в xlsx.
+
+Строки читаются серверным курсором порциями и сразу пишутся в книгу
+openpyxl в режиме write_only, поэтому память не зависит от размера
+расписания. Двухнедельная раскладка (Нечет/Чет) собирается в том же
+проходе: строки приходят отсортированными по дню, паре и типу недели,
+и строка листа выводится, как только меняется пара.
+"""
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment, Border, Font, Side
+
+import db
+from timetable import is_two_week, timetable_columns, timetable_grid
+
+SINGLE_COLUMNS = ["День недели", "№ занятия", "Время", "Аудитория", "Вид занятия", "Преподаватель", "Дисциплина"]
+DOUBLE_COLUMNS = [
+    "День недели", "№ занятия", "Время",
+    "Аудитория (Нечет)", "Вид занятия (Нечет)", "Преподаватель (Нечет)", "Дисциплина (Нечет)",
+    "Аудитория (Чет)", "Вид занятия (Чет)", "Преподаватель (Чет)", "Дисциплина (Чет)"
+]
+
+FETCH_SIZE = 2000
+
+_EXPORT_QUERY = """
+    SELECT s.week_day, s.pair_number, s.week_type,
+           COALESCE(r.name, '') AS room,
+           COALESCE(s.lesson_type, '') AS lesson_type,
+           COALESCE(t.name, '') AS teacher,
+           COALESCE(s.discipline, '') AS discipline,
+           pt.start_time, pt.end_time
+    FROM schedules s
+    JOIN schedules_list sl ON sl.id = s.schedule_id
+    JOIN profile_times pt ON pt.profile_id = sl.profile_id AND pt.pair_number = s.pair_number
+    LEFT JOIN rooms r ON r.id = s.room_id
+    LEFT JOIN teachers t ON t.id = s.teacher_id
+    WHERE s.schedule_id = %s AND (%s OR s.week_type = 0)
+    ORDER BY s.week_day, s.pair_number, s.week_type;
+"""
+
+
+def columns_for(schedule_type: str) -> list:
+    return SINGLE_COLUMNS if schedule_type == "Обычное" else DOUBLE_COLUMNS
+
+
+def grid_rows(schedule_type: str, rows):
+    """
+    Превращает строки запроса (отсортированные по дню, паре и неделе)
+    в строки листа. Генератор, промежуточных структур не строит.
+    """
+    if schedule_type == "Обычное":
+        for day, pair, week, room, ltype, teacher, disc, start, end in rows:
+            if week == 0:
+                yield [day, pair, f"{start} - {end}", room, ltype, teacher, disc]
+        return
+
+    current = None
+    for day, pair, week, room, ltype, teacher, disc, start, end in rows:
+        if current is None or current[0] != day or current[1] != pair:
+            if current is not None:
+                yield current
+            current = [day, pair, f"{start} - {end}"] + [""] * 8
+        if week == 1:
+            current[3:7] = [room, ltype, teacher, disc]
+        elif week == 2:
+            current[7:11] = [room, ltype, teacher, disc]
+    if current is not None:
+        yield current
+
+
+def _header(ws, columns):
+    side = Side(style="thin")
+    cells = []
+    for title in columns:
+        cell = WriteOnlyCell(ws, value=title)
+        cell.font = Font(bold=True)
+        cell.border = Border(left=side, right=side, top=side, bottom=side)
+        cell.alignment = Alignment(horizontal="center", vertical="top")
+        cells.append(cell)
+    return cells
+
+
+def write_sheet(ws, schedule_type: str, rows):
+    """Пишет заголовок и строки расписания в лист книги write_only."""
+    ws.append(_header(ws, columns_for(schedule_type)))
+    for row in grid_rows(schedule_type, rows):
+        ws.append(row)
+
+
+def stream_rows(cur, progress=None, cancel=None, total: int = 0, fetch_size: int = FETCH_SIZE):
+    """
+    Отдаёт строки курсора порциями по fetch_size. Между порциями
+    проверяет отмену и сообщает progress(прочитано, всего).
+    """
+    done = 0
+    while True:
+        db.check_cancel(cancel)
+        chunk = cur.fetchmany(fetch_size)
+        if not chunk:
+            return
+        yield from chunk
+        done += len(chunk)
+        if progress is not None:
+            progress(done, max(total, done))
+
+
+def export_schedule(schedule_id: int, path: str, progress=None, cancel=None) -> bool:
+    """
+    Выгружает одно расписание в файл path. Файл записывается только
+    после успешного прохода; при отмене выбрасывается OperationCancelled.
+    """
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Sheet1")
+
+    with db.get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT schedule_type FROM schedules_list WHERE id = %s;", (schedule_id,))
+            schedule_type = cur.fetchone()[0]
+            two_week = schedule_type != "Обычное"
+            cur.execute(
+                "SELECT count(*) FROM schedules WHERE schedule_id = %s AND (%s OR week_type = 0);",
+                (schedule_id, two_week)
+            )
+            total = cur.fetchone()[0]
+        with conn.cursor(name=f"export_schedule_{schedule_id}") as cur:
+            cur.itersize = FETCH_SIZE
+            cur.execute(_EXPORT_QUERY, (schedule_id, two_week))
+            write_sheet(ws, schedule_type, stream_rows(cur, progress, cancel, total))
+
+    db.check_cancel(cancel)
+    wb.save(path)
+    return True
+
+
+# Пакетная выгрузка всех расписаний профиля
+
+_PROFILE_QUERY = """
+    SELECT s.schedule_id,
+           s.week_day, s.pair_number, s.week_type,
+           COALESCE(r.name, '') AS room,
+           COALESCE(s.lesson_type, '') AS lesson_type,
+           COALESCE(t.name, '') AS teacher,
+           COALESCE(s.discipline, '') AS discipline,
+           pt.start_time, pt.end_time
+    FROM schedules s
+    JOIN schedules_list sl ON sl.id = s.schedule_id
+    JOIN profile_times pt ON pt.profile_id = sl.profile_id AND pt.pair_number = s.pair_number
+    LEFT JOIN rooms r ON r.id = s.room_id
+    LEFT JOIN teachers t ON t.id = s.teacher_id
+    WHERE sl.profile_id = %s AND (sl.schedule_type <> 'Обычное' OR s.week_type = 0)
+    ORDER BY s.schedule_id, s.week_day, s.pair_number, s.week_type;
+"""
+
+# Меньше расписаний выгружается в текущем процессе: запуск пула дороже работы
+MIN_PARALLEL_SCHEDULES = 4
+
+_INVALID_SHEET_CHARS = str.maketrans({c: "_" for c in "[]:*?/\\"})
+_INVALID_FILE_CHARS = str.maketrans({c: "_" for c in '<>:"/\\|?*'})
+
+
+def _unique(name: str, used: set, limit: int = None) -> str:
+    base = name[:limit] if limit else name
+    candidate, n = base, 1
+    while candidate.lower() in used:
+        n += 1
+        suffix = f" ({n})"
+        candidate = (base[:limit - len(suffix)] if limit else base) + suffix
+    used.add(candidate.lower())
+    return candidate
+
+
+def sheet_title(name: str, used: set) -> str:
+    """Имя листа Excel: не длиннее 31 символа, без запрещённых символов, уникальное."""
+    return _unique(name.translate(_INVALID_SHEET_CHARS).strip() or "Расписание", used, 31)
+
+
+def file_name(name: str, used: set) -> str:
+    return _unique(name.translate(_INVALID_FILE_CHARS).strip() or "Расписание", used) + ".xlsx"
+
+
+def render_file(path: str, schedule_type: str, rows: list) -> str:
+    """Пишет одно расписание в отдельный файл. Выполняется в процессе пула."""
+    wb = Workbook(write_only=True)
+    write_sheet(wb.create_sheet("Sheet1"), schedule_type, rows)
+    wb.save(path)
+    return path
+
+
+def _schedule_row_groups(cur):
+    """Группирует поток строк запроса профиля по schedule_id: (schedule_id, rows)."""
+    current_id, current_rows = None, []
+    for row in stream_rows(cur):
+        if row[0] != current_id:
+            if current_id is not None:
+                yield current_id, current_rows
+            current_id, current_rows = row[0], []
+        current_rows.append(row[1:])
+    if current_id is not None:
+        yield current_id, current_rows
+
+
+def _grouped(cur, schedules):
+    """
+    Сопоставляет группы строк со списком расписаний (оба упорядочены по id)
+    и отдаёт (schedule_id, name, schedule_type, rows), включая пустые расписания.
+    """
+    groups = _schedule_row_groups(cur)
+    group = next(groups, None)
+    for sid, name, schedule_type in schedules:
+        while group is not None and group[0] < sid:
+            group = next(groups, None)
+        rows = []
+        if group is not None and group[0] == sid:
+            rows = group[1]
+            group = next(groups, None)
+        yield sid, name, schedule_type, rows
+
+
+def export_profile(profile_id: int, target: str, mode: str = "workbook",
+                   processes: int = None, progress=None, cancel=None) -> list:
+    """
+    Выгружает все расписания профиля.
+
+    mode="workbook" — одна книга target, по листу на расписание;
+    mode="directory" — каталог target, по файлу на расписание. Файлы
+    рендерятся параллельно в пуле процессов (processes — число процессов,
+    по умолчанию по числу ядер). Одну книгу несколько процессов писать
+    не могут, поэтому листы книги пишутся последовательно в потоке.
+
+    Данные всех расписаний читаются одним запросом. progress(done, total)
+    вызывается по числу выгруженных расписаний.
+    Возвращает [(имя расписания, имя листа или путь к файлу)].
+    """
+    if mode not in ("workbook", "directory"):
+        raise ValueError(f"Неизвестный режим выгрузки: {mode}")
+
+    schedules = db.list_schedules(profile_id)
+    total = len(schedules)
+
+    def report(done):
+        if progress is not None:
+            progress(done, total)
+
+    with db.get_connection() as conn:
+        with conn.cursor(name=f"export_profile_{profile_id}") as cur:
+            cur.itersize = FETCH_SIZE
+            cur.execute(_PROFILE_QUERY, (profile_id,))
+            if mode == "workbook":
+                return _export_workbook(cur, schedules, target, report, cancel)
+            return _export_directory(cur, schedules, target, processes, report, cancel)
+
+
+def _export_workbook(cur, schedules, path, report, cancel):
+    wb = Workbook(write_only=True)
+    used, result = set(), []
+    for done, (_, name, schedule_type, rows) in enumerate(_grouped(cur, schedules), 1):
+        db.check_cancel(cancel)
+        title = sheet_title(name, used)
+        write_sheet(wb.create_sheet(title), schedule_type, rows)
+        result.append((name, title))
+        report(done)
+    db.check_cancel(cancel)
+    if not result:
+        wb.create_sheet("Sheet1")
+    wb.save(path)
+    return result
+
+
+def _export_directory(cur, schedules, directory, processes, report, cancel):
+    import multiprocessing
+    import os
+    from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+    os.makedirs(directory, exist_ok=True)
+    used, result = set(), []
+    jobs = ((name, os.path.join(directory, file_name(name, used)), stype, rows)
+            for _, name, stype, rows in _grouped(cur, schedules))
+
+    workers = processes if processes is not None else (os.cpu_count() or 1)
+    if workers <= 1 or len(schedules) < MIN_PARALLEL_SCHEDULES:
+        for done, (name, path, stype, rows) in enumerate(jobs, 1):
+            db.check_cancel(cancel)
+            result.append((name, render_file(path, stype, rows)))
+            report(done)
+        return result
+
+    # Очередь ограничена, чтобы в памяти не копились строки всех расписаний.
+    # Процессы запускаются через spawn: выгрузка идёт из потока пула Qt,
+    # а fork многопоточного процесса может зависнуть на чужой блокировке
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+        in_flight = set()
+        try:
+            for name, path, stype, rows in jobs:
+                db.check_cancel(cancel)
+                while len(in_flight) >= workers * 2:
+                    finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        future.result()
+                        report(len(result) - len(in_flight))
+                in_flight.add(pool.submit(render_file, path, stype, rows))
+                result.append((name, path))
+            for future in list(in_flight):
+                db.check_cancel(cancel)
+                future.result()
+                in_flight.discard(future)
+                report(len(result) - len(in_flight))
+        except BaseException:
+            for future in in_flight:
+                future.cancel()
+            raise
+    return result
+
+
+# Сводные расписания преподавателей и аудиторий
+
+def export_timetable(kind: str, entity_id: int, path: str, profile_id: int = None) -> bool:
+    """Выгружает сводное расписание преподавателя или аудитории (db.get_timetable) в файл path."""
+    rows = db.get_timetable(kind, entity_id, profile_id)
+    two_week = is_two_week(rows)
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Sheet1")
+    ws.append(_header(ws, timetable_columns(kind, two_week)))
+    for row in timetable_grid(rows, two_week):
+        ws.append(row)
+    wb.save(path)
+    return True
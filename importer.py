@@ -0,0 +1,337 @@
+"""
+Пакетная загрузка справочников и сеток расписаний из CSV или xlsx.
+
+Файлы расписаний — в той же раскладке столбцов, что даёт выгрузка
+(export.SINGLE_COLUMNS / export.DOUBLE_COLUMNS). Строки файла копируются
+командой COPY во временные таблицы, имена разрешаются в id одним запросом,
+а ошибочные строки пропускаются и возвращаются списком [(строка, ошибка)],
+не прерывая загрузку остальных.
+"""
+import csv
+import io
+import itertools
+import os
+import sys
+
+import db
+import refcache
+from export import columns_for
+
+COPY_CHUNK = 10000
+
+ROOM_HEADER = "Аудитория"
+TEACHER_HEADER = "Преподаватель"
+NAME_HEADERS = {"аудитория", "преподаватель", "название", "имя", "name"}
+
+
+# Чтение файлов
+
+def _cell(value) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip()
+
+
+def read_rows(path: str):
+    """
+    Строки файла списками строк. xlsx — первый лист; остальное читается
+    как CSV с разделителем «,», «;» или табуляцией; «-» — стандартный ввод.
+    """
+    if path.lower().endswith((".xlsx", ".xlsm")):
+        from openpyxl import load_workbook
+        wb = load_workbook(path, read_only=True, data_only=True)
+        try:
+            for row in wb.worksheets[0].iter_rows(values_only=True):
+                yield [_cell(v) for v in row]
+        finally:
+            wb.close()
+        return
+
+    stream = sys.stdin if path == "-" else open(path, encoding="utf-8-sig", newline="")
+    try:
+        sample = stream.read(64 * 1024)
+        try:
+            dialect = csv.Sniffer().sniff(sample, delimiters=",;\t")
+        except csv.Error:
+            dialect = csv.excel
+        for row in csv.reader(_chain(sample, stream), dialect):
+            yield [_cell(v) for v in row]
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+
+
+def _chain(sample: str, stream):
+    yield from io.StringIO(sample)
+    yield from stream
+
+
+# COPY во временные таблицы
+
+def _copy_rows(cur, table: str, columns: tuple, rows, cancel=None, progress=None) -> int:
+    """Копирует строки в таблицу порциями по COPY_CHUNK. Возвращает их число."""
+    engine = db.backend()
+    total = 0
+    while True:
+        db.check_cancel(cancel)
+        chunk = list(itertools.islice(rows, COPY_CHUNK))
+        if chunk:
+            engine.copy_rows(cur, table, columns, chunk)
+            total += len(chunk)
+            if progress is not None:
+                progress(total, 0)
+        if len(chunk) < COPY_CHUNK:
+            return total
+
+
+# Справочники
+
+def _name_columns(header: list, table: str) -> list:
+    """Столбцы с именами: по заголовку выгрузки, иначе первый столбец."""
+    prefix = ROOM_HEADER if table == "rooms" else TEACHER_HEADER
+    return [i for i, title in enumerate(header) if title.startswith(prefix)]
+
+
+def _name_rows(path: str, table: str):
+    """(номер строки, имя) для каждого непустого имени в файле."""
+    rows = read_rows(path)
+    first = next(rows, None)
+    if first is None:
+        return
+    columns = _name_columns(first, table)
+    if not columns:
+        columns = [0]
+        if first and first[0] and first[0].lower() not in NAME_HEADERS:
+            yield 1, first[0]
+    for line, row in enumerate(rows, 2):
+        for i in columns:
+            if i < len(row) and row[i]:
+                yield line, row[i]
+
+
+def import_names(table: str, path: str, progress=None, cancel=None) -> dict:
+    """
+    Загружает имена аудиторий (table="rooms") или преподавателей ("teachers").
+    Файл — список имён в первом столбце (с заголовком или без) либо файл
+    в раскладке выгрузки: тогда берутся все столбцы «Аудитория…» или
+    «Преподаватель…». Пустые ячейки пропускаются, уже известные имена
+    не дублируются.
+
+    Возвращает {"read": int, "added": int}.
+    """
+    if table not in ("rooms", "teachers"):
+        raise ValueError(f"Неизвестный справочник: {table}")
+
+    with db.get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(db.backend().temp_table("import_names", "(line int, name text)"))
+            read = _copy_rows(cur, "import_names", ("line", "name"), _name_rows(path, table),
+                              cancel, progress)
+            cur.execute(f"""
+                INSERT INTO {table} (name)
+                SELECT DISTINCT name FROM import_names
+                WHERE true
+                ON CONFLICT (name) DO NOTHING;
+            """)
+            added = cur.rowcount
+            db.check_cancel(cancel)
+        conn.commit()
+    refcache.invalidate(table)
+    return {"read": read, "added": added}
+
+
+# Сетки расписаний
+
+_SCHEDULE_COLUMNS = ("line", "week_day", "pair_number", "week_type",
+                     "room", "lesson_type", "teacher", "discipline")
+
+_RESOLVE_QUERY = """
+    SELECT i.line, i.week_day, i.pair_number, i.week_type,
+           i.room, i.teacher, i.lesson_type, i.discipline,
+           {day_ok} AS day_ok,
+           pt.pair_number IS NOT NULL AS pair_ok,
+           (i.room = '' OR r.id IS NOT NULL) AS room_ok,
+           (i.teacher = '' OR t.id IS NOT NULL) AS teacher_ok,
+           row_number() OVER (
+               PARTITION BY i.week_day, i.pair_number, i.week_type ORDER BY i.line
+           ) = 1 AS unique_ok,
+           pt.pair_number AS pair, r.id AS room_id, t.id AS teacher_id,
+           {start} || ' - ' || {end} AS time_interval
+    FROM import_schedule i
+    LEFT JOIN profile_times pt ON pt.profile_id = %(profile_id)s
+                              AND CAST(pt.pair_number AS TEXT) = i.pair_number
+    LEFT JOIN rooms r ON r.name = i.room
+    LEFT JOIN teachers t ON t.name = i.teacher
+"""
+
+_ROW_ERRORS_QUERY = """
+    SELECT line, week_day, pair_number, room, teacher,
+           day_ok, pair_ok, room_ok, teacher_ok, unique_ok
+    FROM import_resolved
+    WHERE NOT (day_ok AND pair_ok AND room_ok AND teacher_ok AND unique_ok)
+    ORDER BY line, week_type;
+"""
+
+_INSERT_QUERY = """
+    INSERT INTO schedules (schedule_id, week_day, pair_number, room_id, teacher_id,
+                           lesson_type, discipline, week_type, time_interval)
+    SELECT %s, {week_day}, pair, room_id, teacher_id,
+           lesson_type, discipline, week_type, time_interval
+    FROM import_resolved
+    WHERE day_ok AND pair_ok AND room_ok AND teacher_ok AND unique_ok
+      AND (line, week_type) NOT IN (SELECT c.line, c.week_type FROM {busy})
+    ON CONFLICT (schedule_id, week_day, pair_number, week_type) DO UPDATE SET
+        room_id = EXCLUDED.room_id,
+        teacher_id = EXCLUDED.teacher_id,
+        lesson_type = EXCLUDED.lesson_type,
+        discipline = EXCLUDED.discipline,
+        time_interval = EXCLUDED.time_interval;
+"""
+
+
+_VALID_ROWS_QUERY = """
+    SELECT line, week_day, pair, room, teacher, lesson_type, discipline, week_type, room_id, teacher_id
+    FROM import_resolved
+    WHERE day_ok AND pair_ok AND room_ok AND teacher_ok AND unique_ok
+    ORDER BY line, week_type;
+"""
+
+_BUSY_COLUMNS = [("line", "int"), ("week_type", "int")]
+
+
+def _busy_rows(cur, schedule_id: int) -> dict:
+    """
+    Строки без ошибок, чьи аудитории или преподаватели заняты в других
+    расписаниях: {(строка, неделя): текст}. Слоты блокируются до конца
+    транзакции, как при сохранении из редактора (см. db.lock_slots).
+    """
+    cur.execute(_VALID_ROWS_QUERY)
+    valid = cur.fetchall()
+    rows = [(schedule_id, day, pair, room_id, teacher_id) for _, day, pair, _, _, _, _, _, room_id, teacher_id in valid]
+    entries = [(day, pair, room, teacher, lesson_type, discipline, week_type)
+               for _, day, pair, room, teacher, lesson_type, discipline, week_type, _, _ in valid]
+    db.lock_slots(cur, rows)
+    conflicts = db.find_conflicts(cur, schedule_id, entries)
+
+    line_of = {(day, pair, week_type): line for line, day, pair, _, _, _, _, week_type, _, _ in valid}
+    busy = {}
+    for kind, name, day, pair, week_type, other in conflicts:
+        key = (line_of[(day, pair, week_type)], week_type)
+        who = f"аудитория «{name}» занята" if kind == "room" else f"преподаватель «{name}» занят"
+        message = f"{who} в расписании «{other}»"
+        busy[key] = f"{busy[key]}; {message}" if key in busy else message
+    return busy
+
+
+def _grid_rows(rows, schedule_type: str):
+    """
+    Строки файла в раскладке выгрузки -> строки import_schedule.
+    Пустой день берётся из предыдущей строки (объединённые ячейки),
+    полностью пустые блоки недели пропускаются.
+    """
+    columns = columns_for(schedule_type)
+    header = next(rows, None)
+    if header is None:
+        return
+    if header[:len(columns)] != columns:
+        raise ValueError(
+            "Столбцы файла не совпадают с раскладкой выгрузки для расписания "
+            f"типа «{schedule_type}»: ожидаются {', '.join(columns)}"
+        )
+    blocks = [(0, 3)] if schedule_type == "Обычное" else [(1, 3), (2, 7)]
+
+    day = ""
+    for line, row in enumerate(rows, 2):
+        row = row + [""] * (len(columns) - len(row))
+        if not any(row[:len(columns)]):
+            continue
+        day = row[0] or day
+        pair = row[1]
+        for week_type, col in blocks:
+            room, lesson_type, teacher, discipline = row[col:col + 4]
+            if room or lesson_type or teacher or discipline:
+                yield line, day, pair, week_type, room, lesson_type, teacher, discipline
+
+
+def _row_error(week_day, pair_number, room, teacher, day_ok, pair_ok, room_ok, teacher_ok, unique_ok) -> str:
+    problems = []
+    if not day_ok:
+        problems.append(f"неизвестный день недели «{week_day}»")
+    if not pair_ok:
+        problems.append(f"в профиле нет занятия № «{pair_number}»")
+    if not room_ok:
+        problems.append(f"аудитория «{room}» не найдена")
+    if not teacher_ok:
+        problems.append(f"преподаватель «{teacher}» не найден")
+    if not unique_ok:
+        problems.append("повтор дня, занятия и недели из строки выше")
+    return "; ".join(problems)
+
+
+def import_schedule(schedule_id: int, path: str, replace: bool = True, progress=None, cancel=None) -> dict:
+    """
+    Загружает сетку расписания из файла в раскладке выгрузки.
+
+    При replace=True расписание перед загрузкой очищается, иначе
+    строки файла добавляются поверх (совпадающие день, занятие и неделя
+    перезаписываются). Строки с ошибками пропускаются, как и строки, чьи
+    аудитории или преподаватели заняты в других расписаниях. Версия расписания
+    увеличивается, так что открытые в редакторах копии станут устаревшими.
+
+    Возвращает {"read": int, "imported": int, "errors": [(строка, текст)],
+    "version": новая версия расписания}.
+    """
+    engine = db.backend()
+    with db.get_connection() as conn:
+        with conn.cursor() as cur:
+            engine.begin_write(cur)
+            cur.execute("""
+                UPDATE schedules_list SET version = version + 1 WHERE id = %s
+                RETURNING profile_id, schedule_type, version;
+            """, (schedule_id,))
+            found = cur.fetchone()
+            if found is None:
+                raise ValueError(f"Расписание {schedule_id} не найдено")
+            profile_id, schedule_type, version = found
+
+            cur.execute(engine.temp_table("import_schedule", """(
+                line int, week_day text, pair_number text, week_type int,
+                room text, lesson_type text, teacher text, discipline text
+            )"""))
+            read = _copy_rows(cur, "import_schedule", _SCHEDULE_COLUMNS,
+                              _grid_rows(read_rows(path), schedule_type), cancel, progress)
+
+            resolve = _RESOLVE_QUERY.format(
+                day_ok=engine.any("i.week_day", "%(days)s"),
+                start=engine.hhmm("pt.start_time"), end=engine.hhmm("pt.end_time")
+            )
+            cur.execute(engine.temp_table("import_resolved", "AS " + resolve),
+                        {"profile_id": profile_id, "days": engine.array(db.DAYS)})
+            cur.execute(_ROW_ERRORS_QUERY)
+            errors = [(row[0], _row_error(*row[1:])) for row in cur.fetchall()]
+            busy = _busy_rows(cur, schedule_id)
+            errors = sorted(errors + [(line, message) for (line, _), message in busy.items()],
+                            key=lambda error: error[0])
+
+            if replace:
+                cur.execute("DELETE FROM schedules WHERE schedule_id = %s;", (schedule_id,))
+            cur.execute(_INSERT_QUERY.format(week_day=engine.day("week_day"), busy=engine.rows(_BUSY_COLUMNS, "c")),
+                        [schedule_id] + engine.rows_params(_BUSY_COLUMNS, list(busy)))
+            imported = cur.rowcount
+            db.check_cancel(cancel)
+        conn.commit()
+    refcache.invalidate("schedules")
+    db.refresh_occupancy(schedule_id)
+    return {"read": read, "imported": imported, "errors": errors, "version": version}
+
+
+def import_file(kind: str, path: str, schedule_id: int = None, replace: bool = True,
+                progress=None, cancel=None) -> dict:
+    """Общая точка входа: kind — "rooms", "teachers" или "schedule"."""
+    if not os.path.exists(path) and path != "-":
+        raise FileNotFoundError(path)
+    if kind == "schedule":
+        return import_schedule(schedule_id, path, replace, progress, cancel)
+    return import_names(kind, path, progress, cancel)
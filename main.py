@@ -1,12 +1,21 @@
+import startup
 import sys
 from PyQt5.QtWidgets import QApplication
 from ui import MainWindow
+import db
+
+startup.mark("импорт модулей", check_modules=True)
 
 def main():
     app = QApplication(sys.argv)
+    app.aboutToQuit.connect(db.stop_change_listener)
+    app.aboutToQuit.connect(db.close_pool)
+    startup.mark("QApplication")
+    # Миграции, слушатель уведомлений и первые запросы — после первой
+    # отрисовки окна, в пуле потоков (см. MainWindow.connect_database)
     mw = MainWindow()
     mw.show()
     sys.exit(app.exec_())
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,308 @@
+"""
+Версионные миграции схемы базы данных.
+
+Запуск из командной строки:
+    python migrations.py            — применить все недостающие миграции
+    python migrations.py --status   — показать текущую версию схемы
+    python migrations.py --target 2 — довести схему до версии 2
+"""
+import argparse
+import sys
+
+# Номер advisory-блокировки, под которой выполняются миграции,
+# чтобы два клиента не обновляли схему одновременно
+MIGRATION_LOCK_ID = 7340001
+
+BASE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS profiles (
+    id SERIAL PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    max_pairs INTEGER NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS profile_times (
+    profile_id INTEGER NOT NULL,
+    pair_number INTEGER NOT NULL,
+    start_time TIME NOT NULL,
+    end_time TIME NOT NULL,
+    PRIMARY KEY (profile_id, pair_number),
+    FOREIGN KEY (profile_id) REFERENCES profiles(id) ON DELETE CASCADE
+);
+
+CREATE TABLE IF NOT EXISTS rooms (
+    id SERIAL PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+
+CREATE TABLE IF NOT EXISTS teachers (
+    id SERIAL PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+
+CREATE TABLE IF NOT EXISTS schedules_list (
+    id SERIAL PRIMARY KEY,
+    profile_id INTEGER REFERENCES profiles(id) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    schedule_type TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS schedules (
+    id SERIAL PRIMARY KEY,
+    schedule_id INTEGER REFERENCES schedules_list(id) ON DELETE CASCADE,
+    week_day TEXT NOT NULL,
+    pair_number INTEGER NOT NULL,
+    room_id INTEGER REFERENCES rooms(id),
+    teacher_id INTEGER REFERENCES teachers(id),
+    lesson_type TEXT,
+    discipline TEXT,
+    week_type INTEGER NOT NULL,
+    time_interval TEXT NOT NULL,
+
+    CONSTRAINT unique_schedule_entry UNIQUE (schedule_id, week_day, pair_number, week_type)
+);
+"""
+
+# Проверка занятости ищет записи по аудитории/преподавателю и слоту,
+# загрузка и сохранение — по schedule_id (его покрывает unique_schedule_entry)
+HOT_PATH_INDEXES = """
+CREATE INDEX IF NOT EXISTS schedules_room_slot_idx
+    ON schedules (room_id, week_day, pair_number, week_type);
+
+CREATE INDEX IF NOT EXISTS schedules_teacher_slot_idx
+    ON schedules (teacher_id, week_day, pair_number, week_type);
+
+CREATE INDEX IF NOT EXISTS schedules_list_profile_idx
+    ON schedules_list (profile_id);
+"""
+
+# День недели хранится перечислением: 4 байта вместо строки,
+# значения по-прежнему читаются и сравниваются как текст,
+# а сортировка идёт в календарном порядке
+WEEK_DAY_ENUM = """
+CREATE TYPE week_day_t AS ENUM (
+    'Понедельник', 'Вторник', 'Среда', 'Четверг', 'Пятница', 'Суббота'
+);
+
+ALTER TABLE schedules
+    ALTER COLUMN week_day TYPE week_day_t USING week_day::week_day_t;
+"""
+
+# Изменения справочников рассылаются клиентам через LISTEN/NOTIFY:
+# полезная нагрузка — имя изменённой таблицы
+REFERENCE_NOTIFY = """
+CREATE OR REPLACE FUNCTION notify_reference_change() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('reference_data', TG_TABLE_NAME);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER profiles_notify
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON profiles
+    FOR EACH STATEMENT EXECUTE PROCEDURE notify_reference_change();
+CREATE TRIGGER profile_times_notify
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON profile_times
+    FOR EACH STATEMENT EXECUTE PROCEDURE notify_reference_change();
+CREATE TRIGGER rooms_notify
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON rooms
+    FOR EACH STATEMENT EXECUTE PROCEDURE notify_reference_change();
+CREATE TRIGGER teachers_notify
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON teachers
+    FOR EACH STATEMENT EXECUTE PROCEDURE notify_reference_change();
+CREATE TRIGGER schedules_list_notify
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON schedules_list
+    FOR EACH STATEMENT EXECUTE PROCEDURE notify_reference_change();
+"""
+
+# Записи расписаний тоже рассылаются: по ним кэшируются сводные
+# расписания преподавателей и аудиторий (db.get_timetable)
+SCHEDULES_NOTIFY = """
+CREATE TRIGGER schedules_notify
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON schedules
+    FOR EACH STATEMENT EXECUTE PROCEDURE notify_reference_change();
+"""
+
+# Поиск по справочникам (db.search_names): префикс ищется по btree-индексу
+# на lower(name), подстрока — по триграммному индексу, если расширение
+# pg_trgm установлено на сервере и его разрешено создать
+NAME_SEARCH_INDEXES = """
+CREATE INDEX IF NOT EXISTS rooms_name_prefix_idx ON rooms (lower(name) text_pattern_ops);
+CREATE INDEX IF NOT EXISTS teachers_name_prefix_idx ON teachers (lower(name) text_pattern_ops);
+
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm') THEN
+        CREATE EXTENSION IF NOT EXISTS pg_trgm;
+        CREATE INDEX IF NOT EXISTS rooms_name_trgm_idx ON rooms USING gin (lower(name) gin_trgm_ops);
+        CREATE INDEX IF NOT EXISTS teachers_name_trgm_idx ON teachers USING gin (lower(name) gin_trgm_ops);
+    END IF;
+EXCEPTION WHEN insufficient_privilege THEN
+    RAISE NOTICE 'pg_trgm недоступно: поиск по подстроке пойдёт без индекса';
+END;
+$$;
+"""
+
+# Версия расписания для сохранения со сравнением (db.save_schedule_*):
+# каждая запись увеличивает её, а сохранение с устаревшей версией отклоняется
+SCHEDULE_VERSION = """
+ALTER TABLE schedules_list ADD COLUMN version INTEGER NOT NULL DEFAULT 0;
+"""
+
+# Та же схема для встроенной базы SQLite. День недели хранится текстом
+# со сравнением week_day (календарный порядок, как у week_day_t), поэтому
+# миграция 3 для SQLite пустая; уведомлений (миграции 4 и 5) в SQLite нет
+SQLITE_BASE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS profiles (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    max_pairs INTEGER NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS profile_times (
+    profile_id INTEGER NOT NULL,
+    pair_number INTEGER NOT NULL,
+    start_time TIME NOT NULL,
+    end_time TIME NOT NULL,
+    PRIMARY KEY (profile_id, pair_number),
+    FOREIGN KEY (profile_id) REFERENCES profiles(id) ON DELETE CASCADE
+);
+
+CREATE TABLE IF NOT EXISTS rooms (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+
+CREATE TABLE IF NOT EXISTS teachers (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+
+CREATE TABLE IF NOT EXISTS schedules_list (
+    id INTEGER PRIMARY KEY,
+    profile_id INTEGER REFERENCES profiles(id) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    schedule_type TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS schedules (
+    id INTEGER PRIMARY KEY,
+    schedule_id INTEGER REFERENCES schedules_list(id) ON DELETE CASCADE,
+    week_day TEXT NOT NULL COLLATE week_day CHECK (week_day IN (
+        'Понедельник', 'Вторник', 'Среда', 'Четверг', 'Пятница', 'Суббота'
+    )),
+    pair_number INTEGER NOT NULL,
+    room_id INTEGER REFERENCES rooms(id),
+    teacher_id INTEGER REFERENCES teachers(id),
+    lesson_type TEXT,
+    discipline TEXT,
+    week_type INTEGER NOT NULL,
+    time_interval TEXT NOT NULL,
+
+    CONSTRAINT unique_schedule_entry UNIQUE (schedule_id, week_day, pair_number, week_type)
+);
+"""
+
+# Миграции: (версия, описание, {движок: SQL}); пустой SQL — для движка
+# изменение не требуется, но версия всё равно отмечается
+MIGRATIONS = [
+    (1, "Базовая схема", {"postgresql": BASE_SCHEMA, "sqlite": SQLITE_BASE_SCHEMA}),
+    (2, "Индексы для проверки занятости и загрузки расписаний",
+     {"postgresql": HOT_PATH_INDEXES, "sqlite": HOT_PATH_INDEXES}),
+    (3, "Хранение дня недели перечислением week_day_t", {"postgresql": WEEK_DAY_ENUM, "sqlite": ""}),
+    (4, "Уведомления об изменении справочников", {"postgresql": REFERENCE_NOTIFY, "sqlite": ""}),
+    (5, "Уведомления об изменении записей расписаний", {"postgresql": SCHEDULES_NOTIFY, "sqlite": ""}),
+    # Во встроенной базе справочники невелики, поиск идёт без индекса
+    (6, "Индексы поиска по именам аудиторий и преподавателей", {"postgresql": NAME_SEARCH_INDEXES, "sqlite": ""}),
+    (7, "Версии расписаний", {"postgresql": SCHEDULE_VERSION, "sqlite": SCHEDULE_VERSION}),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def _ensure_version_table(cur, engine):
+    timestamp = "TIMESTAMPTZ NOT NULL DEFAULT now()" if engine.name == "postgresql" \
+        else "TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP"
+    cur.execute(f"""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            description TEXT NOT NULL,
+            applied_at {timestamp}
+        );
+    """)
+
+
+def _backend(engine):
+    if engine is None:
+        import db
+        engine = db.backend()
+    return engine
+
+
+def current_version(conn, engine=None) -> int:
+    engine = _backend(engine)
+    with conn.cursor() as cur:
+        if not engine.table_exists(cur, "schema_migrations"):
+            return 0
+        cur.execute("SELECT COALESCE(MAX(version), 0) FROM schema_migrations;")
+        return cur.fetchone()[0]
+
+
+def migrate(conn=None, target: int = None, engine=None) -> list:
+    """
+    Применяет недостающие миграции до версии target (по умолчанию — последней).
+    Каждая миграция выполняется в отдельной транзакции.
+    Возвращает список применённых версий.
+    """
+    if conn is None:
+        import db
+        with db.get_connection() as pooled:
+            return migrate(pooled, target, engine)
+
+    engine = _backend(engine)
+    target = LATEST_VERSION if target is None else target
+    applied = []
+    for version, description, scripts in MIGRATIONS:
+        if version > target:
+            break
+        with conn.cursor() as cur:
+            if engine.name == "postgresql":
+                cur.execute("SELECT pg_advisory_xact_lock(%s);", (MIGRATION_LOCK_ID,))
+            else:
+                # В SQLite роль блокировки играет BEGIN IMMEDIATE
+                engine.begin_write(cur)
+            _ensure_version_table(cur, engine)
+            cur.execute("SELECT 1 FROM schema_migrations WHERE version = %s;", (version,))
+            if cur.fetchone():
+                conn.commit()
+                continue
+            if scripts[engine.name]:
+                cur.execute(scripts[engine.name])
+            cur.execute(
+                "INSERT INTO schema_migrations (version, description) VALUES (%s, %s);",
+                (version, description)
+            )
+        conn.commit()
+        applied.append(version)
+    return applied
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Миграции схемы базы расписаний")
+    parser.add_argument("--target", type=int, default=None, help="версия, до которой обновить схему")
+    parser.add_argument("--status", action="store_true", help="только показать текущую версию")
+    args = parser.parse_args(argv)
+
+    import db
+    with db.get_connection() as conn:
+        if args.status:
+            print(f"Версия схемы: {current_version(conn)} (последняя: {LATEST_VERSION})")
+            return 0
+        applied = migrate(conn, args.target)
+        for version in applied:
+            print(f"Применена миграция {version}: {dict((v, d) for v, d, _ in MIGRATIONS)[version]}")
+        print(f"Версия схемы: {current_version(conn)}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
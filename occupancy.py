@@ -0,0 +1,212 @@
+import threading
+
+import numpy as np
+
+ROOM = 0
+TEACHER = 1
+WEEK_TYPES = 3  # 0 — обычная, 1 — нечетная, 2 — четная
+
+# С какими типами недели пересекается слот: занятие «каждую неделю» (0)
+# занимает и нечётную, и чётную неделю
+COVERED_WEEKS = {0: [0, 1, 2], 1: [0, 1], 2: [0, 2]}
+
+
+class _Axis:
+    """Соответствие id аудитории/преподавателя строке массива занятости."""
+
+    def __init__(self, pairs):
+        self.index = {}   # id -> строка
+        self.ids = []     # строка -> id
+        self.names = []   # строка -> имя
+        self.by_name = {}  # имя -> id
+        for entity_id, name in pairs:
+            self.add(entity_id, name)
+
+    def add(self, entity_id, name) -> int:
+        pos = self.index.get(entity_id)
+        if pos is None:
+            pos = len(self.ids)
+            self.index[entity_id] = pos
+            self.ids.append(entity_id)
+            self.names.append(name)
+        self.by_name[name] = entity_id
+        return pos
+
+
+class OccupancyIndex:
+    """
+    Индекс занятости аудиторий и преподавателей в памяти.
+
+    Для каждого профиля и вида ресурса хранится массив счётчиков
+    [ресурс × день × пара × тип недели]; значение — сколько записей
+    расписаний профиля занимают этот слот. Занятость проверяется только
+    среди расписаний профиля, как и в запросах db. Для каждого расписания
+    запоминаются профиль и слоты, поэтому проверку «занято другими
+    расписаниями» и пересохранение расписания можно выполнить без
+    обращения к базе.
+
+    Индекс отражает только то, что видел этот процесс: сохранения
+    других пользователей попадут в него после refresh/rebuild.
+    """
+
+    def __init__(self, days, rooms, teachers, max_pairs: int = 1):
+        self.days = list(days)
+        self._day_index = {d: i for i, d in enumerate(self.days)}
+        self._axes = (_Axis(rooms), _Axis(teachers))
+        self._max_pairs = max(max_pairs, 1)
+        # profile_id -> [счётчики аудиторий, счётчики преподавателей]
+        self._counts = {}
+        # schedule_id -> profile_id
+        self._profiles = {}
+        # schedule_id -> {(вид, строка, день, пара, неделя)}
+        self._slots = {}
+        self._lock = threading.RLock()
+
+    def _empty(self, rows: int):
+        return np.zeros((max(rows, 1), len(self.days), self._max_pairs + 1, WEEK_TYPES), dtype=np.int16)
+
+    @classmethod
+    def from_rows(cls, days, rooms, teachers, schedules, rows):
+        """
+        rooms, teachers — [(id, name)];
+        schedules — [(schedule_id, profile_id)];
+        rows — [(schedule_id, week_day, pair_number, week_type, room_id, teacher_id)].
+        """
+        rows = list(rows)
+        max_pairs = max((r[2] for r in rows), default=1)
+        index = cls(days, rooms, teachers, max_pairs)
+        by_schedule = {schedule_id: [] for schedule_id, _ in schedules}
+        for row in rows:
+            by_schedule.setdefault(row[0], []).append(row[1:])
+        for schedule_id, profile_id in schedules:
+            index.replace_schedule(schedule_id, profile_id, by_schedule[schedule_id])
+        return index
+
+    # Обслуживание структуры
+
+    def _profile_counts(self, profile_id) -> list:
+        counts = self._counts.get(profile_id)
+        if counts is None:
+            counts = self._counts[profile_id] = [self._empty(len(axis.ids)) for axis in self._axes]
+        return counts
+
+    def _ensure_capacity(self, kind: int, pair_number: int):
+        grow_pairs = pair_number > self._max_pairs
+        if grow_pairs:
+            self._max_pairs = pair_number
+        rows = len(self._axes[kind].ids)
+        for counts in self._counts.values():
+            if grow_pairs:
+                for k in (ROOM, TEACHER):
+                    old = counts[k]
+                    grown = self._empty(old.shape[0])
+                    grown[:, :, :old.shape[2], :] = old
+                    counts[k] = grown
+            if rows > counts[kind].shape[0]:
+                old = counts[kind]
+                grown = self._empty(max(rows, old.shape[0] * 2))
+                grown[:old.shape[0]] = old
+                counts[kind] = grown
+
+    def add_entity(self, kind: int, entity_id: int, name: str):
+        with self._lock:
+            self._axes[kind].add(entity_id, name)
+            self._ensure_capacity(kind, 0)
+
+    def _slot(self, kind: int, entity_id, day, pair_number, week_type, grow: bool = False):
+        pos = self._axes[kind].index.get(entity_id)
+        d = self._day_index.get(day)
+        if pos is None or d is None or not 0 <= week_type < WEEK_TYPES or pair_number < 0:
+            return None
+        if grow:
+            self._ensure_capacity(kind, pair_number)
+        elif pair_number > self._max_pairs:
+            return None
+        return kind, pos, d, pair_number, week_type
+
+    def remove_schedule(self, schedule_id: int):
+        with self._lock:
+            profile_id = self._profiles.pop(schedule_id, None)
+            for kind, pos, d, p, w in self._slots.pop(schedule_id, ()):
+                self._counts[profile_id][kind][pos, d, p, w] -= 1
+
+    def replace_schedule(self, schedule_id: int, profile_id: int, rows):
+        """rows — [(week_day, pair_number, week_type, room_id, teacher_id)]."""
+        with self._lock:
+            self.remove_schedule(schedule_id)
+            self._profiles[schedule_id] = profile_id
+            self._profile_counts(profile_id)
+            slots = set()
+            for day, pair_number, week_type, room_id, teacher_id in rows:
+                for kind, entity_id in ((ROOM, room_id), (TEACHER, teacher_id)):
+                    if entity_id is None:
+                        continue
+                    slot = self._slot(kind, entity_id, day, pair_number, week_type, grow=True)
+                    if slot is not None and slot not in slots:
+                        slots.add(slot)
+                        k, pos, d, p, w = slot
+                        self._counts[profile_id][k][pos, d, p, w] += 1
+            if slots:
+                self._slots[schedule_id] = slots
+
+    # Запросы
+
+    def is_busy(self, kind: int, name: str, day, pair_number, week_type, schedule_id):
+        """
+        True/False — занят ли ресурс в слоте другими расписаниями профиля
+        schedule_id с учётом пересекающихся недель (COVERED_WEEKS); None, если
+        ресурс или расписание индексу неизвестны.
+        """
+        with self._lock:
+            entity_id = self._axes[kind].by_name.get(name)
+            if entity_id is None or schedule_id not in self._profiles:
+                return None
+            slot = self._slot(kind, entity_id, day, pair_number, week_type)
+            if slot is None:
+                return False
+            _, pos, d, p, _ = slot
+            weeks = COVERED_WEEKS[week_type]
+            counts = self._counts[self._profiles[schedule_id]][kind]
+            count = int(counts[pos, d, p, weeks].sum())
+            count -= sum(1 for sk, spos, sd, sp, sw in self._slots.get(schedule_id, ())
+                         if (sk, spos, sd, sp) == (kind, pos, d, p) and sw in weeks)
+            return count > 0
+
+    def is_room_busy(self, room_name, day, pair_number, week_type, schedule_id):
+        return self.is_busy(ROOM, room_name, day, pair_number, week_type, schedule_id)
+
+    def is_teacher_busy(self, teacher_name, day, pair_number, week_type, schedule_id):
+        return self.is_busy(TEACHER, teacher_name, day, pair_number, week_type, schedule_id)
+
+    def free(self, kind: int, day, pair_number, week_type, schedule_id=None):
+        """
+        Имена ресурсов, не занятых в слоте другими расписаниями профиля
+        schedule_id (None — всеми расписаниями), в порядке справочника.
+        Учитываются пересекающиеся недели (COVERED_WEEKS). None, если
+        расписание индексу неизвестно.
+        """
+        with self._lock:
+            axis = self._axes[kind]
+            if schedule_id is not None and schedule_id not in self._profiles:
+                return None
+            d = self._day_index.get(day)
+            weeks = COVERED_WEEKS.get(week_type)
+            if d is None or weeks is None or not 0 <= pair_number <= self._max_pairs:
+                return list(axis.names)
+            if schedule_id is None:
+                profiles = list(self._counts.values())
+            else:
+                profiles = [self._counts[self._profiles[schedule_id]]]
+            busy = np.zeros(len(axis.ids), dtype=np.int32)
+            for counts in profiles:
+                busy += counts[kind][:len(axis.ids), d, pair_number, weeks].sum(axis=1)
+            for k, pos, sd, sp, sw in self._slots.get(schedule_id, ()):
+                if k == kind and sd == d and sp == pair_number and sw in weeks:
+                    busy[pos] -= 1
+            return [axis.names[i] for i in np.flatnonzero(busy <= 0)]
+
+    def free_rooms(self, day, pair_number, week_type, schedule_id=None):
+        return self.free(ROOM, day, pair_number, week_type, schedule_id)
+
+    def free_teachers(self, day, pair_number, week_type, schedule_id=None):
+        return self.free(TEACHER, day, pair_number, week_type, schedule_id)
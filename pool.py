@@ -0,0 +1,171 @@
+import threading
+import time
+
+
+class PoolError(Exception):
+    pass
+
+
+class PoolTimeout(PoolError):
+    pass
+
+
+class ConnectionPool:
+    """
+    Потокобезопасный пул соединений с базой. Соединения открывает
+    движок хранения (storage.PostgresBackend или storage.SqliteBackend).
+
+    Держит от minconn до maxconn открытых соединений. Если все соединения
+    заняты, getconn ждёт освобождения не дольше timeout секунд. Соединение,
+    пролежавшее в пуле дольше check_idle секунд, перед выдачей проверяется
+    запросом SELECT 1.
+    """
+
+    def __init__(self, backend, minconn: int = 1, maxconn: int = 10,
+                 timeout: float = 30.0, check_idle: float = 30.0):
+        if minconn < 0 or maxconn < 1 or minconn > maxconn:
+            raise ValueError("Некорректные границы пула: minconn=%s, maxconn=%s" % (minconn, maxconn))
+        self.backend = backend
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.check_idle = check_idle
+
+        self._cond = threading.Condition()
+        self._idle = []   # [(conn, время возврата в пул)]
+        self._size = 0    # всего открыто соединений, включая выданные
+        self._closed = False
+        self._counters = {
+            "hits": 0,       # выдано тёплое соединение из пула
+            "misses": 0,     # пришлось открыть новое соединение
+            "waits": 0,      # ожидание свободного соединения
+            "timeouts": 0,   # ожидание завершилось по таймауту
+            "discarded": 0,  # соединение не прошло проверку и закрыто
+        }
+
+        for _ in range(minconn):
+            self._idle.append((self._connect(), time.monotonic()))
+            self._size += 1
+
+    def _connect(self):
+        return self.backend.connect()
+
+    def _is_healthy(self, conn, idle_since: float) -> bool:
+        if conn.closed:
+            return False
+        if self.backend.transaction_state(conn) != "idle":
+            return False
+        if time.monotonic() - idle_since < self.check_idle:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1;")
+            conn.rollback()
+            return True
+        except self.backend.Error:
+            return False
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except self.backend.Error:
+            pass
+        with self._cond:
+            self._size -= 1
+            self._counters["discarded"] += 1
+            self._cond.notify()
+
+    def getconn(self):
+        deadline = time.monotonic() + self.timeout
+        waited = False
+        while True:
+            with self._cond:
+                while True:
+                    if self._closed:
+                        raise PoolError("Пул соединений закрыт")
+                    if self._idle:
+                        conn, idle_since = self._idle.pop()
+                        break
+                    if self._size < self.maxconn:
+                        self._size += 1
+                        conn = None
+                        break
+                    if not waited:
+                        waited = True
+                        self._counters["waits"] += 1
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._counters["timeouts"] += 1
+                        raise PoolTimeout(
+                            "Нет свободного соединения за %.1f с (maxconn=%d)" % (self.timeout, self.maxconn)
+                        )
+                    self._cond.wait(remaining)
+
+            if conn is None:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+                with self._cond:
+                    self._counters["misses"] += 1
+                return conn
+
+            # Проверка выполняется без блокировки, чтобы не задерживать другие потоки
+            if self._is_healthy(conn, idle_since):
+                with self._cond:
+                    self._counters["hits"] += 1
+                return conn
+            self._discard(conn)
+
+    def putconn(self, conn, close: bool = False):
+        if not close and not conn.closed:
+            state = self.backend.transaction_state(conn)
+            if state == "broken":
+                close = True
+            elif state != "idle":
+                try:
+                    conn.rollback()
+                except self.backend.Error:
+                    close = True
+
+        with self._cond:
+            if close or conn.closed or self._closed:
+                self._size -= 1
+                self._cond.notify()
+            else:
+                self._idle.append((conn, time.monotonic()))
+                self._cond.notify()
+                return
+        try:
+            conn.close()
+        except self.backend.Error:
+            pass
+
+    def closeall(self):
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for conn, _ in idle:
+            try:
+                conn.close()
+            except self.backend.Error:
+                pass
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    def stats(self) -> dict:
+        with self._cond:
+            result = dict(self._counters)
+            result["size"] = self._size
+            result["idle"] = len(self._idle)
+            result["in_use"] = self._size - len(self._idle)
+            result["minconn"] = self.minconn
+            result["maxconn"] = self.maxconn
+            return result
@@ -0,0 +1,100 @@
+import functools
+import threading
+import time
+
+DEFAULT_TTL = 300.0
+
+
+class ReferenceCache:
+    """
+    Кэш справочных данных с временем жизни и сбросом по темам.
+
+    Тема — имя таблицы (rooms, teachers, profiles, ...). Сброс темы удаляет
+    все записи, загруженные из этой таблицы. Значение, загрузка которого
+    началась до сброса, в кэш не попадает.
+    """
+
+    def __init__(self, ttl: float = DEFAULT_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = {}      # (topic, key) -> (значение, момент истечения)
+        self._generations = {}  # topic -> номер сброса
+        self._counters = {"hits": 0, "misses": 0, "invalidations": 0}
+
+    def get(self, topic: str, key, loader, ttl: float = None):
+        found, value = self.lookup(topic, key)
+        if found:
+            return value
+        generation = value
+        value = loader()
+        self.store(topic, key, value, generation, ttl)
+        return value
+
+    def lookup(self, topic: str, key):
+        """
+        (True, значение) из кэша или (False, номер сброса темы). Номер
+        передаётся в store(), чтобы значение, загрузка которого началась
+        до сброса, не попало в кэш.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get((topic, key))
+            if entry is not None and entry[1] > now:
+                self._counters["hits"] += 1
+                return True, entry[0]
+            self._counters["misses"] += 1
+            return False, self._generations.get(topic, 0)
+
+    def store(self, topic: str, key, value, generation: int, ttl: float = None):
+        with self._lock:
+            if self._generations.get(topic, 0) == generation:
+                lifetime = self.ttl if ttl is None else ttl
+                self._entries[(topic, key)] = (value, time.monotonic() + lifetime)
+
+    def invalidate(self, *topics):
+        with self._lock:
+            for topic in topics:
+                self._generations[topic] = self._generations.get(topic, 0) + 1
+                self._counters["invalidations"] += 1
+            self._entries = {k: v for k, v in self._entries.items() if k[0] not in topics}
+
+    def clear(self):
+        with self._lock:
+            for topic in {k[0] for k in self._entries} | set(self._generations):
+                self._generations[topic] = self._generations.get(topic, 0) + 1
+            self._entries.clear()
+            self._counters["invalidations"] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            result = dict(self._counters)
+            result["entries"] = len(self._entries)
+            return result
+
+
+cache = ReferenceCache()
+
+
+def cached(topic: str, ttl: float = None):
+    """
+    Кэширует результат функции по её аргументам в теме topic.
+    Списки отдаются копией, чтобы вызывающий код не испортил кэш.
+    """
+    def decorator(fn):
+        def cache_key(*args, **kwargs):
+            return fn.__name__, args, tuple(sorted(kwargs.items()))
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            value = cache.get(topic, cache_key(*args, **kwargs), lambda: fn(*args, **kwargs), ttl)
+            return list(value) if isinstance(value, list) else value
+        wrapper.uncached = fn
+        # Для загрузки нескольких тем одним запросом (см. db.load_editor_data)
+        wrapper.topic = topic
+        wrapper.cache_key = cache_key
+        return wrapper
+    return decorator
+
+
+def invalidate(*topics):
+    cache.invalidate(*topics)
@@ -0,0 +1,369 @@
+from PyQt5 import sip
+from PyQt5.QtCore import Qt, QAbstractTableModel, QModelIndex, QVariant, QStringListModel, QTimer, pyqtSignal
+from PyQt5.QtGui import QBrush, QColor
+from PyQt5.QtWidgets import QComboBox, QCompleter, QStyledItemDelegate
+
+SINGLE_HEADERS = ["День", "№ занятия", "Время", "Аудитория", "Вид занятия", "Преподаватель", "Дисциплина"]
+DOUBLE_HEADERS = [
+    "День", "№ занятия", "Время",
+    "Аудитория (Нечет)", "Вид занятия (Нечет)", "Преподаватель (Нечет)", "Дисциплина (Нечет)",
+    "Аудитория (Чет)", "Вид занятия (Чет)", "Преподаватель (Чет)", "Дисциплина (Чет)"
+]
+
+# Первый редактируемый столбец; дальше идут блоки по 4 столбца на тип недели:
+# аудитория, вид занятия, преподаватель, дисциплина
+FIRST_EDIT_COLUMN = 3
+ROOM_OFFSET = 0
+TEACHER_OFFSET = 2
+
+
+# (аудитория, вид, преподаватель, дисциплина) слота без записи
+EMPTY_SLOT = ("", "", "", "")
+
+
+class ScheduleTableModel(QAbstractTableModel):
+    """
+    Сетка расписания: строка на каждую пару каждого дня,
+    по блоку из 4 столбцов на каждый тип недели.
+
+    Модель помнит сохранённое состояние каждого слота (строка, неделя)
+    и слоты, изменённые с загрузки, поэтому changed_entries() отдаёт
+    только разницу с базой. Слот без записи в базе считается пустым.
+    Проблемы ячеек (set_problems) подсвечиваются.
+    """
+
+    # Пользователь изменил ячейку (не при загрузке и не при подсветке проблем)
+    edited = pyqtSignal()
+
+    PROBLEM_BRUSH = QBrush(QColor(255, 205, 205))
+
+    def __init__(self, days, time_intervals, single=True, parent=None):
+        super().__init__(parent)
+        self.days = list(days)
+        self.time_intervals = list(time_intervals)
+        self.single = single
+        self.headers = SINGLE_HEADERS if single else DOUBLE_HEADERS
+        # (week_type, первый столбец блока) для каждого блока недели
+        self.week_blocks = [(0, 3)] if single else [(1, 3), (2, 7)]
+
+        self._pairs = len(self.time_intervals)
+        self._row_of = {}
+        for d_index, day in enumerate(self.days):
+            for p_index, (pair_number, _, _) in enumerate(self.time_intervals):
+                self._row_of[(day, pair_number)] = d_index * self._pairs + p_index
+        self._block_of_week = {week_type: col for week_type, col in self.week_blocks}
+        self._times = [f"{start} - {end}" for _, start, end in self.time_intervals]
+        self._cells = [[""] * (len(self.headers) - FIRST_EDIT_COLUMN) for _ in range(len(self._row_of))]
+        # (строка, неделя) -> (аудитория, вид, преподаватель, дисциплина) как в базе
+        self._saved = {}
+        self._dirty = set()     # слоты, изменённые с загрузки или сохранения
+        self._problems = {}     # (строка, столбец) -> текст проблемы
+
+    # Интерфейс QAbstractTableModel
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._cells)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.headers)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.headers[section]
+        return super().headerData(section, orientation, role)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return QVariant()
+        if role in (Qt.BackgroundRole, Qt.ToolTipRole):
+            problem = self._problems.get((index.row(), index.column()))
+            if problem is None:
+                return QVariant()
+            return self.PROBLEM_BRUSH if role == Qt.BackgroundRole else problem
+        if role not in (Qt.DisplayRole, Qt.EditRole):
+            return QVariant()
+        return self.cell_text(index.row(), index.column())
+
+    def setData(self, index, value, role=Qt.EditRole):
+        if role != Qt.EditRole or not index.isValid() or index.column() < FIRST_EDIT_COLUMN:
+            return False
+        text = (value or "").strip()
+        row, col = index.row(), index.column()
+        if self._cells[row][col - FIRST_EDIT_COLUMN] == text:
+            return False
+        self._cells[row][col - FIRST_EDIT_COLUMN] = text
+        self._dirty.add((row, self._week_of_column(col)))
+        self.dataChanged.emit(index, index, [Qt.DisplayRole, Qt.EditRole])
+        self.edited.emit()
+        return True
+
+    def flags(self, index):
+        if not index.isValid():
+            return Qt.NoItemFlags
+        if index.column() < FIRST_EDIT_COLUMN:
+            return Qt.ItemIsEnabled
+        return Qt.ItemIsEnabled | Qt.ItemIsSelectable | Qt.ItemIsEditable
+
+    # Доступ к сетке
+
+    def row_key(self, row):
+        """(день, номер пары) строки."""
+        return self.days[row // self._pairs], self.time_intervals[row % self._pairs][0]
+
+    def cell_text(self, row, col):
+        if col == 0:
+            return self.days[row // self._pairs] if row % self._pairs == 0 else ""
+        if col == 1:
+            return str(self.time_intervals[row % self._pairs][0])
+        if col == 2:
+            return self._times[row % self._pairs]
+        return self._cells[row][col - FIRST_EDIT_COLUMN]
+
+    def _week_of_column(self, col):
+        for week_type, start in self.week_blocks:
+            if start <= col < start + 4:
+                return week_type
+        return None
+
+    def _slot_values(self, row, week_type):
+        offset = self._block_of_week[week_type] - FIRST_EDIT_COLUMN
+        return tuple(self._cells[row][offset:offset + 4])
+
+    def _entry(self, row, week_type, values):
+        day, pair_number = self.row_key(row)
+        room, lesson_type, teacher, discipline = values
+        return day, pair_number, room, teacher, lesson_type, discipline, week_type
+
+    def cell_of(self, day, pair_number, week_type, kind):
+        """(строка, столбец) ячейки аудитории (kind="room") или преподавателя слота; None — нет такой."""
+        row = self._row_of.get((day, pair_number))
+        col = self._block_of_week.get(week_type)
+        if row is None or col is None:
+            return None
+        return row, col + (ROOM_OFFSET if kind == "room" else TEACHER_OFFSET)
+
+    def slot_of(self, index):
+        """(день, номер пары, тип недели) ячейки редактируемого блока."""
+        day, pair_number = self.row_key(index.row())
+        for week_type, col in self.week_blocks:
+            if col <= index.column() < col + 4:
+                return day, pair_number, week_type
+        return None
+
+    def is_room_column(self, col):
+        return col >= FIRST_EDIT_COLUMN and (col - FIRST_EDIT_COLUMN) % 4 == ROOM_OFFSET
+
+    def is_teacher_column(self, col):
+        return col >= FIRST_EDIT_COLUMN and (col - FIRST_EDIT_COLUMN) % 4 == TEACHER_OFFSET
+
+    def day_spans(self):
+        """[(первая строка дня, число строк)] для объединения ячеек столбца «День»."""
+        return [(d_index * self._pairs, self._pairs) for d_index in range(len(self.days))] if self._pairs else []
+
+    def load_entries(self, entries):
+        """
+        Заполняет сетку записями load_schedule_entries одним сбросом модели
+        и запоминает их как сохранённое состояние. Записи с неизвестным днём,
+        парой или типом недели пропускаются.
+        """
+        self.beginResetModel()
+        for row_cells in self._cells:
+            row_cells[:] = [""] * len(row_cells)
+        self._saved.clear()
+        self._dirty.clear()
+        self._problems.clear()
+        for day, pair_number, room, teacher, lesson_type, discipline, week_type in entries:
+            row = self._row_of.get((day, pair_number))
+            col = self._block_of_week.get(week_type)
+            if row is None or col is None:
+                continue
+            offset = col - FIRST_EDIT_COLUMN
+            values = [room or "", lesson_type or "", teacher or "", discipline or ""]
+            self._cells[row][offset:offset + 4] = values
+            self._saved[(row, week_type)] = tuple(values)
+        self.endResetModel()
+
+    def entries(self):
+        """
+        Все ячейки сетки в формате save_schedule_entries:
+        [(day, pair_number, room, teacher, lesson_type, discipline, week_type)]
+        """
+        return [self._entry(row, week_type, self._slot_values(row, week_type))
+                for row in range(len(self._cells)) for week_type, _ in self.week_blocks]
+
+    def changed_entries(self):
+        """
+        Записи слотов, отличающихся от сохранённых, в формате save_schedule_entries.
+        Правка, возвращённая к исходному значению, изменением не считается;
+        очищенный слот отдаётся записью с пустыми полями.
+        """
+        result = []
+        for row, week_type in sorted(self._dirty):
+            values = self._slot_values(row, week_type)
+            if self._saved.get((row, week_type), EMPTY_SLOT) != values:
+                result.append(self._entry(row, week_type, values))
+        return result
+
+    def mark_saved(self, entries):
+        """
+        Отмечает записи как сохранённые. Слоты, изменённые уже после
+        снимка entries, остаются изменёнными.
+        """
+        for day, pair_number, room, teacher, lesson_type, discipline, week_type in entries:
+            row = self._row_of[(day, pair_number)]
+            values = (room, lesson_type, teacher, discipline)
+            self._saved[(row, week_type)] = values
+            if self._slot_values(row, week_type) == values:
+                self._dirty.discard((row, week_type))
+
+    def set_problems(self, problems):
+        """problems — {(строка, столбец): текст}; прежняя подсветка снимается."""
+        changed = set(self._problems) | set(problems)
+        self._problems = dict(problems)
+        for row, col in changed:
+            index = self.index(row, col)
+            self.dataChanged.emit(index, index, [Qt.BackgroundRole, Qt.ToolTipRole])
+
+
+class RankedNamesModel(QStringListModel):
+    """
+    Список автодополнения для одной ячейки: свободные в слоте имена идут
+    первыми, занятые — следом и выводятся серым.
+    """
+
+    BUSY_BRUSH = QBrush(QColor(150, 150, 150))
+
+    def __init__(self, names, parent=None):
+        super().__init__(names, parent)
+        self.names = list(names)
+        self.free = None
+        self.busy = set()
+
+    def set_names(self, names):
+        """Новый набор имён (результат поиска) с прежним ранжированием по занятости."""
+        self.names = list(names)
+        self._apply()
+
+    def rank(self, free):
+        self.free = set(free)
+        self._apply()
+
+    def _apply(self):
+        if self.free is None:
+            self.setStringList(self.names)
+            return
+        self.busy = {name for name in self.names if name not in self.free}
+        self.setStringList([n for n in self.names if n in self.free] + [n for n in self.names if n in self.busy])
+
+    def data(self, index, role=Qt.DisplayRole):
+        if role in (Qt.ForegroundRole, Qt.ToolTipRole) and self.busy:
+            name = super().data(index, Qt.DisplayRole)
+            if name in self.busy:
+                return self.BUSY_BRUSH if role == Qt.ForegroundRole else "Занято в этом слоте"
+            return QVariant()
+        return super().data(index, role)
+
+
+class CompleterDelegate(QStyledItemDelegate):
+    """
+    Редактор ячеек аудиторий и преподавателей.
+    Комбобокс создаётся только на время редактирования. Без availability
+    и search он использует общую для всех ячеек модель списка, без
+    копирования справочника. availability(slot, on_ready) — источник
+    свободных имён для слота (день, пара, неделя): возвращает
+    {"room": [...], "teacher": [...]} или None, и тогда вызовет
+    on_ready(результат) позже; список автодополнения ранжируется по нему.
+
+    search(kind, text, on_ready) — поиск по справочнику вместо общей
+    модели: возвращает список имён или None и вызывает on_ready(имена)
+    позже. Поиск запускается через SEARCH_DELAY_MS после последнего
+    нажатия клавиши.
+    """
+
+    SEARCH_DELAY_MS = 250
+
+    def __init__(self, room_model, teacher_model, parent=None, availability=None, search=None):
+        super().__init__(parent)
+        self.room_model = room_model
+        self.teacher_model = teacher_model
+        self.availability = availability
+        self.search = search
+
+    @staticmethod
+    def kind_of(index):
+        model = index.model()
+        if model.is_room_column(index.column()):
+            return "room"
+        if model.is_teacher_column(index.column()):
+            return "teacher"
+        return None
+
+    def createEditor(self, parent, option, index):
+        kind = self.kind_of(index)
+        if kind is None:
+            return super().createEditor(parent, option, index)
+        combo = QComboBox(parent)
+        combo.setEditable(True)
+        combo.setInsertPolicy(QComboBox.NoInsert)
+
+        items = self.room_model if kind == "room" else self.teacher_model
+        slot = index.model().slot_of(index) if self.availability is not None else None
+        if self.search is not None or slot is not None:
+            items = RankedNamesModel(items.stringList() if self.search is None else [], combo)
+        if slot is not None:
+            free = self.availability(slot, lambda result: self._refresh(combo, lambda: items.rank(result[kind])))
+            if free is not None:
+                items.rank(free[kind])
+
+        combo.setModel(items)
+        completer = QCompleter(items, combo)
+        completer.setCaseSensitivity(Qt.CaseInsensitive)
+        completer.setFilterMode(Qt.MatchContains)
+        combo.setCompleter(completer)
+
+        if self.search is not None:
+            timer = QTimer(combo)
+            timer.setSingleShot(True)
+            timer.setInterval(self.SEARCH_DELAY_MS)
+            timer.timeout.connect(lambda: self._search(combo, items, kind, combo.lineEdit().text()))
+            combo.lineEdit().textEdited.connect(timer.start)
+            self._search(combo, items, kind, index.data(Qt.EditRole) or "")
+        return combo
+
+    def _search(self, combo, items, kind, text):
+        names = self.search(kind, text, lambda found: self._found(combo, items, text, found))
+        if names is not None:
+            self._found(combo, items, text, names)
+
+    def _found(self, combo, items, text, names):
+        # Ответ на уже изменённый текст не нужен: по новому тексту идёт свой поиск
+        if sip.isdeleted(combo) or combo.lineEdit().text() not in (text, ""):
+            return
+        self._refresh(combo, lambda: items.set_names(names))
+        if combo.lineEdit().hasFocus() and text:
+            combo.completer().complete()
+
+    @staticmethod
+    def _refresh(combo, update):
+        """Обновляет список уже открытого редактора, не теряя набранный текст."""
+        if sip.isdeleted(combo):
+            return
+        text = combo.lineEdit().text()
+        cursor = combo.lineEdit().cursorPosition()
+        update()
+        combo.setCurrentIndex(-1)
+        combo.lineEdit().setText(text)
+        combo.lineEdit().setCursorPosition(cursor)
+
+    def setEditorData(self, editor, index):
+        if isinstance(editor, QComboBox):
+            editor.setCurrentIndex(-1)
+            editor.setEditText(index.data(Qt.EditRole) or "")
+        else:
+            super().setEditorData(editor, index)
+
+    def setModelData(self, editor, model, index):
+        if isinstance(editor, QComboBox):
+            model.setData(index, editor.currentText(), Qt.EditRole)
+        else:
+            super().setModelData(editor, model, index)
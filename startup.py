@@ -0,0 +1,71 @@
+"""
+Отметки времени запуска приложения: сколько миллисекунд ушло на импорт
+модулей, создание QApplication, первую отрисовку главного окна и
+подготовку базы (миграции, слушатель уведомлений, список профилей).
+Если база недоступна, последним этапом отмечается DATABASE_FAILED.
+
+main.py импортирует этот модуль первым. Если задана переменная окружения
+SCHEDULE_STARTUP_REPORT, отчёт после готовности базы записывается в JSON
+по этому пути («-» — таблица в stderr). benchmarks/startup.py по нему
+замеряет время до первого окна.
+"""
+import os
+import sys
+import time
+
+REPORT_ENV = "SCHEDULE_STARTUP_REPORT"
+DATABASE_FAILED = "база недоступна"
+
+# Тяжёлые модули, которые не должны загружаться до первого окна
+HEAVY_MODULES = ("psycopg2", "numpy", "openpyxl", "pandas")
+
+STARTED = time.perf_counter()
+STARTED_WALL = time.time()
+
+_marks = []       # [(этап, perf_counter)]
+_modules = {}     # этап -> {модуль: загружен ли}
+
+
+def mark(name: str, check_modules: bool = False):
+    """Отмечает конец этапа; check_modules — запомнить, какие тяжёлые модули уже загружены."""
+    _marks.append((name, time.perf_counter()))
+    if check_modules:
+        _modules[name] = {module: module in sys.modules for module in HEAVY_MODULES}
+
+
+def report() -> dict:
+    """
+    {"started": время старта (time.time()), "stages": [{"name", "ms" — от старта,
+    "delta_ms" — от предыдущей отметки}], "modules": {этап: {модуль: загружен}}}.
+    """
+    stages, previous = [], STARTED
+    for name, at in _marks:
+        stages.append({
+            "name": name,
+            "ms": round((at - STARTED) * 1000, 3),
+            "delta_ms": round((at - previous) * 1000, 3),
+        })
+        previous = at
+    return {"started": STARTED_WALL, "stages": stages, "modules": dict(_modules)}
+
+
+def print_report(out=sys.stderr):
+    print(f"{'этап':<32}{'от старта, мс':>15}{'этап, мс':>11}", file=out)
+    for stage in report()["stages"]:
+        print(f"{stage['name']:<32}{stage['ms']:>15.1f}{stage['delta_ms']:>11.1f}", file=out)
+
+
+def finish():
+    """Сохраняет отчёт, если его запросили через SCHEDULE_STARTUP_REPORT."""
+    path = os.environ.get(REPORT_ENV)
+    if not path:
+        return
+    if path == "-":
+        print_report()
+        return
+    import json
+
+    # Файл появляется целиком: benchmarks/startup.py ждёт его появления
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(report(), f, ensure_ascii=False, indent=2)
+    os.replace(path + ".tmp", path)
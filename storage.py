@@ -0,0 +1,369 @@
+"""
+Движки хранения для db: PostgreSQL (psycopg2) и встроенный SQLite.
+
+Оба движка выдают соединения с интерфейсом psycopg2, которым пользуется
+код db: with conn (фиксация или откат транзакции), with conn.cursor(),
+параметры %s и %(name)s, fetchone/fetchall/fetchmany, rowcount.
+Различия диалектов SQL спрятаны в методах движка: массивы параметров,
+приведение типов, блокировка строк, пакетная вставка и COPY.
+"""
+import csv
+import datetime
+import functools
+import io
+import json
+import re
+import sqlite3
+
+DAYS = ["Понедельник", "Вторник", "Среда", "Четверг", "Пятница", "Суббота"]
+
+
+class PostgresBackend:
+    name = "postgresql"
+    supports_notify = True
+
+    # Логические типы столбцов для rows()
+    TYPES = {"day": "week_day_t", "int": "int", "text": "text"}
+
+    def __init__(self, params: dict):
+        import psycopg2
+        from psycopg2 import extensions, extras
+
+        self.params = dict(params)
+        self._psycopg2 = psycopg2
+        self._extensions = extensions
+        self._extras = extras
+        self.Error = psycopg2.Error
+        # Ошибки, после которых соединение нельзя возвращать в пул
+        self.connection_errors = (psycopg2.InterfaceError, psycopg2.OperationalError)
+
+    # Соединения
+
+    def connect(self):
+        return self._psycopg2.connect(**self.params)
+
+    def connect_listener(self):
+        conn = self.connect()
+        conn.autocommit = True
+        return conn
+
+    def transaction_state(self, conn) -> str:
+        """"idle", "active" (открыта транзакция) или "broken"."""
+        status = conn.info.transaction_status
+        if status == self._extensions.TRANSACTION_STATUS_IDLE:
+            return "idle"
+        if status == self._extensions.TRANSACTION_STATUS_UNKNOWN:
+            return "broken"
+        return "active"
+
+    # Диалект
+
+    for_update = " FOR UPDATE"
+
+    def begin_write(self, cur):
+        """Строки, которые транзакция будет менять, блокируются через FOR UPDATE."""
+
+    def lock_keys(self, cur, keys):
+        """
+        Advisory-блокировки до конца транзакции по ключам bigint. Ключи
+        берутся по возрастанию, поэтому две транзакции не ждут друг друга по кругу.
+        """
+        if keys:
+            cur.execute("SELECT pg_advisory_xact_lock(k) FROM unnest(%s::bigint[]) AS k;", (sorted(keys),))
+
+    def day(self, expr: str) -> str:
+        return f"{expr}::week_day_t"
+
+    def hhmm(self, expr: str) -> str:
+        return f"to_char({expr}, 'HH24:MI')"
+
+    def lower(self, expr: str) -> str:
+        """Строка в нижнем регистре (с кириллицей), как str.lower()."""
+        return f"lower({expr})"
+
+    def any(self, expr: str, param: str = "%s") -> str:
+        """Условие «expr входит в массив-параметр»; значение параметра — array()."""
+        return f"{expr} = ANY({param})"
+
+    def array(self, values) -> list:
+        return list(values)
+
+    def rows(self, columns: list, alias: str = "p", ordinality: bool = False) -> str:
+        """
+        Источник строк из параметров для FROM: columns — [(имя, тип)],
+        тип — "day", "int" или "text". Параметры — rows_params().
+        """
+        arrays = ", ".join(f"%s::{self.TYPES[kind]}[]" for _, kind in columns)
+        names = ", ".join(name for name, _ in columns) + (", ord" if ordinality else "")
+        return f"unnest({arrays}){' WITH ORDINALITY' if ordinality else ''} AS {alias}({names})"
+
+    def rows_params(self, columns: list, rows: list) -> list:
+        return [list(column) for column in zip(*rows)] if rows else [[] for _ in columns]
+
+    def execute_values(self, cur, sql: str, rows: list, page_size: int = 1000):
+        """INSERT ... VALUES %s для многих строк за несколько запросов."""
+        self._extras.execute_values(cur, sql, rows, page_size=page_size)
+
+    def copy_rows(self, cur, table: str, columns: tuple, rows: list):
+        buffer = io.StringIO()
+        csv.writer(buffer, quoting=csv.QUOTE_NONNUMERIC).writerows(rows)
+        buffer.seek(0)
+        cur.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buffer)
+
+    def temp_table(self, name: str, body: str) -> str:
+        """CREATE TEMP TABLE, удаляемая в конце транзакции; body — (столбцы) или AS SELECT."""
+        if body.lstrip().upper().startswith("AS"):
+            return f"CREATE TEMP TABLE {name} ON COMMIT DROP {body};"
+        return f"CREATE TEMP TABLE {name} {body} ON COMMIT DROP;"
+
+    def table_exists(self, cur, name: str) -> bool:
+        cur.execute("SELECT to_regclass(%s) IS NOT NULL;", (name,))
+        return cur.fetchone()[0]
+
+
+# SQLite
+
+def _week_day_order(a: str, b: str) -> int:
+    """Сортировка дней недели в календарном порядке, как у перечисления week_day_t в PostgreSQL."""
+    ka = (DAYS.index(a), "") if a in DAYS else (len(DAYS), a)
+    kb = (DAYS.index(b), "") if b in DAYS else (len(DAYS), b)
+    return (ka > kb) - (ka < kb)
+
+
+def _lower(value):
+    return value.lower() if isinstance(value, str) else value
+
+
+sqlite3.register_adapter(datetime.time, lambda t: t.isoformat())
+sqlite3.register_converter("TIME", lambda value: datetime.time.fromisoformat(value.decode()))
+
+_PARAM_RE = re.compile(r"%\((\w+)\)s|%s|%%")
+_WRITE_RE = re.compile(r"^\s*(INSERT|UPDATE|DELETE|REPLACE|CREATE|DROP|ALTER)\b", re.IGNORECASE)
+
+
+def _translate(sql: str) -> str:
+    """Параметры psycopg2 (%s, %(name)s, %%) -> параметры sqlite3 (?, :name, %)."""
+    def repl(m):
+        if m.group(1):
+            return ":" + m.group(1)
+        return "?" if m.group(0) == "%s" else "%"
+    return _PARAM_RE.sub(repl, sql)
+
+
+@functools.lru_cache(maxsize=512)
+def _prepare(sql: str, with_params: bool) -> tuple:
+    """
+    Делит текст на отдельные инструкции (с учётом BEGIN ... END в триггерах)
+    и переводит параметры, если они переданы: psycopg2 без параметров
+    знаки % не обрабатывает.
+    """
+    statements, current = [], ""
+    for line in sql.splitlines(keepends=True):
+        current += line
+        if sqlite3.complete_statement(current):
+            statements.append(current.strip())
+            current = ""
+    if current.strip():
+        statements.append(current.strip())
+    if with_params:
+        statements = [_translate(statement) for statement in statements]
+    return tuple(statements)
+
+
+class _SqliteCursor:
+    def __init__(self, conn):
+        self._conn = conn
+        self._cur = conn.raw.cursor()
+        self.itersize = 2000
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __iter__(self):
+        return iter(self._cur)
+
+    def close(self):
+        self._cur.close()
+
+    @property
+    def rowcount(self):
+        return self._cur.rowcount
+
+    @property
+    def description(self):
+        return self._cur.description
+
+    def execute(self, sql: str, params=None):
+        statements = _prepare(sql, params is not None)
+        if len(statements) > 1 and params and not isinstance(params, dict):
+            raise ValueError("Позиционные параметры допустимы только для одной инструкции")
+        for statement in statements:
+            self._conn.begin_for(statement)
+            self._cur.execute(statement, params or ())
+
+    def executemany(self, sql: str, seq):
+        sql, = _prepare(sql, True)
+        self._conn.begin_for(sql)
+        self._cur.executemany(sql, seq)
+
+    def fetchone(self):
+        return self._cur.fetchone()
+
+    def fetchall(self):
+        return self._cur.fetchall()
+
+    def fetchmany(self, size=None):
+        return self._cur.fetchmany(self.itersize if size is None else size)
+
+
+class _SqliteConnection:
+    """
+    Соединение sqlite3 с поведением соединения psycopg2: транзакция
+    начинается перед первым запросом и завершается commit/rollback или
+    выходом из with. Транзакции с записью начинаются как BEGIN IMMEDIATE,
+    чтобы два писателя не мешали друг другу на середине.
+    """
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.closed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.rollback()
+
+    def cursor(self, name=None):
+        # Курсор sqlite3 и так читает результат по мере обхода, имя не нужно
+        return _SqliteCursor(self)
+
+    def begin_for(self, sql: str, write: bool = False):
+        if self.raw.in_transaction:
+            return
+        if write or _WRITE_RE.match(sql):
+            self.raw.execute("BEGIN IMMEDIATE")
+        else:
+            self.raw.execute("BEGIN")
+
+    def commit(self):
+        if self.raw.in_transaction:
+            self.raw.execute("COMMIT")
+
+    def rollback(self):
+        if self.raw.in_transaction:
+            self.raw.execute("ROLLBACK")
+
+    def close(self):
+        if not self.closed:
+            self.raw.close()
+            self.closed = True
+
+
+class SqliteBackend:
+    name = "sqlite"
+    supports_notify = False
+
+    Error = sqlite3.Error
+    connection_errors = (sqlite3.InterfaceError,)
+
+    BUSY_TIMEOUT_MS = 30000
+
+    def __init__(self, path: str):
+        self.path = path
+
+    # Соединения
+
+    def connect(self):
+        raw = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False,
+                              detect_types=sqlite3.PARSE_DECLTYPES)
+        raw.create_collation("week_day", _week_day_order)
+        raw.create_function("py_lower", 1, _lower, deterministic=True)
+        raw.execute(f"PRAGMA busy_timeout = {self.BUSY_TIMEOUT_MS};")
+        raw.execute("PRAGMA journal_mode = WAL;")
+        raw.execute("PRAGMA synchronous = NORMAL;")
+        raw.execute("PRAGMA foreign_keys = ON;")
+        return _SqliteConnection(raw)
+
+    def transaction_state(self, conn) -> str:
+        return "active" if conn.raw.in_transaction else "idle"
+
+    # Диалект
+
+    for_update = ""
+
+    def begin_write(self, cur):
+        """Транзакция, которая сначала читает, а потом пишет, сразу берёт блокировку записи."""
+        cur._conn.begin_for("", write=True)
+
+    def lock_keys(self, cur, keys):
+        # Пишущие транзакции SQLite и так идут по одной (begin_write)
+        pass
+
+    def day(self, expr: str) -> str:
+        return expr
+
+    def hhmm(self, expr: str) -> str:
+        return f"strftime('%%H:%%M', {expr})"
+
+    def lower(self, expr: str) -> str:
+        # Встроенная lower() в SQLite меняет регистр только у латиницы
+        return f"py_lower({expr})"
+
+    def any(self, expr: str, param: str = "%s") -> str:
+        return f"{expr} IN (SELECT value FROM json_each({param}))"
+
+    def array(self, values) -> str:
+        return json.dumps(list(values), ensure_ascii=False)
+
+    def rows(self, columns: list, alias: str = "p", ordinality: bool = False) -> str:
+        fields = ", ".join(f"json_extract(value, '$[{i}]') AS {name}" for i, (name, _) in enumerate(columns))
+        if ordinality:
+            fields += ", key + 1 AS ord"
+        return f"(SELECT {fields} FROM json_each(%s)) AS {alias}"
+
+    def rows_params(self, columns: list, rows: list) -> list:
+        return [json.dumps([list(row) for row in rows], ensure_ascii=False, default=str)]
+
+    def execute_values(self, cur, sql: str, rows: list, page_size: int = 1000):
+        if not rows:
+            return
+        placeholders = "(" + ", ".join(["%s"] * len(rows[0])) + ")"
+        cur.executemany(sql.replace("VALUES %s", "VALUES " + placeholders), rows)
+
+    def copy_rows(self, cur, table: str, columns: tuple, rows: list):
+        placeholders = ", ".join(["%s"] * len(columns))
+        cur.executemany(f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders});", rows)
+
+    def temp_table(self, name: str, body: str) -> str:
+        # Временные таблицы живут до закрытия соединения, а соединения берутся из пула
+        return f"DROP TABLE IF EXISTS temp.{name};\nCREATE TEMP TABLE {name} {body};"
+
+    def table_exists(self, cur, name: str) -> bool:
+        cur.execute("SELECT count(*) FROM sqlite_master WHERE type = 'table' AND name = %s;", (name,))
+        return cur.fetchone()[0] > 0
+
+
+def create_backend(name: str, params: dict = None, path: str = None):
+    if name == "postgresql":
+        return PostgresBackend(params or {})
+    if name == "sqlite":
+        return SqliteBackend(path)
+    raise ValueError(f"Неизвестный движок хранения: {name}")
+
+
+def database_errors() -> tuple:
+    """Базовые классы ошибок всех доступных драйверов."""
+    errors = [sqlite3.Error]
+    try:
+        import psycopg2
+        errors.append(psycopg2.Error)
+    except ImportError:
+        pass
+    return tuple(errors)
@@ -0,0 +1,28 @@
+"""Общие заготовки: db на временной базе SQLite с одним профилем и справочниками."""
+import datetime
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db
+import migrations
+
+
+@pytest.fixture
+def profile(tmp_path):
+    """id профиля «Осень» с тремя занятиями; аудитории 101, 102 и преподаватели Иванов, Петров."""
+    db.configure("sqlite", path=str(tmp_path / "schedule.db"))
+    migrations.migrate()
+    profile_id = db.create_profile("Осень", 3)
+    db.set_profile_times(profile_id, [
+        (1, datetime.time(8, 0), datetime.time(9, 30)),
+        (2, datetime.time(9, 40), datetime.time(11, 10)),
+        (3, datetime.time(11, 20), datetime.time(12, 50)),
+    ])
+    db.add_rooms(["101", "102"])
+    db.add_teachers(["Иванов", "Петров"])
+    yield profile_id
+    db.configure()
@@ -0,0 +1,29 @@
+import pytest
+
+import db
+
+
+@pytest.fixture(params=["query", "index"])
+def busy(request, profile):
+    """db.is_room_busy / db.is_teacher_busy запросом к базе или по индексу в памяти."""
+    a = db.create_schedule(profile, "A", "Двухнедельное")
+    db.save_schedule_changes(a, [("Понедельник", 1, "101", "", "Лекция", "Математика", 0),
+                                 ("Понедельник", 2, "", "Иванов", "Лекция", "Математика", 1)])
+    if request.param == "index":
+        db.enable_occupancy_index()
+    yield db.create_schedule(profile, "B", "Двухнедельное")
+    db.disable_occupancy_index()
+
+
+def test_every_week_entry_makes_both_weeks_busy(busy):
+    assert [db.is_room_busy("101", "Понедельник", 1, week, busy) for week in (0, 1, 2)] == [True, True, True]
+    assert db.is_room_busy("102", "Понедельник", 1, 1, busy) is False
+
+
+def test_single_week_entry_blocks_that_week_and_every_week(busy):
+    assert [db.is_teacher_busy("Иванов", "Понедельник", 2, week, busy) for week in (0, 1, 2)] == [True, True, False]
+
+
+def test_own_schedule_is_not_busy(busy):
+    own = db.list_schedules(db.list_profiles()[0][0])[0][0]
+    assert db.is_room_busy("101", "Понедельник", 1, 2, own) is False
@@ -0,0 +1,49 @@
+import pytest
+
+import db
+
+
+@pytest.fixture(params=["query", "index"])
+def cloned(request, profile):
+    """Расписание A профиля «Осень» и его копия в профиле «Весна»."""
+    a = db.create_schedule(profile, "A", "Двухнедельное")
+    db.save_schedule_changes(a, [("Понедельник", 1, "101", "Иванов", "Лекция", "Математика", 0)])
+    spring = db.clone_profile(profile, "Весна")["profile_id"]
+    if request.param == "index":
+        db.enable_occupancy_index()
+    yield db.list_schedules(spring)[0][0]
+    db.disable_occupancy_index()
+
+
+def test_clone_does_not_conflict_with_source_profile(cloned):
+    entries = [(day, pair, room, teacher, kind, "Физика", week)
+               for day, pair, room, teacher, kind, _, week in db.load_schedule_entries(cloned)]
+
+    result = db.save_schedule_entries(cloned, entries, check_conflicts=True)
+
+    assert result["conflicts"] == []
+    assert db.load_schedule_entries(cloned)[0][5] == "Физика"
+    assert db.is_room_busy("101", "Понедельник", 1, 0, cloned) is False
+    free = db.find_free("Понедельник", 1, 0, cloned)
+    assert (free["room"], free["teacher"]) == (["101", "102"], ["Иванов", "Петров"])
+
+
+def test_schedules_of_clone_still_conflict_with_each_other(cloned):
+    other = db.create_schedule(db.list_profiles()[-1][0], "B", "Двухнедельное")
+
+    result = db.save_schedule_changes(other, [("Понедельник", 1, "101", "", "Лекция", "Физика", 1)],
+                                      check_conflicts=True)
+
+    assert result["conflicts"] == [("room", "101", "Понедельник", 1, 1, "A")]
+    assert db.find_free("Понедельник", 1, 2, other)["room"] == ["102"]
+
+
+def test_clone_under_taken_name_is_rejected(profile):
+    a = db.create_schedule(profile, "A", "Двухнедельное")
+    db.create_schedule(profile, "B", "Двухнедельное")
+
+    with pytest.raises(ValueError, match="«B» уже существует"):
+        db.clone_schedule(a, "B")
+
+    assert [r[1] for r in db.list_schedules(profile)] == ["A", "B"]
+    assert db.clone_schedule(a, "C")["copied"] == 0
@@ -0,0 +1,50 @@
+import db
+
+
+def book(profile, name, week_type, room="101", teacher=""):
+    schedule_id = db.create_schedule(profile, name, "Двухнедельное")
+    db.save_schedule_changes(schedule_id, [("Понедельник", 1, room, teacher, "Лекция", "Математика", week_type)])
+    return schedule_id
+
+
+def clashes(profile):
+    return [(row[0], row[1], row[4], row[6], row[7], row[9]) for row in db.find_double_bookings(profile)]
+
+
+def test_odd_and_even_weeks_do_not_clash(profile):
+    book(profile, "A", 1)
+    book(profile, "B", 2)
+
+    assert db.find_double_bookings(profile) == []
+
+
+def test_every_week_entry_clashes_with_single_week(profile):
+    book(profile, "A", 0)
+    book(profile, "B", 2)
+
+    assert clashes(profile) == [("room", "101", 0, "A", 2, "B")]
+
+
+def test_same_week_clashes_once_per_pair(profile):
+    book(profile, "A", 1, teacher="Иванов")
+    book(profile, "B", 1, teacher="Иванов")
+
+    assert clashes(profile) == [("room", "101", 1, "A", 1, "B"), ("teacher", "Иванов", 1, "A", 1, "B")]
+
+
+def test_three_entries_across_both_weeks_clash_on_the_repeated_week(profile):
+    book(profile, "A", 1)
+    book(profile, "B", 2)
+    book(profile, "C", 1)
+
+    assert clashes(profile) == [("room", "101", 1, "A", 1, "C")]
+
+
+def test_other_profiles_are_ignored(profile):
+    book(profile, "A", 0)
+    other = db.create_profile("Весна", 3)
+    db.set_profile_times(other, db.get_profile_times(profile))
+    book(other, "B", 0)
+
+    assert db.find_double_bookings(profile) == []
+    assert len(db.find_double_bookings()) == 1
@@ -0,0 +1,23 @@
+import csv
+
+import db
+from export import SINGLE_COLUMNS
+from importer import import_schedule
+
+
+def test_import_skips_rows_busy_in_other_schedules(profile, tmp_path):
+    other = db.create_schedule(profile, "A", "Обычное")
+    db.save_schedule_changes(other, [("Понедельник", 1, "101", "Иванов", "Лекция", "Математика", 0)])
+    target = db.create_schedule(profile, "B", "Обычное")
+    path = tmp_path / "b.csv"
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(SINGLE_COLUMNS)
+        writer.writerow(["Понедельник", "1", "", "101", "Практика", "Петров", "Физика"])
+        writer.writerow(["", "2", "", "101", "Практика", "Петров", "Физика"])
+
+    result = import_schedule(target, str(path))
+
+    assert result["imported"] == 1
+    assert result["errors"] == [(2, "аудитория «101» занята в расписании «A»")]
+    assert db.load_schedule_entries(target) == [("Понедельник", 2, "101", "Петров", "Практика", "Физика", 0)]
@@ -0,0 +1,46 @@
+import collections
+import types
+
+import db
+import ui
+
+
+def test_prefix_matches_come_before_other_matches(profile):
+    db.add_teachers(["Иванов-Петров", "Анна Петрова", "Петровский", "Сидоров"])
+
+    assert db.search_names("teacher", "петров") == ["Петров", "Петровский", "Анна Петрова", "Иванов-Петров"]
+
+
+def test_like_wildcards_in_the_query_are_literal(profile):
+    db.add_rooms(["100%", "1005", "1_1", "121", "a!b", "ab"])
+
+    assert db.search_names("room", "100%") == ["100%"]
+    assert db.search_names("room", "1_") == ["1_1"]
+    assert db.search_names("room", "a!") == ["a!b"]
+    assert db.search_names("room", "%") == ["100%"]
+
+
+def test_other_matches_only_fill_up_to_the_limit(profile):
+    db.add_rooms(["Ар1", "Ар2", "Бар1", "Бар2"])
+
+    assert db.search_names("room", "ар", limit=3) == ["Ар1", "Ар2", "Бар1"]
+    assert db.search_names("room", "ар", limit=2) == ["Ар1", "Ар2"]
+
+
+def cached_search(cache, query):
+    editor = types.SimpleNamespace(search_cache=collections.OrderedDict(cache))
+    return ui.ScheduleEditDialog.cached_search(editor, "room", query)
+
+
+def test_complete_shorter_prefix_answers_longer_query():
+    cache = {("room", "1"): ["1", "101", "210"]}
+
+    assert cached_search(cache, "10") == ["101", "210"]
+    assert cached_search(cache, "1") == ["1", "101", "210"]
+
+
+def test_truncated_shorter_prefix_is_not_reused():
+    cache = {("room", "1"): [f"1{i:02}" for i in range(db.SEARCH_LIMIT)]}
+
+    assert cached_search(cache, "10") is None
+    assert cached_search(cache, "1") == cache[("room", "1")]
@@ -0,0 +1,84 @@
+import csv
+
+import pytest
+
+import db
+from export import SINGLE_COLUMNS
+from importer import import_schedule
+
+
+def entry(room="", teacher="", week_type=0, day="Понедельник", pair_number=1):
+    return (day, pair_number, room, teacher, "Лекция", "Математика", week_type)
+
+
+def cleared(week_type=0, day="Понедельник", pair_number=1):
+    return (day, pair_number, "", "", "", "", week_type)
+
+
+def test_every_week_entry_conflicts_with_single_week(profile):
+    a = db.create_schedule(profile, "A", "Двухнедельное")
+    b = db.create_schedule(profile, "B", "Двухнедельное")
+    db.save_schedule_changes(a, [entry("101", "Иванов", week_type=0)])
+
+    result = db.save_schedule_changes(b, [entry("101", "Петров", week_type=1)], check_conflicts=True)
+
+    assert result["conflicts"] == [("room", "101", "Понедельник", 1, 1, "A")]
+    assert db.load_schedule_entries(b) == []
+
+
+def test_cleared_slot_is_deleted(profile):
+    schedule_id = db.create_schedule(profile, "A", "Обычное")
+    db.save_schedule_changes(schedule_id, [entry("101", "Иванов"), entry("102", "Петров", pair_number=2)])
+
+    result = db.save_schedule_changes(schedule_id, [cleared()])
+
+    assert (result["inserted"], result["updated"], result["deleted"]) == (0, 0, 1)
+    assert db.load_schedule_entries(schedule_id) == [
+        ("Понедельник", 2, "102", "Петров", "Лекция", "Математика", 0)
+    ]
+    assert db.save_schedule_changes(schedule_id, [cleared()])["deleted"] == 0
+
+
+def version(profile, schedule_id):
+    return db.load_editor_data(profile, schedule_id)[2]
+
+
+def test_stale_version_is_rejected(profile):
+    schedule_id = db.create_schedule(profile, "A", "Обычное")
+    first = db.save_schedule_changes(schedule_id, [entry("101", "Иванов")], expected_version=0)
+
+    with pytest.raises(db.ScheduleVersionConflict):
+        db.save_schedule_changes(schedule_id, [entry("102", "Петров")], expected_version=0)
+
+    assert first["version"] == version(profile, schedule_id) == 1
+    assert db.load_schedule_entries(schedule_id) == [
+        ("Понедельник", 1, "101", "Иванов", "Лекция", "Математика", 0)
+    ]
+
+
+def test_rejected_save_keeps_version(profile):
+    a = db.create_schedule(profile, "A", "Обычное")
+    b = db.create_schedule(profile, "B", "Обычное")
+    db.save_schedule_changes(a, [entry("101", "Иванов")])
+
+    result = db.save_schedule_changes(b, [entry("101", "Петров")], expected_version=0, check_conflicts=True)
+
+    assert result["conflicts"] and result["version"] == 0
+    assert version(profile, b) == 0
+    assert db.save_schedule_changes(b, [entry("102", "Петров")], expected_version=0)["version"] == 1
+
+
+def test_import_bumps_version(profile, tmp_path):
+    schedule_id = db.create_schedule(profile, "A", "Обычное")
+    db.save_schedule_changes(schedule_id, [entry("101", "Иванов")])
+    path = tmp_path / "a.csv"
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(SINGLE_COLUMNS)
+        writer.writerow(["Вторник", "1", "", "102", "Лекция", "Петров", "Физика"])
+
+    result = import_schedule(schedule_id, str(path))
+
+    assert result["version"] == version(profile, schedule_id) == 2
+    with pytest.raises(db.ScheduleVersionConflict):
+        db.save_schedule_changes(schedule_id, [entry("102", "Петров")], expected_version=1)
@@ -0,0 +1,63 @@
+"""
+Сводное расписание преподавателя или аудитории по всем расписаниям:
+строки db.get_timetable раскладываются в сетку «день, занятие, время»
+с блоком на каждую неделю. Модуль без зависимостей от Qt и openpyxl,
+им пользуются и окно просмотра, и выгрузка.
+"""
+
+KINDS = {
+    "teacher": {"table": "teachers", "column": "teacher_id", "title": "Преподаватель", "other": "room"},
+    "room": {"table": "rooms", "column": "room_id", "title": "Аудитория", "other": "teacher"},
+}
+
+WEEK_SUFFIXES = {1: " (Нечет)", 2: " (Чет)"}
+
+
+def kind_info(kind: str) -> dict:
+    try:
+        return KINDS[kind]
+    except KeyError:
+        raise ValueError(f"Неизвестный вид сводного расписания: {kind}")
+
+
+def is_two_week(rows) -> bool:
+    return any(row[2] != 0 for row in rows)
+
+
+def timetable_columns(kind: str, two_week: bool) -> list:
+    block = ["Расписание", KINDS[kind_info(kind)["other"]]["title"], "Вид занятия", "Дисциплина"]
+    columns = ["День недели", "№ занятия", "Время"]
+    if not two_week:
+        return columns + block
+    for week_type in (1, 2):
+        columns += [title + WEEK_SUFFIXES[week_type] for title in block]
+    return columns
+
+
+def timetable_grid(rows, two_week: bool):
+    """
+    Строки db.get_timetable (по дню, занятию, неделе) -> строки сетки.
+    Занятие «каждую неделю» попадает в оба блока недели; несколько
+    занятий в одном слоте (поток или пересечение) перечисляются через «; ».
+    """
+    weeks = (1, 2) if two_week else (0,)
+    current, cells = None, None
+
+    def flush():
+        row = [current[0], current[1], current[2]]
+        for week_type in weeks:
+            row += ["; ".join(values) for values in cells[week_type]]
+        return row
+
+    for day, pair, week_type, interval, schedule, other, lesson_type, discipline in rows:
+        if current is None or current[:2] != (day, pair):
+            if current is not None:
+                yield flush()
+            current = (day, pair, interval)
+            cells = {w: ([], [], [], []) for w in weeks}
+        targets = weeks if week_type == 0 else (week_type,)
+        for w in targets:
+            for values, value in zip(cells[w], (schedule, other, lesson_type, discipline)):
+                values.append(value)
+    if current is not None:
+        yield flush()
@@ -1,10 +1,116 @@
+import collections
+
 from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QDialog, QWidget, QLabel, QPushButton, QLineEdit,
     QVBoxLayout, QHBoxLayout, QComboBox, QMessageBox, QSpinBox, QTimeEdit,
-    QTabWidget, QTableWidget, QTableWidgetItem, QFileDialog, QCompleter, QLineEdit
+    QTabWidget, QTableView, QAbstractItemView, QFileDialog, QProgressDialog,
+    QTableWidget, QTableWidgetItem, QCompleter, QInputDialog
 )
-from PyQt5.QtCore import Qt, QTime
+from PyQt5.QtCore import Qt, QTime, QTimer
 import db
+import startup
+import workers
+from schedule_model import ScheduleTableModel, CompleterDelegate
+from timetable import KINDS, is_two_week, timetable_columns, timetable_grid
+
+
+def prepare_database():
+    """
+    Всё, что раньше делалось до показа окна: миграции схемы, слушатель
+    уведомлений и список профилей (он попадает в кэш для окна выбора профиля).
+    """
+    import migrations
+    migrations.migrate()
+    db.start_change_listener()
+    return db.list_profiles()
+
+
+def entry_names(entries):
+    """(аудитории, преподаватели), введённые в записях."""
+    return {e[2] for e in entries if e[2]}, {e[3] for e in entries if e[3]}
+
+
+def validate_entries(schedule_id, entries):
+    """Неизвестные имена (как db.unknown_names) и конфликты занятости изменённых слотов."""
+    return db.unknown_names(*entry_names(entries)), db.find_schedule_conflicts(schedule_id, entries)
+
+
+def check_and_save_schedule(schedule_id, entries, expected_version, progress=None, cancel=None):
+    """
+    Проверяет имена и занятость изменённых слотов и, если проблем нет, записывает
+    их — в одной транзакции, если версия расписания всё ещё expected_version.
+    Возвращает {"unknown": (аудитории, преподаватели), "conflicts": [...],
+    "summary": {...} или None}.
+    """
+    unknown = db.unknown_names(*entry_names(entries))
+    if any(unknown):
+        return {"unknown": unknown, "conflicts": [], "summary": None}
+    summary = db.save_schedule_changes(schedule_id, entries, expected_version, check_conflicts=True,
+                                       progress=progress, cancel=cancel)
+    if summary["conflicts"]:
+        return {"unknown": unknown, "conflicts": summary["conflicts"], "summary": None}
+    return {"unknown": unknown, "conflicts": [], "summary": summary}
+
+
+def create_profile_with_times(name, max_pairs, intervals):
+    """Создаёт профиль и время его занятий; None — профиль с таким названием уже есть."""
+    if name in {p[1] for p in db.list_profiles()}:
+        return None
+    profile_id = db.create_profile(name, max_pairs)
+    db.set_profile_times(profile_id, intervals)
+    return profile_id
+
+
+def create_named_schedule(profile_id, name, schedule_type):
+    """Создаёт расписание; None — в профиле уже есть расписание с таким названием."""
+    if name in {r[1] for r in db.list_schedules(profile_id)}:
+        return None
+    return db.create_schedule(profile_id, name, schedule_type)
+
+
+def import_schedule_file(schedule_id, path, progress=None, cancel=None):
+    """Загружает сетку из файла и возвращает (итог загрузки, записи расписания)."""
+    from importer import import_schedule
+    result = import_schedule(schedule_id, path, progress=progress, cancel=cancel)
+    return result, db.load_schedule_entries(schedule_id)
+
+
+def make_progress(parent, text):
+    progress = QProgressDialog(text, "Отмена", 0, 0, parent)
+    progress.setWindowModality(Qt.WindowModal)
+    progress.setAutoReset(False)
+    progress.setAutoClose(False)
+    progress.setMinimumDuration(300)
+    return progress
+
+
+def update_progress(progress, done, total):
+    progress.setMaximum(total)
+    progress.setValue(done)
+
+
+def show_errors(parent, title, messages, limit=20):
+    box = QMessageBox(QMessageBox.Critical, title, "", QMessageBox.Ok, parent)
+    text = "\n".join(messages[:limit])
+    if len(messages) > limit:
+        text += f"\n… и ещё {len(messages) - limit}"
+        box.setDetailedText("\n".join(messages))
+    box.setText(text)
+    box.exec_()
+
+
+WEEK_LABELS = {1: " (нечетная неделя)", 2: " (четная неделя)"}
+
+
+def double_booking_message(kind, name, day, pair_number, week_type, schedule, other_week_type, other_schedule):
+    who = f"Аудитория «{name}»" if kind == "room" else f"Преподаватель «{name}»"
+    return (f"{who}: {day}, занятие {pair_number} — «{schedule}»{WEEK_LABELS.get(week_type, '')} "
+            f"и «{other_schedule}»{WEEK_LABELS.get(other_week_type, '')}.")
+
+
+def conflict_message(kind, name, day, pair_number, week_type, other_schedule):
+    who = f"Аудитория «{name}» занята" if kind == "room" else f"Преподаватель «{name}» занят"
+    return f"{who} в {day}, занятие {pair_number}{WEEK_LABELS.get(week_type, '')} — расписание «{other_schedule}»."
 
 
 # Главное окно
@@ -13,17 +119,53 @@ class MainWindow(QMainWindow):
         super().__init__()
         self.setWindowTitle("Составление учебного расписания")
         self.setFixedSize(400, 200)
+        self.painted = False
 
-        label = QLabel("Добро пожаловать! Выберите или создайте профиль.")
-        button = QPushButton("Выбрать / создать профиль")
-        button.clicked.connect(self.open_profile_dialog)
+        self.label = QLabel("Подключение к базе данных…")
+        self.button = QPushButton("Выбрать / создать профиль")
+        self.button.clicked.connect(self.open_profile_dialog)
+        self.button.setEnabled(False)
+        self.retry_btn = QPushButton("Повторить подключение")
+        self.retry_btn.clicked.connect(self.connect_database)
+        self.retry_btn.hide()
 
         central = QWidget()
         layout = QVBoxLayout(central)
-        layout.addWidget(label)
-        layout.addWidget(button)
+        layout.addWidget(self.label)
+        layout.addWidget(self.button)
+        layout.addWidget(self.retry_btn)
         self.setCentralWidget(central)
 
+    def paintEvent(self, event):
+        super().paintEvent(event)
+        if not self.painted:
+            # Окно уже на экране — теперь можно подключаться к базе
+            self.painted = True
+            startup.mark("первая отрисовка окна", check_modules=True)
+            QTimer.singleShot(0, self.connect_database)
+
+    def connect_database(self):
+        self.label.setText("Подключение к базе данных…")
+        self.retry_btn.hide()
+        workers.executor().submit(
+            prepare_database, owner=self,
+            on_result=self.on_database_ready, on_error=self.on_database_failed
+        )
+
+    def on_database_ready(self, profiles):
+        self.label.setText("Добро пожаловать! Выберите или создайте профиль.")
+        self.button.setEnabled(True)
+        startup.mark("база готова")
+        startup.finish()
+
+    def on_database_failed(self, error):
+        self.label.setText(f"Не удалось подключиться к базе данных:\n{error}")
+        self.label.setWordWrap(True)
+        self.retry_btn.show()
+        # Отчёт пишется и без базы: время до первого окна от неё не зависит
+        startup.mark(startup.DATABASE_FAILED)
+        startup.finish()
+
     def open_profile_dialog(self):
         dlg = ProfileSelectionDialog(self)
         if dlg.exec_() == QDialog.Accepted:
@@ -36,7 +178,7 @@ class ProfileSelectionDialog(QDialog):
     def __init__(self, parent=None):
         super().__init__(parent)
         self.setWindowTitle("Выбор профиля")
-        self.setFixedSize(400, 200)
+        self.setFixedSize(400, 230)
 
         self.selected_profile = None
         layout = QVBoxLayout()
@@ -44,24 +186,45 @@ class ProfileSelectionDialog(QDialog):
         layout.addWidget(QLabel("Существующие профили:"))
 
         self.profile_combo = QComboBox()
-        self.profile_combo.addItem("-- Выберите профиль --")
-        self.profiles = db.list_profiles()
-        for pid, name, _ in self.profiles:
-            self.profile_combo.addItem(name, userData=pid)
+        self.profiles = []
         layout.addWidget(self.profile_combo)
 
         buttons = QHBoxLayout()
         select_btn = QPushButton("Выбрать профиль")
         create_btn = QPushButton("Создать профиль")
-        delete_btn = QPushButton("Удалить профиль")
+        self.delete_btn = QPushButton("Удалить профиль")
         buttons.addWidget(select_btn)
         buttons.addWidget(create_btn)
-        buttons.addWidget(delete_btn)
+        buttons.addWidget(self.delete_btn)
         layout.addLayout(buttons)
 
+        self.copy_btn = QPushButton("Копировать профиль со всеми расписаниями")
+        layout.addWidget(self.copy_btn)
+
         select_btn.clicked.connect(self.select_profile)
         create_btn.clicked.connect(self.create_profile)
-        delete_btn.clicked.connect(self.delete_profile)
+        self.delete_btn.clicked.connect(self.delete_profile)
+        self.copy_btn.clicked.connect(self.copy_profile)
+
+        self.refresh_profiles()
+
+    def refresh_profiles(self):
+        self.profile_combo.clear()
+        self.profile_combo.addItem("Загрузка…")
+        self.profile_combo.setEnabled(False)
+        workers.executor().submit(
+            db.list_profiles, owner=self,
+            on_result=self.fill_profiles,
+            on_error=lambda e: QMessageBox.critical(self, "Ошибка", f"Не удалось загрузить профили: {e}")
+        )
+
+    def fill_profiles(self, profiles):
+        self.profiles = profiles
+        self.profile_combo.clear()
+        self.profile_combo.addItem("-- Выберите профиль --")
+        for pid, name, _ in self.profiles:
+            self.profile_combo.addItem(name, userData=pid)
+        self.profile_combo.setEnabled(True)
 
     def select_profile(self):
         index = self.profile_combo.currentIndex()
@@ -76,11 +239,7 @@ class ProfileSelectionDialog(QDialog):
     def create_profile(self):
         dlg = ProfileCreationDialog(self)
         if dlg.exec_() == QDialog.Accepted:
-            self.profile_combo.clear()
-            self.profile_combo.addItem("-- Выберите профиль --")
-            self.profiles = db.list_profiles()
-            for pid, name, _ in self.profiles:
-                self.profile_combo.addItem(name, userData=pid)
+            self.refresh_profiles()
 
     def delete_profile(self):
         index = self.profile_combo.currentIndex()
@@ -92,13 +251,54 @@ class ProfileSelectionDialog(QDialog):
         confirm = QMessageBox.question(self, "Подтверждение", "Удалить выбранный профиль со всеми его расписаниями?",
                                        QMessageBox.Yes | QMessageBox.No)
         if confirm == QMessageBox.Yes:
-            db.delete_profile(pid)
-            QMessageBox.information(self, "Удалено", "Профиль удалён.")
-            self.profile_combo.clear()
-            self.profile_combo.addItem("-- Выберите профиль --")
-            self.profiles = db.list_profiles()
-            for pid, name, _ in self.profiles:
-                self.profile_combo.addItem(name, userData=pid)
+            self.delete_btn.setEnabled(False)
+            workers.executor().submit(
+                db.delete_profile, pid, owner=self, merge=False,
+                on_result=self.on_profile_deleted,
+                on_error=lambda e: self.on_profile_deleted(e)
+            )
+
+    def on_profile_deleted(self, result):
+        self.delete_btn.setEnabled(True)
+        if isinstance(result, Exception):
+            QMessageBox.critical(self, "Ошибка", f"Не удалось удалить профиль: {result}")
+            return
+        QMessageBox.information(self, "Удалено", "Профиль удалён.")
+        self.refresh_profiles()
+
+    def copy_profile(self):
+        index = self.profile_combo.currentIndex()
+        if index <= 0:
+            QMessageBox.warning(self, "Ошибка", "Сначала выберите профиль.")
+            return
+
+        pid = self.profile_combo.currentData()
+        name, ok = QInputDialog.getText(self, "Копирование профиля", "Название нового профиля:",
+                                        text=f"{self.profile_combo.currentText()} (копия)")
+        name = name.strip()
+        if not ok or not name:
+            return
+        if name in {p[1] for p in self.profiles}:
+            QMessageBox.critical(self, "Ошибка", f"Профиль с названием «{name}» уже существует.")
+            return
+
+        self.copy_btn.setEnabled(False)
+        workers.executor().submit(
+            db.clone_profile, pid, name, owner=self, merge=False,
+            on_result=self.on_profile_copied,
+            on_error=lambda e: self.on_profile_copied(e)
+        )
+
+    def on_profile_copied(self, result):
+        self.copy_btn.setEnabled(True)
+        if isinstance(result, Exception):
+            QMessageBox.critical(self, "Ошибка", f"Не удалось скопировать профиль: {result}")
+            return
+        QMessageBox.information(
+            self, "Готово",
+            f"Скопировано расписаний: {result['schedules']}, записей: {result['copied']}."
+        )
+        self.refresh_profiles()
 
     def get_selected_profile(self):
         return self.selected_profile
@@ -172,11 +372,6 @@ class ProfileCreationDialog(QDialog):
             QMessageBox.warning(self, "Ошибка", "Введите название профиля.")
             return
 
-        existing_profiles = [p[1] for p in db.list_profiles()]
-        if profile_name in existing_profiles:
-            QMessageBox.critical(self, "Ошибка", f"Профиль с названием «{profile_name}» уже существует.")
-            return
-
         intervals = []
         prev_end = None
 
@@ -217,9 +412,21 @@ class ProfileCreationDialog(QDialog):
             intervals.append((i + 1, start.toString("HH:mm"), end.toString("HH:mm")))
             prev_end = end
 
-        profile_id = db.create_profile(profile_name, pair_count)
-        db.set_profile_times(profile_id, intervals)
+        self.save_btn.setEnabled(False)
+        workers.executor().submit(
+            create_profile_with_times, profile_name, pair_count, intervals, owner=self, merge=False,
+            on_result=lambda result: self.on_profile_created(profile_name, result),
+            on_error=lambda e: self.on_profile_created(profile_name, e)
+        )
 
+    def on_profile_created(self, profile_name, result):
+        self.save_btn.setEnabled(True)
+        if isinstance(result, Exception):
+            QMessageBox.critical(self, "Ошибка", f"Не удалось создать профиль: {result}")
+            return
+        if result is None:
+            QMessageBox.critical(self, "Ошибка", f"Профиль с названием «{profile_name}» уже существует.")
+            return
         QMessageBox.information(self, "Готово", "Профиль успешно создан.")
         self.accept()
 
@@ -228,13 +435,13 @@ class ScheduleSelectionDialog(QDialog):
     def __init__(self, profile_id, profile_name, parent=None):
         super().__init__(parent)
         self.setWindowTitle(f"Расписания для профиля: {profile_name}")
-        self.setFixedSize(450, 200)
+        self.setFixedSize(450, 290)
         self.profile_id = profile_id
         self.profile_name = profile_name
 
         layout = QVBoxLayout(self)
         self.schedule_combo = QComboBox()
-        self.schedule_combo.addItem("-- Выберите расписание --")
+        self.schedules = []
         self.refresh_schedules()
         layout.addWidget(QLabel("Список расписаний:"))
         layout.addWidget(self.schedule_combo)
@@ -248,16 +455,44 @@ class ScheduleSelectionDialog(QDialog):
         hlayout.addWidget(self.delete_btn)
         layout.addLayout(hlayout)
 
+        blayout = QHBoxLayout()
+        self.export_all_btn = QPushButton("Выгрузить все расписания")
+        self.check_btn = QPushButton("Проверить пересечения")
+        blayout.addWidget(self.export_all_btn)
+        blayout.addWidget(self.check_btn)
+        layout.addLayout(blayout)
+
+        self.copy_btn = QPushButton("Копировать расписание")
+        layout.addWidget(self.copy_btn)
+
+        self.timetable_btn = QPushButton("Расписание преподавателя или аудитории")
+        layout.addWidget(self.timetable_btn)
+
         self.select_btn.clicked.connect(self.select_schedule)
         self.create_btn.clicked.connect(self.create_schedule)
         self.delete_btn.clicked.connect(self.delete_schedule)
+        self.copy_btn.clicked.connect(self.copy_schedule)
+        self.export_all_btn.clicked.connect(self.export_all)
+        self.check_btn.clicked.connect(self.check_double_bookings)
+        self.timetable_btn.clicked.connect(self.open_timetable)
 
     def refresh_schedules(self):
+        self.schedule_combo.clear()
+        self.schedule_combo.addItem("Загрузка…")
+        self.schedule_combo.setEnabled(False)
+        workers.executor().submit(
+            db.list_schedules, self.profile_id, owner=self,
+            on_result=self.fill_schedules,
+            on_error=lambda e: QMessageBox.critical(self, "Ошибка", f"Не удалось загрузить расписания: {e}")
+        )
+
+    def fill_schedules(self, schedules):
+        self.schedules = schedules
         self.schedule_combo.clear()
         self.schedule_combo.addItem("-- Выберите расписание --")
-        self.schedules = db.list_schedules(self.profile_id)
         for sid, name, stype in self.schedules:
             self.schedule_combo.addItem(f"{name} ({stype})", userData=(sid, stype))
+        self.schedule_combo.setEnabled(True)
 
     def select_schedule(self):
         index = self.schedule_combo.currentIndex()
@@ -283,9 +518,238 @@ class ScheduleSelectionDialog(QDialog):
         sid, _ = self.schedule_combo.currentData()
         confirm = QMessageBox.question(self, "Подтверждение", "Удалить это расписание?", QMessageBox.Yes | QMessageBox.No)
         if confirm == QMessageBox.Yes:
-            db.delete_schedule(sid)
-            QMessageBox.information(self, "Удалено", "Расписание удалено.")
-            self.refresh_schedules()
+            self.delete_btn.setEnabled(False)
+            workers.executor().submit(
+                db.delete_schedule, sid, owner=self, merge=False,
+                on_result=self.on_schedule_deleted,
+                on_error=lambda e: self.on_schedule_deleted(e)
+            )
+
+    def on_schedule_deleted(self, result):
+        self.delete_btn.setEnabled(True)
+        if isinstance(result, Exception):
+            QMessageBox.critical(self, "Ошибка", f"Не удалось удалить расписание: {result}")
+            return
+        QMessageBox.information(self, "Удалено", "Расписание удалено.")
+        self.refresh_schedules()
+
+    def copy_schedule(self):
+        index = self.schedule_combo.currentIndex()
+        if index <= 0:
+            QMessageBox.warning(self, "Ошибка", "Выберите расписание.")
+            return
+
+        sid, _ = self.schedule_combo.currentData()
+        name, ok = QInputDialog.getText(self, "Копирование расписания", "Название копии:",
+                                        text=f"{self.schedules[index - 1][1]} (копия)")
+        name = name.strip()
+        if not ok or not name:
+            return
+        if name in {r[1] for r in self.schedules}:
+            QMessageBox.critical(self, "Ошибка", f"Расписание с названием «{name}» уже существует.")
+            return
+
+        self.copy_btn.setEnabled(False)
+        workers.executor().submit(
+            db.clone_schedule, sid, name, owner=self, merge=False,
+            on_result=self.on_schedule_copied, on_error=self.on_schedule_copied
+        )
+
+    def on_schedule_copied(self, result):
+        self.copy_btn.setEnabled(True)
+        if isinstance(result, ValueError):
+            # Название заняли после загрузки списка или расписание уже удалено
+            QMessageBox.critical(self, "Ошибка", str(result))
+            return
+        if isinstance(result, Exception):
+            QMessageBox.critical(self, "Ошибка", f"Не удалось скопировать расписание: {result}")
+            return
+        QMessageBox.information(self, "Готово", f"Расписание скопировано, записей: {result['copied']}.")
+        self.refresh_schedules()
+
+    def export_all(self):
+        box = QMessageBox(QMessageBox.Question, "Выгрузка всех расписаний",
+                          "Как выгрузить расписания профиля?", QMessageBox.Cancel, self)
+        workbook_btn = box.addButton("Одна книга, лист на расписание", QMessageBox.AcceptRole)
+        directory_btn = box.addButton("Папка, файл на расписание", QMessageBox.AcceptRole)
+        box.exec_()
+
+        if box.clickedButton() is workbook_btn:
+            mode = "workbook"
+            target, _ = QFileDialog.getSaveFileName(
+                self, "Сохранить в Excel", f"расписания_{self.profile_name}.xlsx", "Excel (*.xlsx)"
+            )
+        elif box.clickedButton() is directory_btn:
+            mode = "directory"
+            target = QFileDialog.getExistingDirectory(self, "Папка для расписаний")
+        else:
+            return
+        if not target:
+            return
+
+        self.export_all_btn.setEnabled(False)
+        progress = make_progress(self, "Выгрузка расписаний…")
+        task = workers.executor().submit(
+            db.export_profile_to_excel, self.profile_id, target, mode, owner=self, with_progress=True,
+            on_result=lambda result: self.on_exported_all(progress, result),
+            on_error=lambda e: self.on_exported_all(progress, e),
+            on_progress=lambda done, total: update_progress(progress, done, total)
+        )
+        progress.canceled.connect(task.cancel)
+
+    def on_exported_all(self, progress, result):
+        progress.close()
+        progress.deleteLater()
+        self.export_all_btn.setEnabled(True)
+        if isinstance(result, db.OperationCancelled):
+            QMessageBox.information(self, "Отменено", "Выгрузка отменена.")
+        elif isinstance(result, Exception):
+            QMessageBox.critical(self, "Ошибка", f"Ошибка выгрузки: {result}")
+        else:
+            QMessageBox.information(self, "Готово", f"Выгружено расписаний: {len(result)}.")
+
+    def open_timetable(self):
+        TimetableDialog(self.profile_id, self.profile_name, self).exec_()
+
+    def check_double_bookings(self):
+        self.check_btn.setEnabled(False)
+        workers.executor().submit(
+            db.find_double_bookings, self.profile_id, owner=self,
+            on_result=self.on_double_bookings,
+            on_error=self.on_double_bookings
+        )
+
+    def on_double_bookings(self, result):
+        self.check_btn.setEnabled(True)
+        if isinstance(result, Exception):
+            QMessageBox.critical(self, "Ошибка", f"Ошибка проверки: {result}")
+        elif not result:
+            QMessageBox.information(self, "Проверка", "Пересечений аудиторий и преподавателей нет.")
+        else:
+            messages = [double_booking_message(kind, name, day, pair, week, schedule, other_week, other)
+                        for kind, name, day, pair, week, _, schedule, other_week, _, other in result]
+            show_errors(self, f"Пересечения в профиле «{self.profile_name}»: {len(result)}", messages)
+
+# Сводное расписание преподавателя или аудитории
+class TimetableDialog(QDialog):
+    # Имена функций db: ищутся при вызове, чтобы учитывалась обёртка db.enable_instrumentation
+    ENTITY_LOADERS = {"teacher": "list_teacher_ids", "room": "list_room_ids"}
+
+    def __init__(self, profile_id, profile_name, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle(f"Сводное расписание: {profile_name}")
+        self.resize(1100, 600)
+        self.profile_id = profile_id
+        self.rows = []
+
+        layout = QVBoxLayout(self)
+        top = QHBoxLayout()
+        self.kind_combo = QComboBox()
+        for kind, info in KINDS.items():
+            self.kind_combo.addItem(info["title"], userData=kind)
+        self.name_combo = QComboBox()
+        self.name_combo.setEditable(True)
+        self.name_combo.setInsertPolicy(QComboBox.NoInsert)
+        self.name_combo.completer().setFilterMode(Qt.MatchContains)
+        self.name_combo.completer().setCompletionMode(QCompleter.PopupCompletion)
+        self.name_combo.setMinimumWidth(350)
+        self.export_btn = QPushButton("Выгрузить")
+        self.export_btn.setEnabled(False)
+        top.addWidget(self.kind_combo)
+        top.addWidget(self.name_combo, 1)
+        top.addWidget(self.export_btn)
+        layout.addLayout(top)
+
+        self.table = QTableWidget()
+        self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.table.verticalHeader().setVisible(False)
+        layout.addWidget(self.table)
+
+        self.kind_combo.currentIndexChanged.connect(self.load_entities)
+        self.name_combo.activated.connect(self.load_timetable)
+        self.export_btn.clicked.connect(self.export_timetable)
+        self.load_entities()
+
+    def current(self):
+        """(kind, id сущности) или None, если ничего не выбрано."""
+        entity_id = self.name_combo.currentData()
+        if entity_id is None:
+            return None
+        return self.kind_combo.currentData(), entity_id
+
+    def load_entities(self):
+        kind = self.kind_combo.currentData()
+        self.name_combo.clear()
+        self.table.clear()
+        self.table.setRowCount(0)
+        self.export_btn.setEnabled(False)
+        workers.executor().submit(
+            getattr(db, self.ENTITY_LOADERS[kind]), owner=self,
+            on_result=lambda entities: self.fill_entities(kind, entities),
+            on_error=lambda e: QMessageBox.critical(self, "Ошибка", f"Не удалось загрузить список: {e}")
+        )
+
+    def fill_entities(self, kind, entities):
+        if kind != self.kind_combo.currentData():
+            return
+        self.name_combo.blockSignals(True)
+        for entity_id, name in entities:
+            self.name_combo.addItem(name, userData=entity_id)
+        self.name_combo.setCurrentIndex(-1)
+        self.name_combo.blockSignals(False)
+
+    def load_timetable(self):
+        selected = self.current()
+        if selected is None:
+            return
+        workers.executor().submit(
+            db.get_timetable, selected[0], selected[1], self.profile_id, owner=self,
+            on_result=lambda rows: self.fill_timetable(selected, rows),
+            on_error=lambda e: QMessageBox.critical(self, "Ошибка", f"Не удалось загрузить расписание: {e}")
+        )
+
+    def fill_timetable(self, selected, rows):
+        # Ответ на уже сменённый выбор не показывается
+        if selected != self.current():
+            return
+        self.rows = rows
+        two_week = is_two_week(rows)
+        columns = timetable_columns(selected[0], two_week)
+        grid = list(timetable_grid(rows, two_week))
+        self.table.setUpdatesEnabled(False)
+        self.table.clear()
+        self.table.setColumnCount(len(columns))
+        self.table.setHorizontalHeaderLabels(columns)
+        self.table.setRowCount(len(grid))
+        for r, row in enumerate(grid):
+            for c, value in enumerate(row):
+                self.table.setItem(r, c, QTableWidgetItem(str(value)))
+        self.table.resizeColumnsToContents()
+        self.table.setUpdatesEnabled(True)
+        self.export_btn.setEnabled(True)
+
+    def export_timetable(self):
+        selected = self.current()
+        if selected is None:
+            return
+        path, _ = QFileDialog.getSaveFileName(
+            self, "Сохранить в Excel", f"{self.name_combo.currentText()}.xlsx", "Excel (*.xlsx)"
+        )
+        if not path:
+            return
+        self.export_btn.setEnabled(False)
+        workers.executor().submit(
+            db.export_timetable_to_excel, selected[0], selected[1], path, self.profile_id, owner=self, merge=False,
+            on_result=self.on_exported, on_error=self.on_exported
+        )
+
+    def on_exported(self, result):
+        self.export_btn.setEnabled(True)
+        if isinstance(result, Exception):
+            QMessageBox.critical(self, "Ошибка", f"Ошибка экспорта: {result}")
+        else:
+            QMessageBox.information(self, "Готово", "Расписание экспортировано.")
+
 
 # Окно создания расписания
 class ScheduleCreationDialog(QDialog):
@@ -318,12 +782,21 @@ class ScheduleCreationDialog(QDialog):
             QMessageBox.warning(self, "Ошибка", "Введите название расписания.")
             return
 
-        existing_names = [r[1] for r in db.list_schedules(self.profile_id)]
-        if name in existing_names:
+        self.create_button.setEnabled(False)
+        workers.executor().submit(
+            create_named_schedule, self.profile_id, name, schedule_type, owner=self, merge=False,
+            on_result=lambda result: self.on_schedule_created(name, schedule_type, result),
+            on_error=lambda e: self.on_schedule_created(name, schedule_type, e)
+        )
+
+    def on_schedule_created(self, name, schedule_type, schedule_id):
+        self.create_button.setEnabled(True)
+        if isinstance(schedule_id, Exception):
+            QMessageBox.critical(self, "Ошибка", f"Не удалось создать расписание: {schedule_id}")
+            return
+        if schedule_id is None:
             QMessageBox.critical(self, "Ошибка", f"Расписание с названием «{name}» уже существует.")
             return
-
-        schedule_id = db.create_schedule(self.profile_id, name, schedule_type)
         QMessageBox.information(self, "Успех", "Расписание создано.")
         self.accept()
 
@@ -331,6 +804,10 @@ class ScheduleCreationDialog(QDialog):
         dlg.exec_()
 
 
+VALIDATE_DELAY_MS = 400
+SEARCH_CACHE_SIZE = 200
+
+
 class ScheduleEditDialog(QDialog):
     def __init__(self, profile_id, schedule_id, schedule_type, parent=None):
         super().__init__(parent)
@@ -341,194 +818,262 @@ class ScheduleEditDialog(QDialog):
         self.resize(1100, 650)
         self.setMinimumSize(800, 500)
 
-        self.days = ["Понедельник", "Вторник", "Среда", "Четверг", "Пятница", "Суббота"]
-        self.time_intervals = db.get_profile_times(profile_id)
-        self.room_list = db.list_rooms()
-        self.teacher_list = db.list_teachers()
-
-        layout = QVBoxLayout(self)
+        self.days = list(db.DAYS)
+        self.model = None
+        # Версия расписания, с которой начато редактирование (см. db.save_schedule_changes)
+        self.version = None
+        # (день, пара, неделя) -> {"room": [...], "teacher": [...]} свободных имён
+        self.free_slots = {}
+        # (вид, текст в нижнем регистре) -> имена из db.search_names, недавние — в конце
+        self.search_cache = collections.OrderedDict()
+
+        # Изменённые ячейки проверяются, когда пользователь перестал печатать
+        self.validate_timer = QTimer(self)
+        self.validate_timer.setSingleShot(True)
+        self.validate_timer.setInterval(VALIDATE_DELAY_MS)
+        self.validate_timer.timeout.connect(self.validate_changes)
+        self.validation = 0
 
-        if schedule_type == "Обычное":
-            self.table = self.create_table(single=True)
-            layout.addWidget(self.table)
-        else:
-            self.table = self.create_table(single=False)
-            layout.addWidget(self.table)
+        self.layout = QVBoxLayout(self)
+        self.loading_label = QLabel("Загрузка расписания…")
+        self.loading_label.setAlignment(Qt.AlignCenter)
+        self.layout.addWidget(self.loading_label)
 
-        self.fill_existing_schedule()
         btn_layout = QHBoxLayout()
         self.save_btn = QPushButton("Сохранить расписание")
         self.export_btn = QPushButton("Выгрузить расписание")
+        self.import_btn = QPushButton("Загрузить из файла")
         self.save_btn.clicked.connect(self.save_schedule)
         self.export_btn.clicked.connect(self.export_schedule)
+        self.import_btn.clicked.connect(self.import_schedule)
+        self.save_btn.setEnabled(False)
+        self.import_btn.setEnabled(False)
         btn_layout.addWidget(self.save_btn)
         btn_layout.addWidget(self.export_btn)
+        btn_layout.addWidget(self.import_btn)
+        self.layout.addLayout(btn_layout)
+
+        workers.executor().submit(
+            db.load_editor_data, profile_id, schedule_id, owner=self,
+            on_result=self.on_data_loaded,
+            on_error=lambda e: self.loading_label.setText(f"Не удалось загрузить расписание: {e}")
+        )
 
-        layout.addLayout(btn_layout)
+    def on_data_loaded(self, data):
+        self.time_intervals, entries, self.version = data
 
-    def create_table(self, single=True):
-        if single:
-            headers = ["День", "№ занятия", "Время", "Аудитория", "Вид занятия", "Преподаватель", "Дисциплина"]
-            col_count = 7
-        else:
-            headers = [
-                "День", "№ занятия", "Время",
-                "Аудитория (Нечет)", "Вид занятия (Нечет)", "Преподаватель (Нечет)", "Дисциплина (Нечет)",
-                "Аудитория (Чет)", "Вид занятия (Чет)", "Преподаватель (Чет)", "Дисциплина (Чет)"
-            ]
-            col_count = 11
-
-        rows = len(self.days) * len(self.time_intervals)
-        table = QTableWidget(rows, col_count)
-        table.setHorizontalHeaderLabels(headers)
-
-        for d_index, day in enumerate(self.days):
-            for p_index, (pair_number, start_time, end_time) in enumerate(self.time_intervals):
-                row = d_index * len(self.time_intervals) + p_index
-
-                if p_index == 0:
-                    table.setSpan(row, 0, len(self.time_intervals), 1)
-                    item = QTableWidgetItem(day)
-                    item.setFlags(Qt.ItemIsEnabled)
-                    table.setItem(row, 0, item)
-                else:
-                    table.setItem(row, 0, QTableWidgetItem(""))
-
-                table.setItem(row, 1, QTableWidgetItem(str(pair_number)))
-                table.setItem(row, 2, QTableWidgetItem(f"{start_time} - {end_time}"))
-
-                if single:
-                    self.add_autocomplete(table, row, 3, self.room_list)
-                    table.setItem(row, 4, QTableWidgetItem(""))
-                    self.add_autocomplete(table, row, 5, self.teacher_list)
-                    table.setItem(row, 6, QTableWidgetItem(""))
-                else:
-                    self.add_autocomplete(table, row, 3, self.room_list)  # Н
-                    table.setItem(row, 4, QTableWidgetItem(""))
-                    self.add_autocomplete(table, row, 5, self.teacher_list)
-                    table.setItem(row, 6, QTableWidgetItem(""))
-
-                    self.add_autocomplete(table, row, 7, self.room_list)  # Ч
-                    table.setItem(row, 8, QTableWidgetItem(""))
-                    self.add_autocomplete(table, row, 9, self.teacher_list)
-                    table.setItem(row, 10, QTableWidgetItem(""))
+        # Сетка заполняется до того, как таблица попадёт в окно
+        self.table = self.create_table(single=self.schedule_type == "Обычное")
+        self.fill_existing_schedule(entries)
+        self.layout.replaceWidget(self.loading_label, self.table)
+        self.loading_label.deleteLater()
 
+        self.save_btn.setEnabled(True)
+        self.import_btn.setEnabled(True)
+
+    def create_table(self, single=True):
+        self.model = ScheduleTableModel(self.days, self.time_intervals, single, self)
+        table = QTableView()
+        table.setModel(self.model)
+        table.setItemDelegate(CompleterDelegate(None, None, table, availability=self.slot_availability,
+                                                search=self.search_names))
+        table.setEditTriggers(
+            QAbstractItemView.DoubleClicked | QAbstractItemView.SelectedClicked
+            | QAbstractItemView.EditKeyPressed | QAbstractItemView.AnyKeyPressed
+        )
+        for row, count in self.model.day_spans():
+            if count > 1:
+                table.setSpan(row, 0, count, 1)
+        # Свободные имена для выбранной ячейки запрашиваются заранее, до начала ввода
+        table.selectionModel().currentChanged.connect(self.prefetch_availability)
+        self.model.edited.connect(self.validate_timer.start)
         return table
 
-    def add_autocomplete(self, table, row, col, items):
-        combo = QComboBox()
-        combo.setEditable(True)
-        combo.addItems(items)
-        completer = QCompleter(items)
-        completer.setCaseSensitivity(Qt.CaseInsensitive)
-        completer.setFilterMode(Qt.MatchContains)
-        combo.setCompleter(completer)
-        table.setCellWidget(row, col, combo)
-
-    def get_cell_text(self, table, row, col):
-        widget = table.cellWidget(row, col)
-        if isinstance(widget, QComboBox):
-            return widget.currentText().strip()
-        elif isinstance(widget, QLineEdit):
-            return widget.text().strip()
-        item = table.item(row, col)
-        return item.text().strip() if item else ""
+    def slot_availability(self, slot, on_ready):
+        """
+        Свободные аудитории и преподаватели слота из кэша окна или None,
+        и тогда on_ready получит их после запроса db.find_free в пуле.
+        """
+        free = self.free_slots.get(slot)
+        if free is not None:
+            return free
+
+        def loaded(result):
+            self.free_slots[slot] = result
+            on_ready(result)
+
+        workers.executor().submit(
+            db.find_free, *slot, self.schedule_id, owner=self,
+            on_result=loaded, on_error=lambda e: None
+        )
+        return None
+
+    def search_names(self, kind, text, on_ready):
+        """
+        Имена справочника для автодополнения из кэша окна или None, и тогда
+        on_ready получит их после запроса db.search_names в пуле. Полный
+        (короче db.SEARCH_LIMIT) ответ на начало текста отвечает и на сам
+        текст: совпадения с ним — подмножество совпадений с началом.
+        """
+        query = text.strip().lower()
+        names = self.cached_search(kind, query)
+        if names is not None:
+            return names
+
+        def loaded(result):
+            self.search_cache[(kind, query)] = result
+            while len(self.search_cache) > SEARCH_CACHE_SIZE:
+                self.search_cache.popitem(last=False)
+            on_ready(result)
+
+        workers.executor().submit(
+            db.search_names, kind, query, owner=self,
+            on_result=loaded, on_error=lambda e: None
+        )
+        return None
+
+    def cached_search(self, kind, query):
+        names = self.search_cache.get((kind, query))
+        if names is not None:
+            self.search_cache.move_to_end((kind, query))
+            return names
+        for end in range(len(query) - 1, -1, -1):
+            shorter = self.search_cache.get((kind, query[:end]))
+            if shorter is not None and len(shorter) < db.SEARCH_LIMIT:
+                matches = [name for name in shorter if query in name.lower()]
+                return sorted(matches, key=lambda name: db.search_rank(name, query))
+        return None
+
+    def prefetch_availability(self, current, previous):
+        col = current.column()
+        if self.model.is_room_column(col) or self.model.is_teacher_column(col):
+            self.slot_availability(self.model.slot_of(current), lambda result: None)
+
+    def show_errors(self, title, messages, limit=20):
+        show_errors(self, title, messages, limit)
+
+    def name_problems(self, entries, unknown):
+        """
+        {(строка, столбец): текст} для имён, которых нет в справочниках;
+        unknown — (аудитории, преподаватели) из db.unknown_names.
+        """
+        unknown_rooms, unknown_teachers = unknown
+        problems = {}
+        for day, pair_number, room, teacher, lesson_type, discipline, week_type in entries:
+            week_label = WEEK_LABELS.get(week_type, "")
+            if room in unknown_rooms:
+                problems[self.model.cell_of(day, pair_number, week_type, "room")] = \
+                    f"Аудитория{week_label} «{room}» не найдена в базе."
+            if teacher in unknown_teachers:
+                problems[self.model.cell_of(day, pair_number, week_type, "teacher")] = \
+                    f"Преподаватель{week_label} «{teacher}» не найден в базе."
+        return problems
+
+    def validate_changes(self):
+        """
+        Подсвечивает проблемы изменённых ячеек: введённые имена и занятость
+        проверяются в пуле (validate_entries). Ответ устаревшей проверки
+        отбрасывается.
+        """
+        self.validation += 1
+        generation = self.validation
+        changes = self.model.changed_entries()
+        if not changes:
+            self.model.set_problems({})
+            return
+        workers.executor().submit(
+            validate_entries, self.schedule_id, changes, owner=self,
+            on_result=lambda result: self.on_validated(
+                generation, self.name_problems(changes, result[0]), result[1]
+            ),
+            on_error=lambda e: None
+        )
+
+    def on_validated(self, generation, problems, conflicts):
+        if generation != self.validation:
+            return
+        problems = dict(problems)
+        for kind, name, day, pair_number, week_type, other in conflicts:
+            cell = self.model.cell_of(day, pair_number, week_type, kind)
+            message = conflict_message(kind, name, day, pair_number, week_type, other)
+            problems[cell] = f"{problems[cell]}\n{message}" if cell in problems else message
+        self.model.set_problems(problems)
 
     def save_schedule(self):
-        data = []
-        seen = set()
-
-        last_day = None
-
-        for row in range(self.table.rowCount()):
-            day_item = self.table.item(row, 0)
-            if day_item and day_item.text().strip():
-                last_day = day_item.text().strip()
-            day = last_day
-            pair_number = int(self.table.item(row, 1).text())
-
-            if self.schedule_type == "Обычное":
-                room = self.get_cell_text(self.table, row, 3)
-                lesson_type = self.get_cell_text(self.table, row, 4)
-                teacher = self.get_cell_text(self.table, row, 5)
-                discipline = self.get_cell_text(self.table, row, 6)
-                key = (day, pair_number, 0)
-                if key in seen:
-                    continue
-                seen.add(key)
-
-                if room and room not in self.room_list:
-                    QMessageBox.critical(self, "Ошибка", f"Аудитория «{room}» не найдена в базе.")
-                    return
-                if teacher and teacher not in self.teacher_list:
-                    QMessageBox.critical(self, "Ошибка", f"Преподаватель «{teacher}» не найден в базе.")
-                    return
-                if room and db.is_room_busy(room, day, pair_number, 0, self.schedule_id):
-                    QMessageBox.critical(self, "Ошибка", f"Аудитория «{room}» занята в {day}, занятие {pair_number}.")
-                    return
-                if teacher and db.is_teacher_busy(teacher, day, pair_number, 0, self.schedule_id):
-                    QMessageBox.critical(self, "Ошибка",
-                                         f"Преподаватель «{teacher}» занят в {day}, занятие {pair_number}.")
-                    return
-
-                data.append((day, pair_number, room, teacher, lesson_type, discipline, 0))
-
-            else:
-                # Нечетная неделя
-                room1 = self.get_cell_text(self.table, row, 3)
-                ltype1 = self.get_cell_text(self.table, row, 4)
-                teach1 = self.get_cell_text(self.table, row, 5)
-                disc1 = self.get_cell_text(self.table, row, 6)
-
-                key1 = (day, pair_number, 1)
-                if key1 not in seen:
-                    seen.add(key1)
-
-                    if room1 and room1 not in self.room_list:
-                        QMessageBox.critical(self, "Ошибка", f"Аудитория (нечетная) «{room1}» не найдена в базе.")
-                        return
-                    if teach1 and teach1 not in self.teacher_list:
-                        QMessageBox.critical(self, "Ошибка", f"Преподаватель (нечетная) «{teach1}» не найден в базе.")
-                        return
-                    if room1 and db.is_room_busy(room1, day, pair_number, 1, self.schedule_id):
-                        QMessageBox.critical(self, "Ошибка",
-                                             f"Аудитория «{room1}» занята в {day}, занятие {pair_number} (нечетная неделя).")
-                        return
-                    if teach1 and db.is_teacher_busy(teach1, day, pair_number, 1, self.schedule_id):
-                        QMessageBox.critical(self, "Ошибка",
-                                             f"Преподаватель «{teach1}» занят в {day}, занятие {pair_number} (нечетная неделя).")
-                        return
-
-                    data.append((day, pair_number, room1, teach1, ltype1, disc1, 1))
-
-                # Четная неделя
-                room2 = self.get_cell_text(self.table, row, 7)
-                ltype2 = self.get_cell_text(self.table, row, 8)
-                teach2 = self.get_cell_text(self.table, row, 9)
-                disc2 = self.get_cell_text(self.table, row, 10)
-
-                key2 = (day, pair_number, 2)
-                if key2 not in seen:
-                    seen.add(key2)
-
-                    if room2 and room2 not in self.room_list:
-                        QMessageBox.critical(self, "Ошибка", f"Аудитория (четная) «{room2}» не найдена в базе.")
-                        return
-                    if teach2 and teach2 not in self.teacher_list:
-                        QMessageBox.critical(self, "Ошибка", f"Преподаватель (четная) «{teach2}» не найден в базе.")
-                        return
-                    if room2 and db.is_room_busy(room2, day, pair_number, 2, self.schedule_id):
-                        QMessageBox.critical(self, "Ошибка", f"Аудитория «{room2}» занята в {day}, занятие {pair_number} (четная неделя).")
-                        return
-                    if teach2 and db.is_teacher_busy(teach2, day, pair_number, 2, self.schedule_id):
-                        QMessageBox.critical(self, "Ошибка", f"Преподаватель «{teach2}» занят в {day}, занятие {pair_number} (четная неделя).")
-                        return
-                    data.append((day, pair_number, room2, teach2, ltype2, disc2, 2))
-        try:
-            db.save_schedule_entries(self.schedule_id, data)
-            QMessageBox.information(self, "Успех", "Расписание сохранено.")
-        except Exception as e:
-            QMessageBox.critical(self, "Ошибка", f"Ошибка при сохранении: {e}")
+        # Записываются и проверяются только слоты, изменённые после загрузки или сохранения
+        data = self.model.changed_entries()
+        if not data:
+            QMessageBox.information(self, "Сохранение", "Изменений нет.")
+            return
+
+        self.validate_timer.stop()
+        self.save_btn.setEnabled(False)
+        progress = make_progress(self, "Сохранение расписания…")
+        task = workers.executor().submit(
+            check_and_save_schedule, self.schedule_id, data, self.version, owner=self, with_progress=True,
+            on_result=lambda result: self.on_saved(progress, data, result),
+            on_error=lambda e: self.on_save_failed(progress, e),
+            on_progress=lambda done, total: update_progress(progress, done, total)
+        )
+        progress.canceled.connect(task.cancel)
+
+    def on_saved(self, progress, data, result):
+        progress.close()
+        progress.deleteLater()
+        self.save_btn.setEnabled(True)
+        if any(result["unknown"]):
+            problems = self.name_problems(data, result["unknown"])
+            self.on_validated(self.validation, problems, [])
+            self.show_errors("Ошибка", list(problems.values()))
+            return
+        if result["conflicts"]:
+            self.on_validated(self.validation, {}, result["conflicts"])
+            self.show_errors("Конфликты расписания", [conflict_message(*c) for c in result["conflicts"]])
+            return
+        summary = result["summary"]
+        self.version = summary["version"]
+        self.model.mark_saved(data)
+        self.validate_changes()
+        self.free_slots.clear()
+        QMessageBox.information(
+            self, "Успех",
+            "Расписание сохранено.\n"
+            f"Добавлено: {summary['inserted']}, изменено: {summary['updated']}, удалено: {summary['deleted']}."
+        )
+
+    def on_save_failed(self, progress, error):
+        progress.close()
+        progress.deleteLater()
+        self.save_btn.setEnabled(True)
+        if isinstance(error, db.OperationCancelled):
+            QMessageBox.information(self, "Отменено", "Сохранение отменено, изменения не записаны.")
+        elif isinstance(error, db.ScheduleVersionConflict):
+            reload = QMessageBox.question(
+                self, "Расписание изменено",
+                f"{error}\n\nЗагрузить актуальную версию? Несохранённые изменения пропадут.",
+                QMessageBox.Yes | QMessageBox.No
+            )
+            if reload == QMessageBox.Yes:
+                self.reload_schedule()
+        else:
+            QMessageBox.critical(self, "Ошибка", f"Ошибка при сохранении: {error}")
+
+    def reload_schedule(self):
+        self.save_btn.setEnabled(False)
+        workers.executor().submit(
+            db.load_editor_data, self.profile_id, self.schedule_id, owner=self,
+            on_result=self.on_reloaded,
+            on_error=lambda e: self.on_reloaded(e)
+        )
+
+    def on_reloaded(self, result):
+        self.save_btn.setEnabled(True)
+        if isinstance(result, Exception):
+            QMessageBox.critical(self, "Ошибка", f"Не удалось загрузить расписание: {result}")
+            return
+        _, entries, self.version = result
+        self.free_slots.clear()
+        self.fill_existing_schedule(entries)
 
     def export_schedule(self):
         path, _ = QFileDialog.getSaveFileName(
@@ -537,39 +1082,85 @@ class ScheduleEditDialog(QDialog):
             f"расписание_{self.schedule_id}.xlsx",
             "Excel (*.xlsx)"
         )
-        if path:
-            try:
-                success = db.export_schedule_to_excel(self.schedule_id, path)
-                if success:
-                    QMessageBox.information(self, "Готово", "Расписание экспортировано.")
-                else:
-                    QMessageBox.critical(self, "Ошибка", "Не удалось экспортировать.")
-            except Exception as e:
-                QMessageBox.critical(self, "Ошибка", f"Ошибка экспорта: {e}")
-
-    def fill_existing_schedule(self):
-        entries = db.load_schedule_entries(self.schedule_id)
-        table = self.table
-
-        for row_data in entries:
-            day, pair_number, room, teacher, lesson_type, discipline, week_type = row_data
-
-            day_index = self.days.index(day)
-            row = day_index * len(self.time_intervals) + (pair_number - 1)
-
-            if self.schedule_type == "Обычное":
-                table.cellWidget(row, 3).setCurrentText(room or "")
-                table.setItem(row, 4, QTableWidgetItem(lesson_type or ""))
-                table.cellWidget(row, 5).setCurrentText(teacher or "")
-                table.setItem(row, 6, QTableWidgetItem(discipline or ""))
-            else:
-                if week_type == 1:  # Нечетная
-                    table.cellWidget(row, 3).setCurrentText(room or "")
-                    table.setItem(row, 4, QTableWidgetItem(lesson_type or ""))
-                    table.cellWidget(row, 5).setCurrentText(teacher or "")
-                    table.setItem(row, 6, QTableWidgetItem(discipline or ""))
-                elif week_type == 2:  # Четная
-                    table.cellWidget(row, 7).setCurrentText(room or "")
-                    table.setItem(row, 8, QTableWidgetItem(lesson_type or ""))
-                    table.cellWidget(row, 9).setCurrentText(teacher or "")
-                    table.setItem(row, 10, QTableWidgetItem(discipline or ""))
\ No newline at end of file
+        if not path:
+            return
+        self.export_btn.setEnabled(False)
+        progress = make_progress(self, "Выгрузка расписания…")
+        task = workers.executor().submit(
+            db.export_schedule_to_excel, self.schedule_id, path, owner=self, with_progress=True,
+            on_result=lambda success: self.on_exported(progress, success),
+            on_error=lambda e: self.on_exported(progress, e),
+            on_progress=lambda done, total: update_progress(progress, done, total)
+        )
+        progress.canceled.connect(task.cancel)
+
+    def on_exported(self, progress, result):
+        progress.close()
+        progress.deleteLater()
+        self.export_btn.setEnabled(True)
+        if result is True:
+            QMessageBox.information(self, "Готово", "Расписание экспортировано.")
+        elif isinstance(result, db.OperationCancelled):
+            QMessageBox.information(self, "Отменено", "Выгрузка отменена.")
+        elif isinstance(result, Exception):
+            QMessageBox.critical(self, "Ошибка", f"Ошибка экспорта: {result}")
+        else:
+            QMessageBox.critical(self, "Ошибка", "Не удалось экспортировать.")
+
+    def import_schedule(self):
+        path, _ = QFileDialog.getOpenFileName(
+            self, "Загрузить расписание", "", "Таблицы (*.xlsx *.csv);;Все файлы (*)"
+        )
+        if not path:
+            return
+        confirm = QMessageBox.question(
+            self, "Подтверждение",
+            "Расписание будет заменено данными файла, несохранённые изменения пропадут. Продолжить?",
+            QMessageBox.Yes | QMessageBox.No
+        )
+        if confirm != QMessageBox.Yes:
+            return
+
+        self.import_btn.setEnabled(False)
+        progress = make_progress(self, "Загрузка расписания…")
+        task = workers.executor().submit(
+            import_schedule_file, self.schedule_id, path, owner=self, with_progress=True,
+            on_result=lambda result: self.on_imported(progress, result),
+            on_error=lambda e: self.on_imported(progress, e),
+            on_progress=lambda done, total: update_progress(progress, done, total)
+        )
+        progress.canceled.connect(task.cancel)
+
+    def on_imported(self, progress, result):
+        progress.close()
+        progress.deleteLater()
+        self.import_btn.setEnabled(True)
+        if isinstance(result, db.OperationCancelled):
+            QMessageBox.information(self, "Отменено", "Загрузка отменена.")
+            return
+        if isinstance(result, Exception):
+            QMessageBox.critical(self, "Ошибка", f"Ошибка загрузки: {result}")
+            return
+
+        summary, entries = result
+        self.version = summary["version"]
+        self.free_slots.clear()
+        self.fill_existing_schedule(entries)
+        if summary["errors"]:
+            self.show_errors("Ошибки в файле", [
+                f"Загружено строк: {summary['imported']}, пропущено: {len(summary['errors'])}."
+            ] + [f"Строка {line}: {message}" for line, message in summary["errors"]])
+        else:
+            QMessageBox.information(self, "Готово", f"Загружено строк: {summary['imported']}.")
+
+    def fill_existing_schedule(self, entries):
+        # Загруженная сетка считается проверенной, незавершённая проверка отбрасывается
+        self.validate_timer.stop()
+        self.validation += 1
+        # Одна перерисовка после заполнения вместо перерисовки по сигналам модели
+        self.table.setUpdatesEnabled(False)
+        try:
+            self.model.load_entries(entries)
+        finally:
+            self.table.setUpdatesEnabled(True)
+
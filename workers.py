@@ -0,0 +1,164 @@
+import threading
+import traceback
+
+from PyQt5 import sip
+from PyQt5.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal, pyqtSlot
+
+import db
+
+
+class _TaskSignals(QObject):
+    finished = pyqtSignal(int, object)
+    failed = pyqtSignal(int, object)
+    progress = pyqtSignal(int, int, int)
+
+
+class DbTask(QRunnable):
+    """
+    Вызов функции db в потоке пула. Если функция принимает progress/cancel,
+    ей передаются обратный вызов прогресса и событие отмены.
+    """
+
+    def __init__(self, task_id, fn, args, kwargs, signals, with_progress=False):
+        super().__init__()
+        self.task_id = task_id
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.signals = signals
+        self.with_progress = with_progress
+        self.cancel_event = threading.Event()
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    @property
+    def cancelled(self):
+        return self.cancel_event.is_set()
+
+    def _report(self, done, total):
+        self.signals.progress.emit(self.task_id, done, total)
+
+    def run(self):
+        kwargs = dict(self.kwargs)
+        if self.with_progress:
+            kwargs["progress"] = self._report
+            kwargs["cancel"] = self.cancel_event
+        try:
+            result = self.fn(*self.args, **kwargs)
+        except (db.OperationCancelled, db.ScheduleVersionConflict) as e:
+            self.signals.failed.emit(self.task_id, e)
+        except Exception as e:
+            traceback.print_exc()
+            self.signals.failed.emit(self.task_id, e)
+        else:
+            self.signals.finished.emit(self.task_id, result)
+
+
+class _Pending:
+    def __init__(self, task, key):
+        self.task = task
+        self.key = key
+        self.callbacks = []  # [(owner, on_result, on_error, on_progress)]
+
+
+class DbExecutor(QObject):
+    """
+    Выполняет функции db в QThreadPool и возвращает результаты в поток GUI.
+
+    Одинаковые запросы (та же функция с теми же аргументами), пока первый
+    ещё выполняется, не запускаются повторно: их обработчики получат
+    результат первого. Так объединяются только чтения: задачи с прогрессом
+    и записи (merge=False) всегда выполняются отдельно. Обработчики
+    владельца, который уже удалён, не вызываются.
+    """
+
+    def __init__(self, max_threads=4, parent=None):
+        super().__init__(parent)
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(max_threads)
+        self._signals = _TaskSignals(self)
+        self._signals.finished.connect(self._on_finished)
+        self._signals.failed.connect(self._on_failed)
+        self._signals.progress.connect(self._on_progress)
+        self._next_id = 0
+        self._pending = {}  # task_id -> _Pending
+        self._by_key = {}   # key -> task_id
+
+    @staticmethod
+    def make_key(fn, args, kwargs):
+        return (getattr(fn, "__module__", None), getattr(fn, "__qualname__", repr(fn)),
+                repr(args), repr(sorted(kwargs.items())))
+
+    def submit(self, fn, *args, owner=None, on_result=None, on_error=None, on_progress=None,
+               with_progress=False, merge=True, **kwargs):
+        """
+        Ставит fn(*args, **kwargs) в очередь. Возвращает задачу; task.cancel()
+        просит функцию прервать работу (если она поддерживает cancel).
+        merge=False — не объединять с таким же запросом в работе (для записей).
+        """
+        key = self.make_key(fn, args, kwargs) if merge and not with_progress else None
+        task_id = self._by_key.get(key) if key is not None else None
+        if task_id is None:
+            self._next_id += 1
+            task_id = self._next_id
+            task = DbTask(task_id, fn, args, kwargs, self._signals, with_progress)
+            pending = _Pending(task, key)
+            self._pending[task_id] = pending
+            if key is not None:
+                self._by_key[key] = task_id
+            self.pool.start(task)
+        pending = self._pending[task_id]
+        pending.callbacks.append((owner, on_result, on_error, on_progress))
+        return pending.task
+
+    def _take(self, task_id):
+        pending = self._pending.pop(task_id, None)
+        if pending is not None and self._by_key.get(pending.key) == task_id:
+            del self._by_key[pending.key]
+        return pending
+
+    @staticmethod
+    def _alive(owner):
+        return owner is None or not sip.isdeleted(owner)
+
+    @pyqtSlot(int, object)
+    def _on_finished(self, task_id, result):
+        pending = self._take(task_id)
+        if pending is None:
+            return
+        for owner, on_result, _, _ in pending.callbacks:
+            if on_result is not None and self._alive(owner):
+                on_result(result)
+
+    @pyqtSlot(int, object)
+    def _on_failed(self, task_id, error):
+        pending = self._take(task_id)
+        if pending is None:
+            return
+        for owner, _, on_error, _ in pending.callbacks:
+            if on_error is not None and self._alive(owner):
+                on_error(error)
+
+    @pyqtSlot(int, int, int)
+    def _on_progress(self, task_id, done, total):
+        pending = self._pending.get(task_id)
+        if pending is None:
+            return
+        for owner, _, _, on_progress in pending.callbacks:
+            if on_progress is not None and self._alive(owner):
+                on_progress(done, total)
+
+    def wait(self, msecs=-1):
+        return self.pool.waitForDone(msecs)
+
+
+_executor = None
+
+
+def executor():
+    """Общий исполнитель запросов к базе для всего приложения."""
+    global _executor
+    if _executor is None:
+        _executor = DbExecutor()
+    return _executor